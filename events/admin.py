@@ -7,7 +7,9 @@ from .models import (
     Location,
     Event,
     EventRegistration,
-    EventResult
+    EventResult,
+    RegistrationTicket,
+    LeaderboardEntry
 )
 
 
@@ -34,12 +36,12 @@ class UserAdmin(BaseUserAdmin):
 
 
 class SportTypeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description')
+    list_display = ('name', 'description', 'score_kind', 'score_order')
     search_fields = ('name',)
 
 
 class EventTypeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description')
+    list_display = ('name', 'description', 'score_kind', 'score_order')
     search_fields = ('name',)
 
 
@@ -87,10 +89,32 @@ class EventResultAdmin(admin.ModelAdmin):
     readonly_fields = ('recorded_at',)
 
 
+class RegistrationTicketAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event', 'user', 'status', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('event__title', 'user__email')
+    readonly_fields = ('created_at', 'processed_at')
+
+
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    # Строки рейтинга пересчитываются автоматически, вручную не редактируются
+    list_display = ('sport_type', 'period', 'user', 'points', 'results_count', 'wins', 'podiums', 'updated_at')
+    list_filter = ('sport_type', 'period')
+    search_fields = ('user__email', 'user__display_name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(SportType, SportTypeAdmin)
 admin.site.register(EventType, EventTypeAdmin)
 admin.site.register(Location, LocationAdmin)
 admin.site.register(Event, EventAdmin)
 admin.site.register(EventRegistration, EventRegistrationAdmin)
-admin.site.register(EventResult, EventResultAdmin)
\ No newline at end of file
+admin.site.register(EventResult, EventResultAdmin)
+admin.site.register(RegistrationTicket, RegistrationTicketAdmin)
+admin.site.register(LeaderboardEntry, LeaderboardEntryAdmin)
@@ -4,4 +4,12 @@ from django.apps import AppConfig
 class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
-    verbose_name = 'Спортивные мероприятия'
\ No newline at end of file
+    verbose_name = 'Спортивные мероприятия'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .slow_queries import install
+
+        connection_created.connect(install, dispatch_uid='events_slow_queries')
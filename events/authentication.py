@@ -0,0 +1,135 @@
+"""
+JWT-аутентификация с кэшем пользователей процесса.
+
+TokenUserAuthentication берёт пользователя токена из LRU-кэша процесса (не больше
+EVENTS_AUTH_USER_CACHE_SIZE пользователей, не дольше EVENTS_AUTH_USER_CACHE_TTL секунд) и только
+при промахе - из БД, поэтому повторные запросы одного пользователя не обращаются к таблице пользователей.
+is_active и is_staff берутся только из этих данных, а не из claims токена: claims нельзя отозвать.
+
+При сохранении и удалении пользователя (сигналы в events/signals.py) запись вытесняется
+из кэша процесса, а в общем кэше (events/cache.py) отмечается время изменения - по этой отметке
+другие воркеры отбрасывают записи, загруженные раньше. Отметка может потеряться (locmem, вытеснение),
+тогда устаревшие данные в других процессах живут не дольше EVENTS_AUTH_USER_CACHE_TTL секунд.
+Изменения через QuerySet.update() сигналов не вызывают.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import get_cache
+from .models import TokenUser, User
+
+CHANGED_KEY = 'events:auth:user:{}'
+
+FIELDS = [field.attname for field in User._meta.concrete_fields]
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class UserCache:
+    """
+    Значения полей пользователей по pk. Давно не использованные записи вытесняются,
+    записи старше EVENTS_AUTH_USER_CACHE_TTL секунд или загруженные до изменения пользователя не выдаются.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, pk, changed_at=None):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(pk)
+            if entry is None:
+                return None
+            values, loaded_at = entry
+            if (now - loaded_at > get_setting('EVENTS_AUTH_USER_CACHE_TTL', 60)
+                    or (changed_at is not None and loaded_at <= changed_at)):
+                del self.entries[pk]
+                return None
+            self.entries.move_to_end(pk)
+            return values
+
+    def set(self, pk, values, loaded_at):
+        with self.lock:
+            self.entries[pk] = (values, loaded_at)
+            self.entries.move_to_end(pk)
+            while len(self.entries) > get_setting('EVENTS_AUTH_USER_CACHE_SIZE', 1000):
+                self.entries.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self.lock:
+            self.entries.pop(pk, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_users = UserCache()
+
+
+def get_user_cache():
+    return _users
+
+
+def get_changed_at(pk):
+    """
+    Время последнего изменения пользователя (time.time()) или None, если отметки нет или она вытеснена.
+    """
+    return get_cache().get(CHANGED_KEY.format(pk))
+
+
+def load_user_values(pk):
+    """
+    Значения всех полей пользователя {attname: значение} или None, если пользователя нет.
+    Возвращаемый словарь общий для запросов, изменять его нельзя.
+    """
+    values = _users.get(pk, get_changed_at(pk))
+    if values is None:
+        # Время фиксируется до запроса: изменение, закоммиченное во время чтения, сделает запись устаревшей
+        loaded_at = time.time()
+        values = User.objects.filter(pk=pk).values(*FIELDS).first()
+        if values is None:
+            return None
+        _users.set(pk, values, loaded_at)
+    return values
+
+
+def invalidate_user(pk, changed=True):
+    """
+    Вытесняет пользователя из кэша процесса; changed - записи других процессов тоже устарели.
+    """
+    _users.invalidate(pk)
+    if changed:
+        # Дольше TTL отметка не нужна: более старые записи кэша процесса истекают сами
+        timeout = get_setting('EVENTS_AUTH_USER_CACHE_TTL', 60) + 1
+        get_cache().set(CHANGED_KEY.format(pk), time.time(), timeout=timeout)
+
+
+def build_user(values):
+    return TokenUser.from_db(DEFAULT_DB_ALIAS, FIELDS, [values[name] for name in FIELDS])
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Токен не содержит идентификатор пользователя')
+
+        values = load_user_values(user_id)
+        if values is None:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+        if not values['is_active']:
+            raise AuthenticationFailed('Пользователь неактивен', code='user_inactive')
+        return build_user(values)
@@ -0,0 +1,429 @@
+"""
+Бенчмарк API: прогоняет маршруты events/urls.py и маршруты авторизации через тестовый клиент
+на сгенерированных данных (manage.py generate_load_data) и сравнивает результат с эталоном в JSON.
+
+Для каждого сценария записываются p50/p95 времени ответа, количество SQL-запросов и размер ответа.
+Регрессией по умолчанию считаются рост количества SQL-запросов и размера ответа: абсолютное время
+зависит от машины и её загрузки. Время сравнивается только по запросу (compare(latency=True),
+--compare-latency) на той же машине, где снят эталон, с допуском threshold и min_delta_ms.
+Каждый прогон выполняется в транзакции, которая откатывается, поэтому изменяющие запросы
+(регистрация, смена статуса, загрузка результатов) видят одни и те же данные.
+
+Отдельно (--registration-load) измеряется пропускная способность параллельных регистраций
+на одно мероприятие: потоки вызывают register_participant, как обработчик POST /register/.
+
+Запуск: manage.py benchmark_endpoints
+"""
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .capacity import NoSeatsAvailable, register_participant
+from .models import (
+    User, SportType, EventType, Location, Event, EventRegistration, EventResult, LeaderboardEntry,
+    RegistrationTicket
+)
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 3
+# Допустимый рост размера ответа и (при сравнении времени) p50/p95 относительно эталона
+DEFAULT_THRESHOLD = 0.25
+# Рост времени меньше этого порога считается шумом, даже если превышает DEFAULT_THRESHOLD
+DEFAULT_MIN_DELTA_MS = 2.0
+
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    method: str
+    url: str
+    user: str = None
+    params: dict = field(default_factory=dict)
+    data: object = None
+    content_type: str = None
+    expected_status: int = 200
+
+
+@dataclass
+class Fixtures:
+    admin: User
+    organizer: User
+    participant: User
+    event: Event
+    results_event: Event
+    open_event: Event
+    joined_event: Event
+    registration: EventRegistration
+    joined_registration: EventRegistration
+    ticket: RegistrationTicket
+    result: EventResult
+    location: Location
+    spare_location: Location
+    sport_type: SportType
+    spare_sport_type: SportType
+    event_type: EventType
+    period: str
+
+
+def prepare_fixtures():
+    """
+    Выбирает из сгенерированных данных организатора, участника и мероприятия для сценариев
+    и создаёт два мероприятия с открытой регистрацией (на одно участник уже записан),
+    администратора, обработанную заявку участника и неиспользуемые вид спорта и место для сценариев удаления.
+    """
+    results_event = (
+        Event.objects.filter(is_public=True, status='COMPLETED').annotate(results_total=Count('results'))
+        .order_by('-results_total', 'id').first()
+    )
+    if results_event is None or not results_event.results_total:
+        raise ValueError('Нет завершённых мероприятий с результатами: сгенерируйте данные (generate_load_data)')
+    organizer = results_event.organizer
+    event = (
+        Event.objects.filter(is_public=True, organizer=organizer).annotate(registrations_total=Count('registrations'))
+        .order_by('-registrations_total', 'id').first()
+    )
+    participant = (
+        User.objects.exclude(pk=organizer.pk).annotate(registrations_total=Count('event_registrations'))
+        .order_by('-registrations_total', 'id').first()
+    )
+    for user in (organizer, participant):
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save(update_fields=['password'])
+    admin = User.objects.create_user('benchmark-admin@example.com', 'Бенчмарк: администратор',
+                                     BENCHMARK_PASSWORD, is_staff=True)
+
+    start = timezone.now().replace(microsecond=0) + timedelta(days=30)
+    open_events = [
+        Event.objects.create(
+            title=f'Бенчмарк: {title}', description='Мероприятие для замеров', organizer=organizer,
+            sport_type_id=results_event.sport_type_id, event_type_id=results_event.event_type_id,
+            location_id=results_event.location_id, start_datetime=start, end_datetime=start + timedelta(hours=2),
+            registration_deadline=start - timedelta(days=1), status='REGISTRATION_OPEN',
+        )
+        for title in ('открытая регистрация', 'участник записан')
+    ]
+    joined_registration = EventRegistration.objects.create(event=open_events[1], user=participant, status='CONFIRMED')
+    open_events[1].refresh_from_db()
+    ticket = RegistrationTicket.objects.create(
+        event=open_events[1], user=participant, status='ACCEPTED', registration=joined_registration,
+        processed_at=timezone.now(),
+    )
+
+    leaderboard = LeaderboardEntry.objects.order_by('-points', 'id').first()
+    return Fixtures(
+        admin=admin,
+        organizer=organizer,
+        participant=participant,
+        event=event,
+        results_event=results_event,
+        open_event=open_events[0],
+        joined_event=open_events[1],
+        registration=EventRegistration.objects.filter(event__organizer=organizer).order_by('id').first(),
+        joined_registration=joined_registration,
+        ticket=ticket,
+        result=results_event.results.order_by('id').first(),
+        location=results_event.location,
+        spare_location=Location.objects.create(name='Бенчмарк: место', address='ул. Тестовая, 1', city='Москва',
+                                               created_by_user=organizer),
+        sport_type=leaderboard.sport_type if leaderboard else results_event.sport_type,
+        spare_sport_type=SportType.objects.create(name='Бенчмарк: вид спорта'),
+        event_type=results_event.event_type,
+        period=leaderboard.period if leaderboard else LeaderboardEntry.ALL_TIME,
+    )
+
+
+def build_cases(fixtures):
+    f = fixtures
+    results_body = ''.join(
+        json.dumps({'participant_user_id': user_id, 'position': position, 'score': score}) + '\n'
+        for user_id, position, score in f.results_event.results.filter(participant_user__isnull=False)
+        .order_by('position', 'id').values_list('participant_user_id', 'position', 'score')[:100]
+    )
+    registration_ids = list(
+        EventRegistration.objects.filter(event=f.event).order_by('id').values_list('id', flat=True)[:50]
+    )
+    city = f.location.city
+    return [
+        # Авторизация
+        BenchmarkCase('login', 'post', reverse('login'),
+                      data={'email': f.participant.email, 'password': BENCHMARK_PASSWORD}),
+        BenchmarkCase('token-refresh', 'post', reverse('token_refresh'),
+                      data={'refresh': str(RefreshToken.for_user(f.participant))}),
+        BenchmarkCase('user-register', 'post', reverse('register'), expected_status=201,
+                      data={'email': 'benchmark-new@example.com', 'display_name': 'Бенчмарк',
+                            'password': BENCHMARK_PASSWORD}),
+        BenchmarkCase('user-profile', 'get', reverse('user-profile'), user='participant'),
+        BenchmarkCase('user-profile-update', 'put', reverse('user-profile'), user='participant',
+                      data={'display_name': 'Новое имя'}),
+
+        # Служебные
+        BenchmarkCase('api-root', 'get', reverse('api-root')),
+        BenchmarkCase('metrics', 'get', reverse('metrics'), user='admin'),
+
+        # Справочники
+        BenchmarkCase('sport-type-list', 'get', reverse('sporttype-list')),
+        BenchmarkCase('sport-type-detail', 'get', reverse('sporttype-detail', args=[f.sport_type.pk])),
+        BenchmarkCase('sport-type-create', 'post', reverse('sporttype-list'), user='admin', expected_status=201,
+                      data={'name': 'Новый вид спорта', 'score_kind': 'POINTS', 'score_order': 'DESC'}),
+        BenchmarkCase('sport-type-update', 'patch', reverse('sporttype-detail', args=[f.spare_sport_type.pk]),
+                      user='admin', data={'description': 'Обновлённое описание'}),
+        BenchmarkCase('sport-type-delete', 'delete', reverse('sporttype-detail', args=[f.spare_sport_type.pk]),
+                      user='admin', expected_status=204),
+        BenchmarkCase('event-type-list', 'get', reverse('eventtype-list')),
+        BenchmarkCase('event-type-detail', 'get', reverse('eventtype-detail', args=[f.event_type.pk])),
+        BenchmarkCase('location-list', 'get', reverse('location-list')),
+        BenchmarkCase('location-list-near', 'get', reverse('location-list'),
+                      params={'near': f'{f.location.latitude},{f.location.longitude}', 'radius_km': 50}),
+        BenchmarkCase('location-detail', 'get', reverse('location-detail', args=[f.location.pk])),
+        BenchmarkCase('location-create', 'post', reverse('location-list'), user='organizer', expected_status=201,
+                      data={'name': 'Новое место', 'address': 'ул. Новая, 2', 'city': city,
+                            'latitude': '55.75', 'longitude': '37.61'}),
+        BenchmarkCase('location-update', 'patch', reverse('location-detail', args=[f.spare_location.pk]),
+                      user='organizer', data={'details': 'Вход с северной стороны'}),
+        BenchmarkCase('location-delete', 'delete', reverse('location-detail', args=[f.spare_location.pk]),
+                      user='organizer', expected_status=204),
+
+        # Мероприятия
+        BenchmarkCase('event-list', 'get', reverse('event-list')),
+        BenchmarkCase('event-list-authenticated', 'get', reverse('event-list'), user='participant'),
+        BenchmarkCase('event-list-cursor', 'get', reverse('event-list'), params={'cursor': '', 'page_size': 100}),
+        BenchmarkCase('event-list-filtered', 'get', reverse('event-list'),
+                      params={'sport_type': f.sport_type.pk, 'city': city, 'status': 'COMPLETED'}),
+        BenchmarkCase('event-list-search', 'get', reverse('event-list'),
+                      params={'search': f.results_event.title.split(':')[0]}),
+        BenchmarkCase('event-list-near', 'get', reverse('event-list'),
+                      params={'near': f'{f.location.latitude},{f.location.longitude}', 'radius_km': 50}),
+        BenchmarkCase('event-list-sparse', 'get', reverse('event-list'), params={'fields': 'id,title,start_datetime'}),
+        BenchmarkCase('event-detail', 'get', reverse('event-detail', args=[f.event.pk])),
+        BenchmarkCase('event-create', 'post', reverse('event-list'), user='organizer', expected_status=201,
+                      data={'title': 'Новое мероприятие', 'description': 'Описание',
+                            'sport_type_id': f.open_event.sport_type_id, 'event_type_id': f.open_event.event_type_id,
+                            'location_id': f.open_event.location_id,
+                            'start_datetime': f.open_event.start_datetime.isoformat()}),
+        BenchmarkCase('event-update', 'patch', reverse('event-detail', args=[f.open_event.pk]), user='organizer',
+                      data={'description': 'Обновлённое описание'}),
+        BenchmarkCase('event-delete', 'delete', reverse('event-detail', args=[f.open_event.pk]), user='organizer',
+                      expected_status=204),
+        BenchmarkCase('event-register', 'post', reverse('event-register', args=[f.open_event.pk]),
+                      user='participant', expected_status=201),
+        BenchmarkCase('event-unregister', 'delete', reverse('event-unregister', args=[f.joined_event.pk]),
+                      user='participant', expected_status=204),
+        BenchmarkCase('event-registrations', 'get', reverse('event-registrations', args=[f.event.pk]),
+                      user='organizer'),
+        BenchmarkCase('event-export-registrations', 'get',
+                      reverse('event-export-registrations', args=[f.event.pk]), user='organizer',
+                      params={'format': 'csv'}),
+        BenchmarkCase('event-results', 'get', reverse('event-results', args=[f.results_event.pk])),
+        BenchmarkCase('event-standings', 'get', reverse('event-standings', args=[f.results_event.pk])),
+        BenchmarkCase('event-export-results', 'get', reverse('event-export-results', args=[f.results_event.pk]),
+                      params={'format': 'ndjson'}),
+        BenchmarkCase('event-add-result', 'post', reverse('event-add-result', args=[f.results_event.pk]),
+                      user='organizer', expected_status=201,
+                      data={'team_name_if_applicable': 'Команда', 'position': 1, 'score': f.result.score}),
+        BenchmarkCase('event-bulk-results', 'post',
+                      reverse('event-bulk-results', args=[f.results_event.pk]) + '?mode=upsert',
+                      user='organizer', data=results_body, content_type='application/x-ndjson'),
+
+        # Регистрации и результаты
+        BenchmarkCase('registration-list', 'get', reverse('registration-list'), user='participant'),
+        BenchmarkCase('registration-list-organizer', 'get', reverse('registration-list'), user='organizer'),
+        BenchmarkCase('registration-create', 'post', reverse('registration-list'), user='participant',
+                      expected_status=201, data={'event_id': f.open_event.pk}),
+        BenchmarkCase('registration-detail', 'get', reverse('registration-detail', args=[f.registration.pk]),
+                      user='organizer'),
+        BenchmarkCase('registration-update', 'put', reverse('registration-detail', args=[f.joined_registration.pk]),
+                      user='participant', data={'event_id': f.joined_event.pk, 'notes_by_user': 'Приду с командой'}),
+        BenchmarkCase('registration-delete', 'delete',
+                      reverse('registration-detail', args=[f.joined_registration.pk]), user='participant',
+                      expected_status=204),
+        BenchmarkCase('registration-status-update', 'put',
+                      reverse('registration-status-update', args=[f.registration.pk]), user='organizer',
+                      data={'status': 'REJECTED_BY_ORGANIZER'}),
+        BenchmarkCase('registration-update-status', 'put',
+                      reverse('registration-update-status', args=[f.registration.pk]), user='organizer',
+                      data={'status': 'ATTENDED'}),
+        BenchmarkCase('registration-bulk-status', 'post', reverse('registration-bulk-status'), user='organizer',
+                      data={'status': 'REJECTED_BY_ORGANIZER', 'ids': registration_ids}),
+        BenchmarkCase('registration-ticket-list', 'get', reverse('registration-ticket-list'), user='participant'),
+        BenchmarkCase('registration-ticket-detail', 'get', reverse('registration-ticket-detail', args=[f.ticket.pk]),
+                      user='participant'),
+        BenchmarkCase('result-list', 'get', reverse('result-list')),
+        BenchmarkCase('result-list-event', 'get', reverse('result-list'), params={'event_id': f.results_event.pk}),
+        BenchmarkCase('result-detail', 'get', reverse('result-detail', args=[f.result.pk])),
+        BenchmarkCase('leaderboard-list', 'get', reverse('leaderboard-list'),
+                      params={'sport_type': f.sport_type.pk, 'period': f.period}),
+    ]
+
+
+def percentile(values, percent):
+    """
+    Перцентиль методом ближайшего ранга.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def make_clients(fixtures):
+    clients = {None: APIClient()}
+    for name in ('admin', 'organizer', 'participant'):
+        client = APIClient()
+        token = RefreshToken.for_user(getattr(fixtures, name)).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        clients[name] = client
+    return clients
+
+
+def send(client, case):
+    """
+    Выполняет запрос и возвращает (ответ, тело): потоковые ответы читаются целиком.
+    """
+    url = case.url
+    if case.method == 'get':
+        response = client.get(url, case.params)
+    else:
+        if case.params:
+            url = f'{url}?{"&".join(f"{key}={value}" for key, value in case.params.items())}'
+        if case.content_type:
+            response = client.generic(case.method.upper(), url, case.data, content_type=case.content_type)
+        else:
+            response = getattr(client, case.method)(url, case.data, format='json')
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+    return response, body
+
+
+def run_case(client, case, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP):
+    timings = []
+    queries = 0
+    for iteration in range(warmup + iterations):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response, body = send(client, case)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured))
+    return {
+        'method': case.method.upper(),
+        'url': case.url,
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'queries': queries,
+        'bytes': len(body),
+    }
+
+
+def run_benchmarks(iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP, only=None, progress=None):
+    """
+    Прогоняет сценарии на текущей БД. Возвращает ({сценарий: метрики}, [ошибки]).
+    only - подстроки имён сценариев, progress(имя, метрики) вызывается после каждого сценария.
+    """
+    fixtures = prepare_fixtures()
+    clients = make_clients(fixtures)
+    results, errors = {}, []
+    for case in build_cases(fixtures):
+        if only and not any(part in case.name for part in only):
+            continue
+        metrics = run_case(clients[case.user], case, iterations=iterations, warmup=warmup)
+        results[case.name] = metrics
+        if metrics['status'] != case.expected_status:
+            errors.append(f'{case.name}: статус {metrics["status"]}, ожидался {case.expected_status}')
+        if progress:
+            progress(case.name, metrics)
+    return results, errors
+
+
+def run_registration_load(users_count=200, capacity=50, threads=16):
+    """
+    Параллельные регистрации users_count пользователей из threads потоков на мероприятие
+    с capacity местами. Создаёт свои данные и не откатывает их.
+    Возвращает метрики: попытки, занятые места, время и попыток в секунду.
+    """
+    organizer = User.objects.create_user(f'load-{time.time_ns()}@example.com', 'Нагрузка: организатор')
+    event = Event.objects.create(
+        title='Нагрузка: регистрации', description='', organizer=organizer,
+        sport_type=SportType.objects.get_or_create(name='Нагрузка: вид спорта')[0],
+        event_type=EventType.objects.get_or_create(name='Нагрузка: тип мероприятия')[0],
+        start_datetime=timezone.now() + timedelta(days=1), max_participants=capacity,
+    )
+    users = User.objects.bulk_create(
+        User(email=f'load-{event.pk}-{i}@example.com', display_name=f'Нагрузка {i}') for i in range(users_count)
+    )
+
+    def register(user):
+        try:
+            while True:
+                try:
+                    register_participant(event, user)
+                    return True
+                except NoSeatsAvailable:
+                    return False
+                except OperationalError:
+                    # SQLite блокирует базу на время чужой транзакции записи вместо ожидания
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        outcomes = list(executor.map(register, users))
+    elapsed = time.perf_counter() - started
+    event.refresh_from_db()
+    return {
+        'event_id': event.pk,
+        'requests': len(outcomes),
+        'registered': sum(outcomes),
+        'seats_taken': event.current_participants_count,
+        'capacity': capacity,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(outcomes) / elapsed, 1) if elapsed else None,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS, latency=False):
+    """
+    Сравнивает результаты с эталоном. Возвращает список регрессий.
+    Количество запросов сравнивается точно, размер ответа - с допуском threshold.
+    При latency=True p50/p95 считаются регрессией, если выросли больше чем на threshold
+    и больше чем на min_delta_ms миллисекунд.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if metrics['queries'] > base['queries']:
+            regressions.append(f'{name}: SQL-запросов {metrics["queries"]} (эталон {base["queries"]})')
+        for key in ('p50_ms', 'p95_ms') if latency else ():
+            if (metrics[key] > base[key] * (1 + threshold)
+                    and metrics[key] - base[key] > min_delta_ms):
+                regressions.append(f'{name}: {key} {metrics[key]:.1f} (эталон {base[key]:.1f})')
+        if metrics['bytes'] > base['bytes'] * (1 + threshold):
+            regressions.append(f'{name}: размер ответа {metrics["bytes"]} (эталон {base["bytes"]})')
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, meta):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,194 @@
+"""
+Кэш ответов публичного чтения мероприятий.
+
+Ключ ответа включает версии данных, от которых он зависит:
+- глобальная версия (меняется при любом изменении мероприятий, регистраций и локаций) - для списков;
+- версия конкретного мероприятия - для детальной информации;
+- версия справочников (виды спорта, типы мероприятий) - для всех ответов.
+При изменении данных версии увеличиваются сигналами (см. events/signals.py),
+поэтому устаревшие записи просто перестают запрашиваться и вытесняются по TTL.
+Вместе с версией хранится время её последнего изменения - по нему строятся
+ETag/Last-Modified мероприятий (см. version_state), без записи в строку мероприятия.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from . import metrics
+
+# Заголовки-валидаторы, сохраняемые вместе с данными ответа
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+GLOBAL_VERSION_KEY = 'events:v:global'
+CATALOG_VERSION_KEY = 'events:v:catalog'
+EVENT_VERSION_KEY = 'events:v:event:{}'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, 'EVENTS_CACHE_ALIAS', 'default')]
+
+
+def record(name):
+    with _stats_lock:
+        _stats[name] += 1
+    if getattr(settings, 'EVENTS_METRICS_ENABLED', True):
+        metrics.inc('cache_requests_total', {'result': name})
+
+
+def get_stats():
+    """
+    Счётчики попаданий/промахов кэша в текущем процессе.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    hits, misses = stats.get('hit', 0), stats.get('miss', 0)
+    stats['hit_ratio'] = hits / (hits + misses) if hits + misses else 0.0
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def changed_at_key(key):
+    return f'{key}:at'
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        # add() создаёт счётчик, если его ещё нет; incr() атомарен в Redis и locmem
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    now = timezone.now()
+    cache.set_many({changed_at_key(key): now for key in keys}, timeout=None)
+
+
+def version_state(version_keys):
+    """
+    (версии, время последнего изменения) для ключей версий.
+
+    Если время изменения потеряно (кэш очищен или запись вытеснена), изменение
+    считается произошедшим сейчас: Last-Modified не должен сдвинуться назад.
+    """
+    cache = get_cache()
+    at_keys = [changed_at_key(key) for key in version_keys]
+    values = cache.get_many([*version_keys, *at_keys])
+    missing = [key for key in at_keys if key not in values]
+    if missing:
+        now = timezone.now()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        values.update(cache.get_many(missing))
+    versions = tuple(values.get(key, 0) for key in version_keys)
+    return versions, max((values[key] for key in at_keys if key in values), default=None)
+
+
+def bump_versions(event_ids=(), global_version=True, catalog=False):
+    """
+    Инвалидирует закэшированные ответы.
+
+    Версии увеличиваются сразу (чтобы текущая транзакция не увидела старые данные)
+    и повторно после коммита (чтобы параллельный запрос не закэшировал данные,
+    прочитанные до коммита, под уже новой версией).
+    """
+    keys = [EVENT_VERSION_KEY.format(event_id) for event_id in event_ids if event_id is not None]
+    if global_version:
+        keys.append(GLOBAL_VERSION_KEY)
+    if catalog:
+        keys.append(CATALOG_VERSION_KEY)
+    if not keys:
+        return
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def build_cache_key(request, scope, version_keys):
+    cache = get_cache()
+    versions = cache.get_many(version_keys)
+    version = ':'.join(str(versions.get(key, 0)) for key in version_keys)
+    params = sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+    raw = f'{request.get_host()}|{request.path}|{request.accepted_renderer.format}|{params}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'events:resp:{scope}:{version}:{digest}'
+
+
+class CachedPublicReadMixin:
+    """
+    Кэширует ответы list/retrieve для анонимных пользователей.
+    """
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'EVENTS_CACHE_TIMEOUT', 300)
+
+    def is_cacheable(self, request):
+        return getattr(settings, 'EVENTS_CACHE_ENABLED', True) and not request.user.is_authenticated
+
+    def cached_response(self, scope, version_keys, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = build_cache_key(request, scope, version_keys)
+        cached = cache.get(key)
+        if cached is not None:
+            record('hit')
+            headers = cached['headers']
+            not_modified = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+            )
+            response = not_modified if not_modified is not None else Response(cached['data'])
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record('miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+            cache.set(key, {'data': response.data, 'headers': headers}, self.get_cache_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            'list', [GLOBAL_VERSION_KEY, CATALOG_VERSION_KEY],
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        # Версии увеличиваются по целому pk, поэтому /events/01/ должен попасть в те же ключи, что и /events/1/
+        try:
+            lookup = int(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        except (TypeError, ValueError):
+            raise Http404
+        return self.cached_response(
+            f'detail:{lookup}', [EVENT_VERSION_KEY.format(lookup), CATALOG_VERSION_KEY],
+            super().retrieve, request, *args, **kwargs
+        )
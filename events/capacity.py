@@ -0,0 +1,181 @@
+"""
+Счётчик участников мероприятия и контроль свободных мест.
+
+Счётчик меняется только условным UPDATE одной колонки current_participants_count
+(без чтения и полного event.save()), поэтому параллельные регистрации не теряют
+обновления и не превышают max_participants. Статус регистрации меняется так же -
+условным UPDATE "если статус не изменился с момента чтения".
+
+Место занимают регистрации в статусах SEAT_STATUSES.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import bump_versions
+from .models import Event, EventRegistration
+from .signals import touch_events
+
+SEAT_STATUSES = ('PENDING_APPROVAL', 'CONFIRMED', 'ATTENDED')
+
+
+class RegistrationError(Exception):
+    message = 'Ошибка регистрации'
+
+    def __init__(self, message=None):
+        super().__init__(message or self.message)
+
+
+class NoSeatsAvailable(RegistrationError):
+    message = 'Достигнуто максимальное количество участников'
+
+
+class AlreadyRegistered(RegistrationError):
+    message = 'Вы уже зарегистрированы на это мероприятие'
+
+
+class RegistrationConflict(RegistrationError):
+    message = 'Регистрация была изменена параллельным запросом, повторите попытку'
+
+
+def holds_seat(status):
+    return status in SEAT_STATUSES
+
+
+def reserve_seat(event_id):
+    """
+    Занимает место, если оно есть. Возвращает False, если мест нет.
+    """
+    return Event.objects.filter(
+        Q(max_participants__isnull=True) | Q(current_participants_count__lt=F('max_participants')),
+        pk=event_id,
+    ).update(current_participants_count=F('current_participants_count') + 1) > 0
+
+
+def reserve_seats(event_id, count):
+    """
+    Занимает до count мест разом (для пакетной обработки очереди заявок).
+    Возвращает количество занятых мест. Счётчик меняется только если не изменился с момента чтения.
+    """
+    while count > 0:
+        current, maximum = Event.objects.filter(pk=event_id).values_list(
+            'current_participants_count', 'max_participants'
+        ).get()
+        granted = count if maximum is None else max(0, min(count, maximum - current))
+        if not granted:
+            return 0
+        if Event.objects.filter(pk=event_id, current_participants_count=current).update(
+            current_participants_count=current + granted
+        ):
+            return granted
+    return 0
+
+
+def release_seat(event_id):
+    Event.objects.filter(pk=event_id, current_participants_count__gt=0).update(
+        current_participants_count=F('current_participants_count') - 1
+    )
+
+
+def register_participant(event, user, **fields):
+    """
+    Создаёт регистрацию и занимает место одной транзакцией.
+    """
+    try:
+        with transaction.atomic():
+            if holds_seat(fields.get('status', 'PENDING_APPROVAL')) and not reserve_seat(event.pk):
+                raise NoSeatsAvailable()
+            # unique_together (event, user) защищает от повторной регистрации параллельным запросом
+            return EventRegistration.objects.create(event=event, user=user, **fields)
+    except IntegrityError:
+        raise AlreadyRegistered()
+
+
+def change_registration_status(registration, new_status, **changes):
+    """
+    Переводит регистрацию в new_status (с дополнительными полями changes),
+    занимая или освобождая место. Обновляет переданный экземпляр.
+    """
+    old_status = registration.status
+    delta = holds_seat(new_status) - holds_seat(old_status)
+    with transaction.atomic():
+        if delta > 0 and not reserve_seat(registration.event_id):
+            raise NoSeatsAvailable()
+        updated = EventRegistration.objects.filter(pk=registration.pk, status=old_status).update(
+            status=new_status, **changes
+        )
+        if not updated:
+            raise RegistrationConflict()
+        if delta < 0:
+            release_seat(registration.event_id)
+
+    registration.status = new_status
+    for name, value in changes.items():
+        setattr(registration, name, value)
+    # UPDATE не вызывает сигналы: версии кэша обновляются явно
+    touch_events([registration.event_id])
+    if EventRegistration.event.is_cached(registration):
+        registration.event.refresh_from_db(fields=['current_participants_count'])
+    return registration
+
+
+def recount_participants(event_ids):
+    """
+    Пересчитывает current_participants_count по регистрациям, занимающим место, одним UPDATE.
+    """
+    seats = (
+        EventRegistration.objects
+        .filter(event=OuterRef('pk'), status__in=SEAT_STATUSES)
+        .order_by()
+        .values('event')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Event.objects.filter(pk__in=event_ids).update(
+        current_participants_count=Coalesce(Subquery(seats, output_field=models.IntegerField()), 0),
+    )
+    bump_versions(event_ids)
+
+
+def bulk_change_status(registrations, new_status):
+    """
+    Меняет статус многих регистраций одной транзакцией: bulk_update регистраций
+    и один пересчёт счётчика на каждое затронутое мероприятие.
+
+    Места распределяются в порядке id регистраций. Возвращает {id регистрации: ошибка или None};
+    регистрации, уже находящиеся в new_status, в результат не попадают.
+    """
+    outcomes = {}
+    with transaction.atomic():
+        event_ids = set(registrations.order_by().values_list('event_id', flat=True).distinct())
+        # На PostgreSQL блокирует строки мероприятий, затем регистраций (в том же порядке, что и
+        # change_registration_status) до конца транзакции: параллельная смена статуса не будет
+        # перезаписана bulk_update. В SQLite - один писатель
+        events = {event.pk: event for event in Event.objects.select_for_update().filter(pk__in=event_ids)}
+        registrations = list(registrations.select_for_update().order_by('id'))
+        taken = Counter(dict(
+            EventRegistration.objects.filter(event_id__in=event_ids, status__in=SEAT_STATUSES)
+            .order_by().values_list('event_id').annotate(total=Count('pk'))
+        ))
+
+        changed = []
+        for registration in registrations:
+            if registration.status == new_status:
+                continue
+            event = events[registration.event_id]
+            delta = holds_seat(new_status) - holds_seat(registration.status)
+            if delta > 0 and event.max_participants and taken[event.pk] >= event.max_participants:
+                outcomes[registration.pk] = NoSeatsAvailable.message
+                continue
+            taken[event.pk] += delta
+            registration.status = new_status
+            changed.append(registration)
+            outcomes[registration.pk] = None
+
+        EventRegistration.objects.bulk_update(changed, ['status'], batch_size=500)
+        changed_events = sorted({registration.event_id for registration in changed})
+        if changed_events:
+            recount_participants(changed_events)
+    return outcomes
@@ -0,0 +1,99 @@
+"""
+Снимок справочников видов спорта и типов мероприятий в памяти процесса.
+
+Справочники маленькие и почти не меняются, поэтому загружаются один раз на процесс
+и используются сериализаторами и валидацией без обращений к БД.
+Снимок сбрасывается сигналами в текущем процессе; другие процессы замечают изменения
+по версии справочников в общем кэше (проверяется не чаще CHECK_INTERVAL секунд)
+и в любом случае перечитывают снимок не реже EVENTS_CATALOG_MAX_AGE секунд.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from django.conf import settings
+
+from .cache import CATALOG_VERSION_KEY, get_cache
+from .conditional import latest
+from .models import EventType, SportType
+
+CHECK_INTERVAL = 5
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    sport_types: MappingProxyType
+    event_types: MappingProxyType
+    sport_type_last_modified: object
+    event_type_last_modified: object
+    version: object
+    loaded_at: float
+
+    @property
+    def last_modified(self):
+        return latest(self.sport_type_last_modified, self.event_type_last_modified)
+
+    @property
+    def state(self):
+        """
+        Состояние справочников для ETag: (updated_at и количество) по каждому справочнику.
+        """
+        return (self.sport_type_last_modified, len(self.sport_types),
+                self.event_type_last_modified, len(self.event_types))
+
+
+_snapshot = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _freeze(representation):
+    return MappingProxyType(dict(representation))
+
+
+def load_snapshot():
+    from .serializers import EventTypeSerializer, SportTypeSerializer
+
+    version = get_cache().get(CATALOG_VERSION_KEY, 0)
+    sport_types = list(SportType.objects.order_by('id'))
+    event_types = list(EventType.objects.order_by('id'))
+    return CatalogSnapshot(
+        sport_types=MappingProxyType({
+            item.pk: _freeze(SportTypeSerializer(item).data) for item in sport_types
+        }),
+        event_types=MappingProxyType({
+            item.pk: _freeze(EventTypeSerializer(item).data) for item in event_types
+        }),
+        sport_type_last_modified=latest(*(item.updated_at for item in sport_types)),
+        event_type_last_modified=latest(*(item.updated_at for item in event_types)),
+        version=version,
+        loaded_at=time.monotonic(),
+    )
+
+
+def get_catalog():
+    global _snapshot, _checked_at
+
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None and now - _checked_at < CHECK_INTERVAL:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        max_age = getattr(settings, 'EVENTS_CATALOG_MAX_AGE', 300)
+        if (
+            snapshot is None
+            or now - snapshot.loaded_at > max_age
+            or get_cache().get(CATALOG_VERSION_KEY, 0) != snapshot.version
+        ):
+            snapshot = _snapshot = load_snapshot()
+        _checked_at = now
+        return snapshot
+
+
+def invalidate_catalog():
+    global _snapshot
+    with _lock:
+        _snapshot = None
@@ -0,0 +1,187 @@
+"""
+Быстрый режим сериализации списков только для чтения.
+
+План полей строится один раз на запрос по уже настроенному сериализатору
+(с учётом ?fields= / ?expand=), а строки выбираются через values(), поэтому
+для каждой строки не создаются экземпляры моделей и не выполняется цикл
+ModelSerializer.to_representation. Формат ответа совпадает с обычными сериализаторами.
+
+Вложенные сериализаторы связей "к одному" разворачиваются в колонки той же выборки (JOIN),
+а связи, загружаемые в queryset через Prefetch, - отдельным запросом на страницу.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .instrumentation import timed
+
+# Поля, значение которых из БД выводится как есть
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.ReadOnlyField,
+)
+
+
+def datetime_converter(field):
+    """
+    DateTimeField.to_representation с часовым поясом и форматом, вычисленными один раз на план.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class RowObject:
+    """
+    Доступ к колонкам строки values() как к атрибутам - для SerializerMethodField.
+    Отсутствующая колонка - AttributeError, как у модели без аннотации.
+    """
+    __slots__ = ('row', 'prefix')
+
+    def __init__(self, row, prefix):
+        self.row = row
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        try:
+            return self.row[self.prefix + name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class CompiledSerializer:
+    """
+    План сериализации: список колонок для values() и шаги построения словаря для строки.
+    """
+
+    def __init__(self, serializer, queryset, prefix=''):
+        self.prefix = prefix
+        self.pk_column = prefix + queryset.model._meta.pk.attname
+        self.columns = [self.pk_column]
+        self.prefetched = []
+        if not prefix:
+            self.columns.extend(queryset.query.annotations)
+            self.prefetches = {
+                lookup.prefetch_to: lookup.queryset
+                for lookup in queryset._prefetch_related_lookups
+                if isinstance(lookup, Prefetch) and lookup.queryset is not None
+            }
+        else:
+            self.prefetches = {}
+
+        self.steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            self.steps.append((name, self.compile_field(field, queryset)))
+        self.columns = list(dict.fromkeys(self.columns))
+
+    def include_columns(self, names):
+        """
+        Дополнительные колонки выборки, которых нет в ответе (например, ключ курсора пагинации).
+        """
+        self.columns = list(dict.fromkeys([*self.columns, *(self.prefix + name for name in names)]))
+
+    def add_column(self, path):
+        column = self.prefix + path
+        self.columns.append(column)
+        return column
+
+    def compile_field(self, field, queryset):
+        if isinstance(field, serializers.ListSerializer):
+            raise TypeError(f'Поле {field.field_name}: коллекции не поддерживаются')
+
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(field.parent, field.method_name)
+            prefix = self.prefix
+            return lambda row: method(RowObject(row, prefix))
+
+        path = '__'.join(field.source_attrs)
+        if isinstance(field, serializers.BaseSerializer):
+            column = self.add_column(path)
+            if path in self.prefetches:
+                return self.compile_prefetched(field, path, column)
+            model = queryset.model._meta.get_field(path).related_model
+            nested = CompiledSerializer(field, model._default_manager.all(), prefix=f'{column}__')
+            self.columns.extend(nested.columns)
+            return lambda row: nested.render_row(row) if row[column] is not None else None
+
+        column = self.add_column(path)
+        if isinstance(field, IDENTITY_FIELDS):
+            return lambda row: row[column]
+        if isinstance(field, serializers.DateTimeField):
+            to_representation = datetime_converter(field)
+        else:
+            to_representation = field.to_representation
+        return lambda row: to_representation(row[column]) if row[column] is not None else None
+
+    def compile_prefetched(self, field, path, column):
+        """
+        Связь, загружаемая через Prefetch: отдельный запрос по id со своей компиляцией.
+        """
+        queryset = self.prefetches[path]
+        nested = CompiledSerializer(field, queryset)
+        loaded = {}
+        self.prefetched.append((nested, queryset, column, loaded))
+        return lambda row: loaded.get(row[column])
+
+    def load_prefetched(self, rows):
+        for nested, queryset, column, loaded in self.prefetched:
+            loaded.clear()
+            ids = {row[column] for row in rows if row[column] is not None}
+            if ids:
+                nested_rows = list(queryset.filter(pk__in=ids).values(*nested.columns))
+                loaded.update(zip(
+                    (row[nested.pk_column] for row in nested_rows),
+                    nested.render(nested_rows),
+                ))
+
+    def render_row(self, row):
+        return {name: step(row) for name, step in self.steps}
+
+    def render(self, rows):
+        rows = list(rows)
+        with timed('serialize'):
+            self.load_prefetched(rows)
+            return [self.render_row(row) for row in rows]
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+
+class CompiledListMixin:
+    """
+    list() через CompiledSerializer. Выключается настройкой EVENTS_COMPILED_LIST = False;
+    сериализаторы с неподдерживаемыми полями обрабатываются обычным способом.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'EVENTS_COMPILED_LIST', True):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            compiled = CompiledSerializer(self.get_serializer(), queryset)
+        except TypeError:
+            return super().list(request, *args, **kwargs)
+        # Курсору нужны поля сортировки keyset-пагинации, даже если ?fields= их не оставил
+        get_ordering_fields = getattr(self.paginator, 'get_ordering_fields', None)
+        if get_ordering_fields is not None:
+            compiled.include_columns(get_ordering_fields(request))
+
+        rows = compiled.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.render(page))
+        return Response(compiled.render(rows))
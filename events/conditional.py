@@ -0,0 +1,70 @@
+"""
+Условные GET-запросы (ETag / Last-Modified).
+
+Валидаторы вычисляются по версиям кэша ответов или агрегатам (максимальный updated_at
+и количество строк), а не по отрендеренному ответу, поэтому 304 возвращается до сериализации.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def aggregate_state(queryset):
+    """
+    (максимальный updated_at, количество строк) для queryset.
+    """
+    state = queryset.order_by().aggregate(last_modified=Max('updated_at'), total=Count('pk'))
+    return state['last_modified'], state['total']
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def make_etag(request, *state):
+    params = sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+    raw = f'{request.get_host()}|{request.path}|{request.accepted_renderer.format}|{params}|{state}'
+    return '"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Добавляет ETag и Last-Modified к list/retrieve и отвечает 304 на
+    If-None-Match / If-Modified-Since до выполнения сериализации.
+
+    View реализует get_validators(request) -> (etag, last_modified) или (None, None),
+    если объект не найден.
+    """
+
+    def get_validators(self, request):
+        raise NotImplementedError
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,160 @@
+"""
+Разреженные наборы полей: ?fields= и ?expand=
+
+- fields=id,title,location.city - оставить только перечисленные поля
+  (через точку - поля вложенных объектов);
+- expand=location,location.created_by_user - какие связи выводить вложенными объектами.
+  Если параметр expand передан, не перечисленные в нём связи выводятся как id.
+
+Без параметров ответ не меняется. Параметры учитываются только для чтения (GET/HEAD/OPTIONS),
+а по выбранным полям сокращается и запрос к БД (см. for_serialization() в models.py).
+Пустые и неизвестные имена - ошибка 400 со списком доступных полей.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+from .instrumentation import timed
+
+
+def parse_field_tree(value, param='fields'):
+    """
+    'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}
+    """
+    tree = {}
+    if not value:
+        return tree
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if not name.isidentifier():
+                raise ValidationError({param: f'Некорректное имя поля: "{path.strip()}"'})
+            node = node.setdefault(name, {})
+    return tree
+
+
+class SparseFieldset:
+    fields_param = 'fields'
+    expand_param = 'expand'
+
+    def __init__(self, fields=None, expand=None):
+        # None - параметр не задан (все поля / все связи развёрнуты)
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return cls()
+        params = request.query_params
+        fields = parse_field_tree(params[cls.fields_param], cls.fields_param) if cls.fields_param in params else None
+        expand = parse_field_tree(params[cls.expand_param], cls.expand_param) if cls.expand_param in params else None
+        return cls(fields, expand)
+
+    @property
+    def is_default(self):
+        return self.fields is None and self.expand is None
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        # Вложенные поля в fields (location.city) подразумевают развёрнутую связь
+        if self.fields and self.fields.get(name):
+            return True
+        return self.expand is None or name in self.expand
+
+    def child(self, name):
+        fields = self.fields.get(name) or None if self.fields is not None else None
+        expand = self.expand.get(name, {}) if self.expand is not None else None
+        return SparseFieldset(fields, expand)
+
+    def select_related(self, relations, prefix=''):
+        """
+        Пути для QuerySet.select_related() по дереву связей сериализатора:
+        только связи, которые попадут в ответ развёрнутыми.
+        """
+        paths = []
+        for name, children in relations.items():
+            if self.includes(name) and self.expands(name):
+                paths.append(prefix + name)
+                paths.extend(self.child(name).select_related(children, f'{prefix}{name}__'))
+        return paths
+
+    def only_fields(self, model, select_related=(), always=()):
+        """
+        Аргументы для QuerySet.only(): выбранные колонки модели, внешние ключи
+        оставленных связей и обязательные поля (например, ключ сортировки пагинации).
+        """
+        names = {model._meta.pk.name, *always}
+        for field in model._meta.concrete_fields:
+            if self.includes(field.name):
+                names.add(field.name)
+        names.update(path.split('__')[0] for path in select_related)
+        return sorted(names)
+
+
+class SparseFieldsMixin:
+    """
+    Применяет ?fields= / ?expand= к сериализатору и его вложенным сериализаторам.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = SparseFieldset.from_request(self._context.get('request'))
+        if not fieldset.is_default:
+            self.apply_fieldset(fieldset)
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+    @staticmethod
+    def is_relation(field):
+        from .serializers import CatalogField
+
+        return isinstance(field, (serializers.BaseSerializer, CatalogField)) and not isinstance(
+            field, serializers.ListSerializer
+        )
+
+    @staticmethod
+    def collapse(field):
+        """
+        Связь без expand выводится как id, без обращения к связанной модели.
+        """
+        source = field.source if field.source.endswith('_id') else f'{field.source}_id'
+        return serializers.ReadOnlyField(source=source)
+
+    def validate_fieldset(self, fieldset, prefix):
+        readable = [name for name, field in self.fields.items() if not field.write_only]
+        relations = [name for name in readable if self.is_relation(self.fields[name])]
+        if fieldset.fields is not None:
+            if not fieldset.fields:
+                raise ValidationError({fieldset.fields_param: 'Не указано ни одного поля'})
+            for name, children in fieldset.fields.items():
+                if name not in readable or (children and name not in relations):
+                    raise ValidationError({fieldset.fields_param: (
+                        f'Неизвестное поле "{prefix}{name}". Доступные поля: '
+                        + ', '.join(prefix + field_name for field_name in readable)
+                    )})
+        for name in fieldset.expand or ():
+            if name not in relations:
+                raise ValidationError({fieldset.expand_param: (
+                    f'Неизвестная связь "{prefix}{name}". Доступные связи: '
+                    + ', '.join(prefix + relation for relation in relations)
+                )})
+
+    def apply_fieldset(self, fieldset, prefix=''):
+        self.validate_fieldset(fieldset, prefix)
+        fields = self.fields
+        for name in list(fields):
+            field = fields[name]
+            if field.write_only:
+                continue
+            if not fieldset.includes(name):
+                fields.pop(name)
+            elif self.is_relation(field):
+                if not fieldset.expands(name):
+                    fields[name] = self.collapse(field)
+                elif isinstance(field, SparseFieldsMixin):
+                    field.apply_fieldset(fieldset.child(name), f'{prefix}{name}.')
@@ -0,0 +1,60 @@
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .geo import filter_near
+from .search import get_search_backend
+
+
+class FullTextSearchFilter(filters.BaseFilterBackend):
+    """
+    Полнотекстовый поиск мероприятий по параметру ?search=
+
+    Результаты сортируются по релевантности, если клиент не передал ?ordering=
+    (поэтому фильтр должен стоять после OrderingFilter).
+    """
+    search_param = filters.SearchFilter.search_param
+    ordering_param = filters.OrderingFilter.ordering_param
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        ranked = self.ordering_param not in request.query_params
+        return get_search_backend().filter_queryset(queryset, query, ranked=ranked)
+
+
+class NearFilter(filters.BaseFilterBackend):
+    """
+    Поиск рядом с точкой: ?near=lat,lon&radius_km=10
+
+    Во view можно задать near_location_prefix - путь к локации от модели
+    (например, 'location__' для мероприятий). Результаты сортируются по расстоянию,
+    если клиент не передал ?ordering=
+    """
+    near_param = 'near'
+    radius_param = 'radius_km'
+    default_radius_km = 10.0
+    max_radius_km = 500.0
+    ordering_param = filters.OrderingFilter.ordering_param
+
+    def get_point(self, request):
+        try:
+            latitude, longitude = (float(value) for value in request.query_params[self.near_param].split(','))
+            radius_km = float(request.query_params.get(self.radius_param, self.default_radius_km))
+        except ValueError:
+            raise ValidationError({self.near_param: 'Ожидается формат near=широта,долгота и числовой radius_km'})
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({self.near_param: 'Координаты вне допустимого диапазона'})
+        if not 0 < radius_km <= self.max_radius_km:
+            raise ValidationError({self.radius_param: f'Радиус должен быть от 0 до {self.max_radius_km:g} км'})
+        return latitude, longitude, radius_km
+
+    def filter_queryset(self, request, queryset, view):
+        if not request.query_params.get(self.near_param):
+            return queryset
+        latitude, longitude, radius_km = self.get_point(request)
+        prefix = getattr(view, 'near_location_prefix', '')
+        queryset = filter_near(queryset, latitude, longitude, radius_km, prefix=prefix)
+        if self.ordering_param not in request.query_params:
+            queryset = queryset.order_by('distance_km', 'id')
+        return queryset
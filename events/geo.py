@@ -0,0 +1,124 @@
+"""
+Поиск мест и мероприятий рядом с точкой.
+
+Для каждой локации хранится geohash её координат (индексируемая колонка).
+Запрос "рядом" сначала отбирает кандидатов по ячейкам geohash, покрывающим круг
+поиска, и по ограничивающему прямоугольнику, а затем точно ранжирует их по формуле гаверсинусов.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+from .models import Location, prefix_filter
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    result = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(result) < precision:
+        value, interval = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(result)
+
+
+def geohash_cell_size(precision):
+    """
+    Размер ячейки geohash заданной точности в градусах: (широта, долгота).
+    """
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Ячейки geohash (центральная и 8 соседних), полностью покрывающие круг поиска.
+
+    Точность выбирается максимальной, при которой ячейка не меньше радиуса,
+    поэтому соседних ячеек всегда достаточно.
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lon_size = geohash_cell_size(candidate)
+        if lat_size * KM_PER_DEGREE >= radius_km and lon_size * KM_PER_DEGREE * cos_lat >= radius_km:
+            precision = candidate
+            break
+
+    lat_size, lon_size = geohash_cell_size(precision)
+    if precision == 1 and radius_km > lat_size * KM_PER_DEGREE:
+        # Радиус больше самой крупной ячейки - префильтр по geohash бесполезен
+        return []
+
+    cells = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            cell_lat = min(max(latitude + dy * lat_size, -90.0), 90.0)
+            cell_lon = (longitude + dx * lon_size + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return (latitude - lat_delta, latitude + lat_delta), (longitude - lon_delta, longitude + lon_delta)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def filter_near(queryset, latitude, longitude, radius_km, prefix=''):
+    """
+    Оставляет объекты в радиусе radius_km от точки и аннотирует поле distance_km.
+
+    prefix - путь к локации от модели queryset (например, 'location__' для мероприятий).
+    """
+    cell_filter = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        cell_filter |= prefix_filter('geohash', cell)
+
+    (lat_min, lat_max), (lon_min, lon_max) = bounding_box(latitude, longitude, radius_km)
+    candidates = Location.objects.filter(cell_filter, latitude__range=(lat_min, lat_max))
+    if lon_min >= -180.0 and lon_max <= 180.0:
+        candidates = candidates.filter(longitude__range=(lon_min, lon_max))
+
+    # Кандидаты отбираются по индексу geohash, мероприятия - по индексу внешнего ключа на локацию
+    queryset = queryset.filter(**{f'{prefix}id__in': candidates.values('id')})
+
+    lat1 = math.radians(latitude)
+    lat2 = Radians(Cast(F(f'{prefix}latitude'), FloatField()))
+    lon2 = Radians(Cast(F(f'{prefix}longitude'), FloatField()))
+    a = (
+        Power(Sin((lat2 - Value(lat1)) / 2), 2) +
+        Value(math.cos(lat1)) * Cos(lat2) * Power(Sin((lon2 - Value(math.radians(longitude))) / 2), 2)
+    )
+    distance = Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+    return queryset.annotate(distance_km=distance).filter(distance_km__lte=radius_km)
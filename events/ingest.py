@@ -0,0 +1,259 @@
+"""
+Потоковая загрузка результатов мероприятия (JSON-массив, NDJSON или CSV).
+
+Тело запроса читается частями и разбирается построчно/пообъектно, строки проверяются
+по заранее загруженному множеству подтверждённых участников и вставляются пакетами
+bulk_create в одной транзакции. В памяти одновременно находится не больше одного пакета,
+поэтому расход памяти не зависит от размера файла.
+"""
+import codecs
+import csv
+import json
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .leaderboards import refresh_event_participants
+from .models import EventRegistration, EventResult
+from .scoring import get_score_rule
+from .serializers import ResultRowSerializer
+from .signals import touch_events
+
+READ_CHUNK_SIZE = 64 * 1024
+INSERT_CHUNK_SIZE = 1000
+# Количество подробно описанных ошибок в ответе (остальные только подсчитываются)
+MAX_REPORTED_ERRORS = 1000
+
+MODES = ('append', 'replace', 'upsert')
+RESULT_FIELDS = ['team_name_if_applicable', 'position', 'score', 'normalized_score', 'achievement_description']
+PARTICIPANT_STATUSES = ('CONFIRMED', 'ATTENDED')
+
+CONTENT_TYPES = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+class IngestError(Exception):
+    """
+    Ошибка формата, после которой чтение продолжать нельзя (загрузка откатывается).
+    """
+
+    def __init__(self, message, row=None):
+        super().__init__(message)
+        self.row = row
+
+
+def text_reader(stream):
+    return codecs.getreader('utf-8-sig')(stream, errors='strict')
+
+
+def iter_json_array(reader, chunk_size=READ_CHUNK_SIZE):
+    """
+    Объекты JSON-массива по одному, без загрузки всего массива в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if started and buffer[:1] == ']':
+            return
+        if started and buffer[:1] == ',':
+            buffer = buffer[1:]
+            continue
+        if not started and buffer[:1] == '[':
+            buffer = buffer[1:]
+            started = True
+            continue
+        if not started and buffer:
+            raise IngestError('Ожидается JSON-массив')
+
+        item = end = None
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise IngestError(f'Некорректный JSON: {e.msg}')
+        # Значение, упёршееся в конец буфера, может быть не дочитано (например, число)
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise IngestError('Неожиданный конец JSON-массива' if started else 'Ожидается JSON-массив')
+            chunk = reader.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def iter_ndjson(reader):
+    for number, line in enumerate(reader, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise IngestError(f'Некорректный JSON: {e.msg}', row=number)
+
+
+def iter_csv(reader):
+    # Пустые ячейки считаются отсутствующими значениями
+    for row in csv.DictReader(reader):
+        yield {name: value for name, value in row.items() if name and value not in ('', None)}
+
+
+def iter_rows(stream, content_type):
+    """
+    Строки загрузки из потока тела запроса по его Content-Type.
+    """
+    data_format = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+    if data_format is None:
+        raise IngestError('Поддерживаются application/json, application/x-ndjson и text/csv')
+    if stream is None:
+        return iter(())
+    reader = text_reader(stream)
+    if data_format == 'json':
+        return iter_json_array(reader)
+    if data_format == 'ndjson':
+        return iter_ndjson(reader)
+    return iter_csv(reader)
+
+
+class ResultIngestor:
+    """
+    Проверяет и сохраняет строки результатов одного мероприятия.
+
+    mode: append - добавить, replace - заменить все результаты мероприятия,
+    upsert - обновить результат участника, если он уже есть.
+    strict: при любой ошибке в строках откатить всю загрузку.
+    """
+
+    def __init__(self, event, recorded_by, mode='append', strict=False, chunk_size=INSERT_CHUNK_SIZE):
+        self.event = event
+        self.recorded_by = recorded_by
+        self.mode = mode
+        self.strict = strict
+        self.chunk_size = chunk_size
+        self.report = {
+            'mode': mode, 'processed': 0, 'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0, 'errors': [],
+        }
+
+    def run(self, rows):
+        participants = set(
+            EventRegistration.objects
+            .filter(event=self.event, status__in=PARTICIPANT_STATUSES)
+            .values_list('user_id', flat=True)
+        )
+        validator = ResultRowSerializer(context={
+            'participants': participants, 'score_rule': get_score_rule(self.event),
+        })
+        seen = set()
+        # Участники, чей рейтинг нужно пересчитать (не больше числа участников мероприятия)
+        affected = set()
+
+        with transaction.atomic():
+            if self.mode == 'replace':
+                # Без загрузки строк и сигналов на каждую запись: кэш и рейтинги обновляются один раз ниже
+                results = EventResult.objects.filter(event=self.event)
+                affected.update(results.exclude(participant_user=None).values_list('participant_user_id', flat=True))
+                # На результаты никто не ссылается, поэтому каскад не нужен - один DELETE
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DELETE FROM {quote(EventResult._meta.db_table)} WHERE {quote("event_id")} = %s',
+                        [self.event.pk]
+                    )
+                    self.report['deleted'] = cursor.rowcount
+
+            chunk = []
+            number = 0
+            try:
+                for number, row in enumerate(rows, 1):
+                    self.report['processed'] += 1
+                    result = self.validate(number, row, validator, seen)
+                    if result is not None:
+                        chunk.append(result)
+                    if len(chunk) >= self.chunk_size:
+                        self.save(chunk)
+                        chunk = []
+                self.save(chunk)
+            except IngestError as e:
+                if e.row is None:
+                    e.row = number + 1
+                raise
+
+            if self.strict and self.report['failed']:
+                transaction.set_rollback(True)
+                self.report.update(created=0, updated=0, deleted=0, rolled_back=True)
+                return self.report
+
+        if self.report['created'] or self.report['updated'] or self.report['deleted']:
+            # bulk_create/bulk_update не вызывают сигналы
+            touch_events([self.event.pk], global_version=False)
+            refresh_event_participants(self.event.pk, affected | seen, self.event.sport_type_id,
+                                       self.event.start_datetime)
+        return self.report
+
+    def add_error(self, number, errors):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'row': number, 'errors': errors})
+        else:
+            self.report['errors_truncated'] = True
+
+    def validate(self, number, row, validator, seen):
+        if not isinstance(row, dict):
+            self.add_error(number, {'non_field_errors': ['Ожидается объект с полями результата']})
+            return None
+        try:
+            data = validator.run_validation(row)
+        except ValidationError as e:
+            self.add_error(number, e.detail)
+            return None
+
+        participant_id = data.get('participant_user_id')
+        if participant_id is not None:
+            if participant_id in seen:
+                self.add_error(number, {'participant_user_id': ['Участник уже встречался в загрузке']})
+                return None
+            seen.add(participant_id)
+        return EventResult(event=self.event, recorded_by_user=self.recorded_by, **data)
+
+    def save(self, chunk):
+        if not chunk:
+            return
+        if self.mode == 'upsert':
+            chunk = self.update_existing(chunk)
+        EventResult.objects.bulk_create(chunk)
+        self.report['created'] += len(chunk)
+
+    def update_existing(self, chunk):
+        """
+        Обновляет результаты участников, которые уже есть, и возвращает строки для вставки.
+        """
+        participant_ids = [result.participant_user_id for result in chunk if result.participant_user_id]
+        existing = {}
+        for result in EventResult.objects.filter(event=self.event, participant_user_id__in=participant_ids):
+            existing.setdefault(result.participant_user_id, result)
+
+        updated, created = [], []
+        for result in chunk:
+            current = existing.get(result.participant_user_id)
+            if current is None:
+                created.append(result)
+                continue
+            for name in RESULT_FIELDS:
+                setattr(current, name, getattr(result, name))
+            current.recorded_by_user = self.recorded_by
+            updated.append(current)
+
+        EventResult.objects.bulk_update(updated, RESULT_FIELDS + ['recorded_by_user'])
+        self.report['updated'] += len(updated)
+        return created
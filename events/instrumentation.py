@@ -0,0 +1,209 @@
+"""
+Замеры запросов: количество и время SQL, время сериализации и рендеринга, размер ответа.
+
+InstrumentationMiddleware подключает execute_wrapper ко всем соединениям БД на время запроса,
+добавляет заголовок Server-Timing (EVENTS_SERVER_TIMING) и пишет строку JSON в лог
+events.instrumentation, если запрос медленнее EVENTS_SLOW_REQUEST_MS, выполнил больше
+EVENTS_SLOW_REQUEST_QUERIES запросов или повторил один и тот же SQL не меньше
+EVENTS_DUPLICATE_QUERY_THRESHOLD раз (N+1). Для повторов указываются поля сериализаторов,
+из которых они пришли, или места вызова в коде проекта.
+
+Время сериализации учитывают SparseFieldsMixin.to_representation и CompiledSerializer.render через timed();
+в него входит и SQL, выполняемый при выводе связей.
+SQL потоковых ответов (выгрузки) выполняется после middleware и в замеры не попадает.
+"""
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger('events.instrumentation')
+
+_current = ContextVar('events_request_metrics', default=None)
+
+# IN (%s, %s, ...) с разным числом параметров - одна и та же форма запроса
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+MAX_SIGNATURE_LENGTH = 300
+# Для скольких повторов одного SQL искать место вызова (обход стека дорогой)
+MAX_ORIGIN_SAMPLES = 10
+PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def query_signature(sql):
+    return IN_LIST_RE.sub('(%s, ...)', sql)
+
+
+def serializer_field_label(field):
+    while isinstance(field.parent, serializers.ListSerializer):
+        field = field.parent
+    if field.parent is None:
+        return type(field).__name__
+    return f'{type(field.parent).__name__}.{field.field_name}'
+
+
+def find_origin():
+    """
+    Поле сериализатора, при выводе которого выполняется запрос, иначе - первое место вызова в коде проекта.
+    """
+    frame = sys._getframe(2)
+    call_site = None
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, serializers.Field) and instance.field_name:
+            return serializer_field_label(instance)
+        filename = frame.f_code.co_filename
+        if (call_site is None and filename.startswith(PROJECT_DIR) and filename != __file__
+                and 'site-packages' not in filename):
+            call_site = f'{filename[len(PROJECT_DIR) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return call_site
+
+
+def current_request():
+    """
+    Запрос, который сейчас обрабатывается в этом потоке (если включены замеры).
+    """
+    metrics = _current.get()
+    return metrics.request if metrics is not None else None
+
+
+class RequestMetrics:
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.phases = Counter()
+        self.signatures = Counter()
+        self.origins = defaultdict(Counter)
+        self.depth = Counter()
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            signature = query_signature(sql)
+            self.signatures[signature] += 1
+            if 1 < self.signatures[signature] <= MAX_ORIGIN_SAMPLES + 1:
+                self.origins[signature][find_origin()] += 1
+
+    def duplicates(self, threshold):
+        return [
+            {'sql': signature[:MAX_SIGNATURE_LENGTH], 'count': count,
+             'origins': [origin for origin, _ in self.origins[signature].most_common()]}
+            for signature, count in self.signatures.most_common()
+            if count >= threshold
+        ]
+
+
+class timed:
+    """
+    Учитывает время блока в фазе name текущего запроса. Вложенные блоки одной фазы не суммируются.
+    """
+    __slots__ = ('name', 'metrics', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        if self.metrics is not None:
+            self.metrics.depth[self.name] += 1
+            if self.metrics.depth[self.name] == 1:
+                self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.depth[self.name] -= 1
+            if not metrics.depth[self.name]:
+                metrics.phases[self.name] += time.perf_counter() - self.started
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response['Content-Length']) if response.has_header('Content-Length') else None
+    return len(response.content)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_setting('EVENTS_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, metrics, time.perf_counter() - metrics.started)
+        return response
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после view: время рендеринга замеряется до post-render callback
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.render_finished(metrics))
+        return response
+
+    @staticmethod
+    def render_finished(metrics):
+        metrics.phases['render'] += time.perf_counter() - metrics.render_started
+
+    def report(self, request, response, metrics, total):
+        duplicates = metrics.duplicates(get_setting('EVENTS_DUPLICATE_QUERY_THRESHOLD', 3))
+        match = request.resolver_match
+        data = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+            'serialize_ms': round(metrics.phases['serialize'] * 1000, 2),
+            'render_ms': round(metrics.phases['render'] * 1000, 2),
+            'bytes': response_size(response),
+            'duplicates': duplicates,
+        }
+
+        if get_setting('EVENTS_SERVER_TIMING', False):
+            timings = [
+                f'total;dur={data["total_ms"]}',
+                f'db;dur={data["sql_ms"]};desc="{metrics.queries} queries"',
+                f'serialize;dur={data["serialize_ms"]}',
+                f'render;dur={data["render_ms"]}',
+            ]
+            if duplicates:
+                timings.append(f'dup;desc="{len(duplicates)} repeated queries"')
+            response['Server-Timing'] = ', '.join(timings)
+
+        if (data['total_ms'] >= get_setting('EVENTS_SLOW_REQUEST_MS', 500)
+                or metrics.queries >= get_setting('EVENTS_SLOW_REQUEST_QUERIES', 50)
+                or duplicates):
+            logger.warning(json.dumps(data, ensure_ascii=False, default=str), extra={'request_metrics': data})
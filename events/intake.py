@@ -0,0 +1,171 @@
+"""
+Очередь заявок на регистрацию для мероприятий с пиковой нагрузкой.
+
+Если у мероприятия включён registration_queue, POST /events/{id}/register/ только сохраняет
+заявку (RegistrationTicket) и сразу отвечает 202 с номером заявки. Обработчик
+(manage.py process_registration_queue) забирает заявки пакетами в порядке поступления
+и одной транзакцией на пакет создаёт регистрации, занимая места по принципу
+"кто раньше подал заявку". Статус заявки доступен по GET /registration-tickets/{id}/.
+
+На SQLite запускается один обработчик; на базах с SELECT ... FOR UPDATE SKIP LOCKED
+обработчики могут работать параллельно.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .capacity import SEAT_STATUSES, reserve_seats
+from .models import EventRegistration, RegistrationTicket
+from .signals import touch_events
+
+OPEN_STATUSES = ('PLANNED', 'REGISTRATION_OPEN')
+ENQUEUE_ATTEMPTS = 3
+
+
+def enqueue_registration(event, user, notes_by_user=None):
+    """
+    Ставит заявку в очередь. Повторная заявка, пока предыдущая не обработана, возвращает её же.
+    Возвращает (заявка, создана ли новая).
+    """
+    for attempt in range(ENQUEUE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                ticket = RegistrationTicket.objects.create(event=event, user=user, notes_by_user=notes_by_user)
+            return ticket, True
+        except IntegrityError:
+            # Мешающая заявка могла быть обработана между INSERT и выборкой - тогда создаём заново
+            ticket = RegistrationTicket.objects.filter(event=event, user=user, status='QUEUED').first()
+            if ticket is not None:
+                return ticket, False
+            if attempt == ENQUEUE_ATTEMPTS - 1:
+                raise
+
+
+def queue_position(ticket):
+    """
+    Номер заявки в очереди мероприятия (начиная с 1) или None, если она уже обработана.
+    """
+    if ticket.status != 'QUEUED':
+        return None
+    return RegistrationTicket.objects.filter(event_id=ticket.event_id, status='QUEUED', pk__lte=ticket.pk).count()
+
+
+def next_batch(batch_size):
+    queryset = RegistrationTicket.objects.filter(status='QUEUED').select_related('event').order_by('id')
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True, of=('self',))
+    return list(queryset[:batch_size])
+
+
+def drain_queue(batch_size=500):
+    """
+    Обрабатывает один пакет заявок. Возвращает количество обработанных заявок.
+    """
+    with transaction.atomic():
+        tickets = next_batch(batch_size)
+        if not tickets:
+            return 0
+
+        by_event = defaultdict(list)
+        for ticket in tickets:
+            by_event[ticket.event_id].append(ticket)
+
+        now = timezone.now()
+        for event_tickets in by_event.values():
+            try:
+                process_tickets(event_tickets, now)
+            except IntegrityError:
+                # Регистрация могла появиться в обход очереди (POST /registrations/) после выборки
+                # существующих: заявки мероприятия разбираются по одной, остальные не теряются
+                for ticket in event_tickets:
+                    try:
+                        process_tickets([ticket], now)
+                    except IntegrityError:
+                        reset(ticket)
+                        ticket.processed_at = now
+                        reject(ticket, 'Не удалось создать регистрацию')
+
+        RegistrationTicket.objects.bulk_update(tickets, ['status', 'reason', 'registration', 'processed_at'])
+
+    # bulk_create/bulk_update не вызывают сигналы
+    touch_events(list(by_event))
+    return len(tickets)
+
+
+def process_tickets(tickets, now):
+    """
+    Распределяет места и создаёт регистрации по заявкам одного мероприятия.
+    Выполняется в savepoint: при ошибке места и регистрации откатываются, а заявки возвращаются в исходное состояние.
+    """
+    new_registrations = []
+    reopened = []
+    try:
+        with transaction.atomic():
+            allocate_event(tickets, now, new_registrations, reopened)
+            EventRegistration.objects.bulk_create([registration for registration, _ in new_registrations])
+            EventRegistration.objects.bulk_update(reopened, ['status', 'registration_datetime', 'notes_by_user'])
+    except IntegrityError:
+        for ticket in tickets:
+            reset(ticket)
+        raise
+    for registration, ticket in new_registrations:
+        ticket.registration = registration
+
+
+def allocate_event(tickets, now, new_registrations, reopened):
+    """
+    Распределяет места мероприятия между заявками в порядке поступления.
+    """
+    event = tickets[0].event
+    existing = {
+        registration.user_id: registration
+        for registration in EventRegistration.objects.filter(
+            event_id=event.pk, user_id__in=[ticket.user_id for ticket in tickets]
+        )
+    }
+
+    candidates = []
+    for ticket in tickets:
+        ticket.processed_at = now
+        registration = existing.get(ticket.user_id)
+        if event.status not in OPEN_STATUSES:
+            reject(ticket, f'Регистрация недоступна. Текущий статус: {event.get_status_display()}')
+        elif event.registration_deadline and event.registration_deadline < now:
+            reject(ticket, 'Срок регистрации истек')
+        elif event.organizer_id == ticket.user_id:
+            reject(ticket, 'Организатор не может зарегистрироваться на своё мероприятие')
+        elif registration is not None and registration.status in SEAT_STATUSES:
+            reject(ticket, 'Вы уже зарегистрированы на это мероприятие')
+        else:
+            candidates.append(ticket)
+
+    granted = reserve_seats(event.pk, len(candidates))
+    for ticket in candidates[granted:]:
+        reject(ticket, 'Достигнуто максимальное количество участников')
+
+    for ticket in candidates[:granted]:
+        ticket.status = 'ACCEPTED'
+        registration = existing.get(ticket.user_id)
+        if registration is None:
+            registration = EventRegistration(event_id=event.pk, user_id=ticket.user_id, registration_datetime=now,
+                                             notes_by_user=ticket.notes_by_user)
+            new_registrations.append((registration, ticket))
+        else:
+            registration.status = 'PENDING_APPROVAL'
+            registration.registration_datetime = now
+            registration.notes_by_user = ticket.notes_by_user
+            ticket.registration = registration
+            reopened.append(registration)
+
+
+def reset(ticket):
+    ticket.status = 'QUEUED'
+    ticket.reason = None
+    ticket.registration = None
+    ticket.processed_at = None
+
+
+def reject(ticket, reason):
+    ticket.status = 'REJECTED'
+    ticket.reason = reason
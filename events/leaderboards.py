@@ -0,0 +1,130 @@
+"""
+Рейтинги участников по видам спорта за год и за всё время.
+
+Рейтинг хранится в таблице LeaderboardEntry и пересчитывается только для затронутых
+участников: при изменении результата агрегируются результаты одного участника
+в одном виде спорта, а не вся таблица результатов. Поэтому чтение рейтинга стоит O(страница).
+Очки начисляются по месту в таблице мест мероприятия (EventResultQuerySet.with_rank - то же место,
+что в /standings/): POINTS_BY_POSITION. Результаты без разобранного score мест и очков не получают.
+Место зависит от результатов других участников, поэтому при изменении результата
+пересчитываются все участники мероприятия.
+
+Полный пересчёт: manage.py rebuild_leaderboards.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractYear
+from django.utils import timezone
+
+from .models import Event, EventResult, LeaderboardEntry
+
+POINTS_BY_POSITION = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+STAT_FIELDS = ['points', 'results_count', 'wins', 'podiums', 'best_position']
+REFRESH_BATCH_SIZE = 500
+
+
+def periods_for(start_datetime):
+    return LeaderboardEntry.ALL_TIME, str(timezone.localtime(start_datetime).year)
+
+
+def aggregates():
+    """
+    Агрегаты строки рейтинга по результатам, аннотированным местом (EventResultQuerySet.with_rank).
+    """
+    ranked = Q(normalized_score__isnull=False)
+    points = Case(
+        *(When(ranked & Q(rank=position), then=Value(value))
+          for position, value in enumerate(POINTS_BY_POSITION, 1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return {
+        'points': Coalesce(Sum(points), 0),
+        'results_count': Count('pk'),
+        'wins': Count('pk', filter=ranked & Q(rank=1)),
+        'podiums': Count('pk', filter=ranked & Q(rank__lte=3)),
+        'best_position': Min(Case(When(ranked, then=F('rank')), output_field=IntegerField())),
+    }
+
+
+def refresh_entries(sport_type_id, period, user_ids):
+    """
+    Пересчитывает строки рейтинга (вид спорта, период) для указанных участников.
+    """
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    for start in range(0, len(user_ids), REFRESH_BATCH_SIZE):
+        batch = user_ids[start:start + REFRESH_BATCH_SIZE]
+        results = EventResult.objects.filter(event__sport_type_id=sport_type_id, participant_user_id__in=batch)
+        if period != LeaderboardEntry.ALL_TIME:
+            results = results.filter(event__start_datetime__year=int(period))
+        results = results.with_rank()
+        entries = [
+            LeaderboardEntry(sport_type_id=sport_type_id, period=period, user_id=row.pop('participant_user_id'), **row)
+            for row in results.order_by().values('participant_user_id').annotate(**aggregates())
+        ]
+        with transaction.atomic():
+            LeaderboardEntry.objects.filter(sport_type_id=sport_type_id, period=period, user_id__in=batch).exclude(
+                user_id__in=[entry.user_id for entry in entries]
+            ).delete()
+            LeaderboardEntry.objects.bulk_create(
+                entries, update_conflicts=True, unique_fields=['sport_type', 'period', 'user'],
+                update_fields=STAT_FIELDS + ['updated_at'],
+            )
+
+
+def refresh_event_participants(event_id, user_ids, sport_type_id=None, start_datetime=None):
+    """
+    Пересчитывает рейтинги участников мероприятия (по его текущим или переданным виду спорта и дате):
+    переданных user_ids и всех участников с результатами, места которых могли сдвинуться.
+    """
+    user_ids = set(user_ids) | set(
+        EventResult.objects.filter(event_id=event_id).exclude(participant_user=None)
+        .values_list('participant_user_id', flat=True)
+    )
+    if sport_type_id is None or start_datetime is None:
+        sport_type_id, start_datetime = Event.objects.filter(pk=event_id).values_list(
+            'sport_type_id', 'start_datetime'
+        ).first() or (None, None)
+        if sport_type_id is None:
+            return
+    for period in periods_for(start_datetime):
+        refresh_entries(sport_type_id, period, user_ids)
+
+
+def rebuild_leaderboards(sport_type_ids=None, batch_size=1000):
+    """
+    Полный пересчёт рейтингов (или рейтингов указанных видов спорта). Возвращает количество строк.
+    """
+    entries = LeaderboardEntry.objects.all()
+    results = EventResult.objects.filter(participant_user__isnull=False).order_by()
+    if sport_type_ids:
+        entries = entries.filter(sport_type_id__in=sport_type_ids)
+        results = results.filter(event__sport_type_id__in=sport_type_ids)
+    results = results.with_rank()
+
+    groupings = [
+        results.values('event__sport_type_id', 'participant_user_id'),
+        results.annotate(year=ExtractYear('event__start_datetime'))
+        .values('event__sport_type_id', 'participant_user_id', 'year'),
+    ]
+    created = 0
+    with transaction.atomic():
+        entries.delete()
+        for grouping in groupings:
+            batch = []
+            for row in grouping.annotate(**aggregates()).iterator(chunk_size=batch_size):
+                year = row.pop('year', None)
+                batch.append(LeaderboardEntry(
+                    sport_type_id=row.pop('event__sport_type_id'),
+                    period=str(year) if year is not None else LeaderboardEntry.ALL_TIME,
+                    user_id=row.pop('participant_user_id'),
+                    **row,
+                ))
+                if len(batch) >= batch_size:
+                    LeaderboardEntry.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            LeaderboardEntry.objects.bulk_create(batch)
+            created += len(batch)
+    return created
+
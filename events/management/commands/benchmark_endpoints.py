@@ -0,0 +1,121 @@
+import platform
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from events.benchmarks import (
+    DEFAULT_ITERATIONS, DEFAULT_MIN_DELTA_MS, DEFAULT_THRESHOLD, DEFAULT_WARMUP,
+    compare, load_baseline, run_benchmarks, run_registration_load, save_baseline,
+)
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p95 времени, количество SQL-запросов и размер ответа для всех маршрутов API '
+            'на отдельной тестовой БД со сгенерированными данными и сравнивает с эталоном '
+            '(время - только с --compare-latency)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Пользователей в тестовых данных')
+        parser.add_argument('--events', type=int, default=2000, help='Мероприятий в тестовых данных')
+        parser.add_argument('--registrations', type=int, default=20000, help='Регистраций в тестовых данных')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора тестовых данных')
+        parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                            help='Замеров на сценарий')
+        parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP,
+                            help='Прогонов на сценарий без замера')
+        parser.add_argument('--only', default='',
+                            help='Подстроки имён сценариев через запятую')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Файл эталона (JSON)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Сохранить результаты как новый эталон вместо сравнения')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Допустимый рост размера ответа и времени (доля)')
+        parser.add_argument('--compare-latency', action='store_true',
+                            help='Считать регрессией и рост p50/p95 (только на машине, где снят эталон)')
+        parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS,
+                            help='С --compare-latency: рост времени ниже этого значения не считается регрессией')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Не отключать кэш публичных ответов (по умолчанию замеряются сами view)')
+        parser.add_argument('--registration-load', type=int, default=0, metavar='THREADS',
+                            help='Дополнительно замерить параллельные регистрации из THREADS потоков')
+
+    def handle(self, *args, **options):
+        baseline_path = Path(options['baseline'])
+        dataset = {key: options[key] for key in ('users', 'events', 'registrations', 'seed')}
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Генерация тестовых данных...')
+            call_command('generate_load_data', base_date=timezone.localdate().isoformat(),
+                         stdout=StringIO(), **dataset)
+            self.stdout.write(f'{"Сценарий":<32}{"Статус":>7}{"p50, мс":>10}{"p95, мс":>10}'
+                              f'{"SQL":>6}{"Байт":>10}')
+            with override_settings(EVENTS_CACHE_ENABLED=options['with_cache']):
+                results, errors = run_benchmarks(
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    only=[part for part in options['only'].split(',') if part],
+                    progress=self.report,
+                )
+            if options['registration_load']:
+                load = run_registration_load(threads=options['registration_load'])
+                self.stdout.write(
+                    f"Параллельные регистрации ({options['registration_load']} потоков): "
+                    f"{load['requests']} попыток за {load['seconds']:.2f} с, "
+                    f"{load['requests_per_second']:.1f} в секунду, занято мест {load['seats_taken']} "
+                    f"из {load['capacity']}"
+                )
+                if load['registered'] != load['capacity'] or load['seats_taken'] != load['capacity']:
+                    errors.append(f"registration-load: занято мест {load['seats_taken']}, "
+                                  f"успешных регистраций {load['registered']}, мест {load['capacity']}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if errors:
+            raise CommandError('Сценарии завершились с неожиданным статусом:\n' + '\n'.join(errors))
+
+        if options['update_baseline']:
+            save_baseline(baseline_path, results, {
+                'dataset': dataset,
+                'iterations': options['iterations'],
+                'with_cache': options['with_cache'],
+                'created_at': timezone.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            })
+            self.stdout.write(self.style.SUCCESS(f'Эталон сохранён: {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(
+                f'Эталон {baseline_path} не найден, сохраните его с --update-baseline'
+            ))
+            return
+        baseline = load_baseline(baseline_path)
+        if baseline['meta'].get('dataset') != dataset:
+            self.stdout.write(self.style.WARNING(
+                f"Эталон снят на других данных ({baseline['meta'].get('dataset')}), сравнение может быть неточным"
+            ))
+        regressions = compare(results, baseline['results'], options['threshold'], options['min_delta_ms'],
+                              latency=options['compare_latency'])
+        if regressions:
+            raise CommandError('Регрессии относительно эталона:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def report(self, name, metrics):
+        self.stdout.write(
+            f"{name:<32}{metrics['status']:>7}{metrics['p50_ms']:>10.1f}{metrics['p95_ms']:>10.1f}"
+            f"{metrics['queries']:>6}{metrics['bytes']:>10}"
+        )
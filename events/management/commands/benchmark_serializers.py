@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from events.catalog import invalidate_catalog
+from events.compiled import CompiledSerializer
+from events.models import User, SportType, EventType, Location, Event, EventResult
+from events.serializers import EventSerializer, EventResultSerializer, LocationSerializer
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость обычных сериализаторов и быстрого режима (events/compiled.py) '
+            'на временных данных, которые откатываются после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='20,100,1000',
+                            help='Размеры выборок через запятую')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество повторов, берётся лучший результат')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['rows'].split(',')]
+        self.context = {'request': Request(APIRequestFactory().get('/api/'))}
+
+        self.stdout.write(f'{"Выборка":<12}{"Строк":>8}{"Обычный, мс":>14}{"Быстрый, мс":>14}{"Ускорение":>12}')
+        try:
+            with transaction.atomic():
+                self.create_data(max(sizes))
+                invalidate_catalog()
+                cases = [
+                    ('events', EventSerializer, Event.objects.for_serialization().order_by('start_datetime', 'id')),
+                    ('results', EventResultSerializer, EventResult.objects.for_serialization().order_by('id')),
+                    ('locations', LocationSerializer, Location.objects.for_serialization().order_by('id')),
+                ]
+                for name, serializer_class, queryset in cases:
+                    for size in sizes:
+                        self.compare(name, serializer_class, queryset, size, options['repeat'])
+                transaction.set_rollback(True)
+        finally:
+            invalidate_catalog()
+
+    def create_data(self, count):
+        user = User.objects.create_user(f'benchmark-{time.time_ns()}@example.com', 'Бенчмарк')
+        sport_type = SportType.objects.create(name=f'Бенчмарк {time.time_ns()}')
+        event_type = EventType.objects.create(name=f'Бенчмарк {time.time_ns()}')
+        locations = Location.objects.bulk_create(
+            Location(name=f'Место {i}', address='ул. Тестовая, 1', city='Москва', city_key='москва',
+                     latitude=55.75, longitude=37.61, created_by_user=user)
+            for i in range(count)
+        )
+        now = timezone.now()
+        events = Event.objects.bulk_create(
+            Event(title=f'Мероприятие {i}', description='Описание', organizer=user, sport_type=sport_type,
+                  event_type=event_type, location=locations[i], start_datetime=now, entry_fee='100.00')
+            for i in range(count)
+        )
+        EventResult.objects.bulk_create(
+            EventResult(event=event, participant_user=user, position=1, score='10', recorded_by_user=user)
+            for event in events
+        )
+
+    def measure(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data
+
+    def compare(self, name, serializer_class, queryset, size, repeat):
+        def regular():
+            return serializer_class(list(queryset[:size]), many=True, context=self.context).data
+
+        def compiled():
+            plan = CompiledSerializer(serializer_class(context=self.context), queryset)
+            return plan.render(plan.values(queryset)[:size])
+
+        regular_time, regular_data = self.measure(regular, repeat)
+        compiled_time, compiled_data = self.measure(compiled, repeat)
+        if json.dumps(regular_data, default=str) != json.dumps(compiled_data, default=str):
+            self.stderr.write(self.style.ERROR(f'{name}: ответы быстрого режима отличаются'))
+
+        self.stdout.write(
+            f'{name:<12}{size:>8}{regular_time * 1000:>14.1f}{compiled_time * 1000:>14.1f}'
+            f'{regular_time / compiled_time:>11.1f}x'
+        )
@@ -0,0 +1,349 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from events.cache import bump_versions
+from events.capacity import SEAT_STATUSES
+from events.catalog import invalidate_catalog
+from events.geo import encode_geohash
+from events.leaderboards import rebuild_leaderboards
+from events.models import (
+    User, SportType, EventType, Location, Event, EventRegistration, EventResult, normalize_city
+)
+from events.scoring import ASC, DESC, DURATION, POINTS, resolve_rule
+from events.search import get_search_backend
+
+# (город, широта, долгота, вес)
+CITIES = (
+    ('Москва', 55.7558, 37.6173, 35),
+    ('Санкт-Петербург', 59.9343, 30.3351, 15),
+    ('Новосибирск', 55.0084, 82.9357, 6),
+    ('Екатеринбург', 56.8389, 60.6057, 6),
+    ('Казань', 55.7961, 49.1064, 5),
+    ('Нижний Новгород', 56.2965, 43.9361, 4),
+    ('Самара', 53.1959, 50.1002, 4),
+    ('Краснодар', 45.0355, 38.9753, 4),
+    ('Ростов-на-Дону', 47.2357, 39.7015, 3),
+    ('Воронеж', 51.6608, 39.2003, 3),
+    ('Пермь', 58.0105, 56.2502, 3),
+    ('Сочи', 43.6028, 39.7342, 3),
+    ('Тюмень', 57.1530, 65.5343, 2),
+    ('Калининград', 54.7104, 20.4522, 2),
+    ('Владивосток', 43.1155, 131.8855, 2),
+)
+
+# (вид спорта, вид результата, направление сортировки, вес)
+SPORTS = (
+    ('Бег', DURATION, ASC, 25),
+    ('Футбол', POINTS, DESC, 18),
+    ('Велоспорт', DURATION, ASC, 10),
+    ('Плавание', DURATION, ASC, 9),
+    ('Йога', POINTS, DESC, 8),
+    ('Баскетбол', POINTS, DESC, 8),
+    ('Теннис', POINTS, DESC, 7),
+    ('Волейбол', POINTS, DESC, 6),
+    ('Шахматы', POINTS, DESC, 5),
+    ('Киберспорт', POINTS, DESC, 4),
+)
+
+# (тип мероприятия, вес)
+EVENT_TYPES = (
+    ('Забег', 20), ('Турнир', 20), ('Тренировка', 25), ('Товарищеский матч', 15),
+    ('Чемпионат', 8), ('Фестиваль', 7), ('Марафон', 5),
+)
+
+PLACES = ('Стадион', 'Парк', 'Спорткомплекс', 'Манеж', 'Бассейн', 'Клуб', 'Набережная', 'Арена')
+STREETS = ('Ленина', 'Мира', 'Советская', 'Спортивная', 'Садовая', 'Победы', 'Гагарина', 'Парковая')
+LEVELS = ('для начинающих', 'для любителей', 'для опытных спортсменов', 'для всей семьи', 'открытый уровень')
+FIRST_NAMES = ('Иван', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Анна', 'Сергей', 'Екатерина', 'Павел', 'Наталья')
+LAST_NAMES = ('Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов', 'Лебедева', 'Новиков', 'Морозова')
+MAX_PARTICIPANTS = (None, None, None, 10, 20, 30, 50, 100, 200, 500, 1000, 5000)
+
+# Распределения статусов регистраций по состоянию мероприятия: (статус, вес)
+REGISTRATION_STATUSES = {
+    'COMPLETED': (('ATTENDED', 75), ('CONFIRMED', 5), ('CANCELLED_BY_USER', 12), ('REJECTED_BY_ORGANIZER', 8)),
+    'OPEN': (('CONFIRMED', 55), ('PENDING_APPROVAL', 30), ('CANCELLED_BY_USER', 10), ('REJECTED_BY_ORGANIZER', 5)),
+    'CANCELLED': (('CANCELLED_BY_USER', 60), ('CONFIRMED', 40)),
+}
+REGISTRATION_PHASE = {
+    'COMPLETED': 'COMPLETED', 'ACTIVE': 'OPEN', 'REGISTRATION_OPEN': 'OPEN', 'REGISTRATION_CLOSED': 'OPEN',
+    'CANCELLED': 'CANCELLED',
+}
+
+# Регистрации на мероприятие распределены по Парето: много маленьких мероприятий и немного крупных
+PARETO_ALPHA = 1.5
+MAX_REGISTRATIONS_PER_EVENT = 20000
+
+
+def weighted(rng, items, weights):
+    return rng.choices(items, weights=weights)[0]
+
+
+def insert_rows(model, fields, rows):
+    """
+    INSERT через executemany из готовых кортежей, без экземпляров моделей и компиляции
+    запроса на каждую строку (для миллионов регистраций в разы быстрее bulk_create).
+    Значения должны быть уже подготовлены для БД.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует большой синтетический набор данных (пользователи, места, мероприятия, регистрации, '
+            'результаты) для нагрузочного тестирования. Данные детерминированы по --seed и --base-date')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Количество пользователей')
+        parser.add_argument('--locations', type=int, default=None,
+                            help='Количество мест (по умолчанию - 1 на 50 пользователей)')
+        parser.add_argument('--events', type=int, default=10000, help='Количество мероприятий')
+        parser.add_argument('--registrations', type=int, default=100000,
+                            help='Примерное общее количество регистраций')
+        parser.add_argument('--results-ratio', type=float, default=0.8,
+                            help='Доля посетивших завершённые мероприятия, для которых создаётся результат')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument('--base-date', default=None,
+                            help='Дата отсчёта ГГГГ-ММ-ДД (по умолчанию - сегодня): мероприятия распределяются '
+                                 'на 2 года назад и 1 год вперёд')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Количество мероприятий, создаваемых одной транзакцией')
+        parser.add_argument('--email-prefix', default='load', help='Префикс email сгенерированных пользователей')
+        parser.add_argument('--password', default='password123',
+                            help='Пароль пользователей (хэшируется один раз для всех)')
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help='Не перестраивать поисковый индекс и рейтинги после генерации')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('Нужна БД, возвращающая id из bulk_create (PostgreSQL, SQLite 3.35+, MariaDB 10.5+)')
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы 2 пользователя')
+        if User.objects.filter(email__startswith=f"{options['email_prefix']}-").exists():
+            raise CommandError(f"Пользователи с префиксом {options['email_prefix']} уже есть, укажите --email-prefix")
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        if options['base_date']:
+            base = datetime.fromisoformat(options['base_date'])
+            self.base = timezone.make_aware(base) if timezone.is_naive(base) else base
+        else:
+            self.base = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        started = time.monotonic()
+
+        self.create_catalogs()
+        self.create_users()
+        self.create_locations(options['locations'] or max(1, options['users'] // 50))
+        totals = self.create_events()
+
+        if not options['skip_indexes']:
+            self.stdout.write('Перестроение поискового индекса и рейтингов...')
+            get_search_backend().rebuild(Event.objects.order_by())
+            rebuild_leaderboards()
+        invalidate_catalog()
+        bump_versions(catalog=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {time.monotonic() - started:.1f} с: пользователей {options['users']}, "
+            f"мест {len(self.locations)}, мероприятий {totals['events']}, регистраций {totals['registrations']}, "
+            f"результатов {totals['results']}"
+        ))
+
+    def create_catalogs(self):
+        self.sports = []
+        for name, kind, order, weight in SPORTS:
+            sport_type, _ = SportType.objects.get_or_create(
+                name=name, defaults={'score_kind': kind, 'score_order': order}
+            )
+            self.sports.append((sport_type, weight))
+        self.event_types = [
+            (EventType.objects.get_or_create(name=name)[0], weight) for name, weight in EVENT_TYPES
+        ]
+
+    def create_users(self):
+        self.stdout.write('Создание пользователей...')
+        # PBKDF2 считается один раз: у всех сгенерированных пользователей одинаковый хэш пароля
+        password = make_password(self.options['password'])
+        prefix = self.options['email_prefix']
+        self.user_ids = []
+        batch_size = 5000
+        for start in range(0, self.options['users'], batch_size):
+            users = User.objects.bulk_create(
+                User(email=f'{prefix}-{i}@example.com', password=password,
+                     display_name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}')
+                for i in range(start, min(start + batch_size, self.options['users']))
+            )
+            self.user_ids.extend(user.pk for user in users)
+        # Организуют мероприятия около 5% пользователей
+        self.organizer_ids = self.user_ids[:max(1, len(self.user_ids) // 20)]
+
+    def create_locations(self, count):
+        self.stdout.write('Создание мест...')
+        weights = [city[3] for city in CITIES]
+        locations = []
+        for i in range(count):
+            city, latitude, longitude, _ = weighted(self.rng, CITIES, weights)
+            # Разброс около 15 км от центра города
+            latitude = Decimal(f'{latitude + self.rng.uniform(-0.13, 0.13):.6f}')
+            longitude = Decimal(f'{longitude + self.rng.uniform(-0.2, 0.2):.6f}')
+            locations.append(Location(
+                name=f'{self.rng.choice(PLACES)} №{i + 1}',
+                address=f'ул. {self.rng.choice(STREETS)}, {self.rng.randint(1, 150)}',
+                city=city,
+                # bulk_create не вызывает Location.save(): производные поля заполняются здесь
+                city_key=normalize_city(city),
+                latitude=latitude,
+                longitude=longitude,
+                geohash=encode_geohash(latitude, longitude),
+                created_by_user_id=self.rng.choice(self.organizer_ids),
+            ))
+        self.locations = [(location.pk, location.city) for location in
+                          Location.objects.bulk_create(locations, batch_size=5000)]
+
+    def event_status(self, start_datetime):
+        days = (start_datetime - self.base).days
+        if days < -1:
+            return weighted(self.rng, ('COMPLETED', 'CANCELLED'), (93, 7))
+        if days <= 1:
+            return weighted(self.rng, ('ACTIVE', 'REGISTRATION_CLOSED', 'CANCELLED'), (80, 15, 5))
+        if days <= 60:
+            return weighted(self.rng, ('REGISTRATION_OPEN', 'REGISTRATION_CLOSED', 'PLANNED', 'CANCELLED'),
+                            (70, 10, 15, 5))
+        return weighted(self.rng, ('PLANNED', 'REGISTRATION_OPEN', 'DRAFT'), (60, 35, 5))
+
+    def registrations_count(self):
+        # Средний размер подбирается по ходу генерации, чтобы общее количество регистраций
+        # было близко к --registrations (у запланированных мероприятий и черновиков их нет)
+        remaining = max(0, self.options['registrations'] - self.registrations_made)
+        share = self.eligible_events / self.events_made if self.events_made >= 100 else 0.75
+        remaining_events = max(1.0, (self.options['events'] - self.events_made) * share)
+        # Среднее распределения Парето с xm=1 равно alpha / (alpha - 1)
+        scale = remaining / remaining_events * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        count = int(scale * self.rng.paretovariate(PARETO_ALPHA))
+        return min(count, MAX_REGISTRATIONS_PER_EVENT, len(self.user_ids) - 1)
+
+    def make_event(self, number):
+        """
+        Мероприятие и его регистрации: [(id пользователя, статус, время регистрации)].
+        """
+        rng = self.rng
+        sport_type = weighted(rng, *zip(*self.sports))
+        event_type = weighted(rng, *zip(*self.event_types))
+        location_id, city = rng.choice(self.locations)
+        start_datetime = self.base + timedelta(days=rng.uniform(-730, 365))
+        start_datetime = start_datetime.replace(minute=rng.choice((0, 30)), second=0, microsecond=0)
+        status = self.event_status(start_datetime)
+        organizer_id = rng.choice(self.organizer_ids)
+        event = Event(
+            title=f'{event_type.name}: {sport_type.name.lower()} в городе {city} №{number + 1}',
+            description=(f'{event_type.name} по направлению «{sport_type.name}» {rng.choice(LEVELS)}. '
+                         f'Место проведения - {city}. Приходите заранее, регистрация на месте за 30 минут.'),
+            organizer_id=organizer_id,
+            sport_type=sport_type,
+            event_type=event_type,
+            location_id=location_id,
+            start_datetime=start_datetime,
+            end_datetime=start_datetime + timedelta(hours=rng.choice((1, 2, 3, 6))),
+            registration_deadline=start_datetime - timedelta(days=1),
+            max_participants=rng.choice(MAX_PARTICIPANTS),
+            status=status,
+            is_public=rng.random() < 0.9,
+            entry_fee=rng.choice((None, Decimal('0.00'), Decimal('300.00'), Decimal('500.00'), Decimal('1500.00'))),
+        )
+
+        registrations = []
+        phase = REGISTRATION_PHASE.get(status)
+        if phase is not None:
+            statuses, weights = zip(*REGISTRATION_STATUSES[phase])
+            seats = 0
+            for index in rng.sample(range(len(self.user_ids)), self.registrations_count()):
+                user_id = self.user_ids[index]
+                if user_id == organizer_id:
+                    continue
+                registration_status = rng.choices(statuses, weights=weights)[0]
+                if registration_status in SEAT_STATUSES:
+                    if event.max_participants is not None and seats >= event.max_participants:
+                        registration_status = 'REJECTED_BY_ORGANIZER'
+                    else:
+                        seats += 1
+                registered_at = start_datetime - timedelta(days=rng.uniform(1, 90))
+                registrations.append((user_id, registration_status, registered_at))
+            event.current_participants_count = seats
+            self.eligible_events += 1
+        self.events_made += 1
+        self.registrations_made += len(registrations)
+        return event, registrations
+
+    def make_results(self, event, registrations):
+        """
+        Результаты части посетивших: [(id участника, место, результат, normalized_score)].
+        """
+        finishers = [
+            user_id for user_id, status, _ in registrations
+            if status == 'ATTENDED' and self.rng.random() < self.options['results_ratio']
+        ]
+        if not finishers:
+            return []
+
+        rule = resolve_rule(event.sport_type, event.event_type)
+        if rule.kind == DURATION:
+            base = self.rng.uniform(900, 7200)
+            values = [base * self.rng.uniform(0.8, 1.6) for _ in finishers]
+        else:
+            values = [self.rng.randint(0, 100) for _ in finishers]
+        values.sort(reverse=rule.order == DESC)
+
+        results = []
+        for position, (user_id, value) in enumerate(zip(finishers, values), 1):
+            if rule.kind == DURATION:
+                seconds = int(value)
+                score = f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+            else:
+                score = str(value)
+            results.append((user_id, position, score, rule.normalize(score)))
+        return results
+
+    def create_events(self):
+        self.stdout.write('Создание мероприятий, регистраций и результатов...')
+        self.events_made = self.eligible_events = self.registrations_made = 0
+        totals = {'events': 0, 'registrations': 0, 'results': 0}
+        total_events = self.options['events']
+        batch_size = self.options['batch_size']
+        adapt = connection.ops.adapt_datetimefield_value
+        for start in range(0, total_events, batch_size):
+            batch = [self.make_event(number) for number in range(start, min(start + batch_size, total_events))]
+            registrations, results = [], []
+            with transaction.atomic():
+                Event.objects.bulk_create([event for event, _ in batch])
+                for event, event_registrations in batch:
+                    registrations.extend(
+                        (event.pk, user_id, status, adapt(registered_at))
+                        for user_id, status, registered_at in event_registrations
+                    )
+                    if event.status == 'COMPLETED':
+                        recorded_at = adapt(event.end_datetime + timedelta(hours=1))
+                        results.extend(
+                            (event.pk, user_id, position, score, normalized_score, event.organizer_id, recorded_at)
+                            for user_id, position, score, normalized_score in self.make_results(event, event_registrations)
+                        )
+                insert_rows(EventRegistration, ['event', 'user', 'status', 'registration_datetime'], registrations)
+                insert_rows(EventResult, ['event', 'participant_user', 'position', 'score', 'normalized_score',
+                                          'recorded_by_user', 'recorded_at'], results)
+
+            totals['events'] += len(batch)
+            totals['registrations'] += len(registrations)
+            totals['results'] += len(results)
+            self.stdout.write(f"  мероприятий {totals['events']}/{total_events}, "
+                              f"регистраций {totals['registrations']}, результатов {totals['results']}")
+        return totals
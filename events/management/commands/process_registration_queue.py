@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.intake import drain_queue
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь заявок на регистрацию пакетами в порядке поступления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество заявок, обрабатываемых одной транзакцией')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, ожидая новые заявки')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Пауза между проверками пустой очереди в режиме --loop (секунды)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = drain_queue(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write(f'Обработано заявок: {processed}')
+            elif not options['loop']:
+                break
+            else:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Всего обработано заявок: {total}'))
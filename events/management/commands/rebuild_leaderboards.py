@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from events.leaderboards import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает рейтинги участников по видам спорта из таблицы результатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sport-type', type=int, action='append', dest='sport_types',
+                            help='Пересчитать только рейтинг указанного вида спорта (можно повторять)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк рейтинга, вставляемых одним запросом')
+
+    def handle(self, *args, **options):
+        created = rebuild_leaderboards(options['sport_types'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Строк рейтинга: {created}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from events.cache import bump_versions
+from events.models import Event
+from events.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс мероприятий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Количество мероприятий, индексируемых за один пакет')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Перестроение поискового индекса...')
+        backend = get_search_backend()
+        total = backend.rebuild(Event.objects.order_by(), chunk_size=options['chunk_size'])
+        # Закэшированные результаты поиска могли быть построены по старому индексу
+        bump_versions()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано мероприятий: {total}'))
@@ -0,0 +1,63 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from events.slow_queries import get_log_path, read_entries
+
+
+class Command(BaseCommand):
+    help = 'Формы медленных SQL-запросов из журнала EVENTS_SLOW_QUERY_LOG, по убыванию суммарного времени'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help='Журнал (по умолчанию EVENTS_SLOW_QUERY_LOG), читается вместе с журналами процессов <имя>-<pid>')
+        parser.add_argument('--limit', type=int, default=10, help='Сколько форм запросов вывести')
+        parser.add_argument('--since', type=float, default=None, help='Только записи за последние N часов')
+        parser.add_argument('--view', default='', help='Только запросы маршрута (event-list, admin:...)')
+        parser.add_argument('--plans', action='store_true', help='Выводить планы выполнения')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['since']) if options['since'] else None
+        shapes = defaultdict(lambda: {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': Counter(), 'call_sites': Counter(),
+            'params': set(), 'plan': None, 'sql': '',
+        })
+        for entry in read_entries(options['log']):
+            if since and parse_datetime(entry['time']) < since:
+                continue
+            if options['view'] and entry.get('view') != options['view']:
+                continue
+            shape = shapes[entry['shape_id']]
+            shape['sql'] = entry['sql']
+            shape['count'] += 1
+            shape['total_ms'] += entry['duration_ms']
+            shape['max_ms'] = max(shape['max_ms'], entry['duration_ms'])
+            shape['views'][entry.get('view') or '-'] += 1
+            if entry.get('call_sites'):
+                shape['call_sites'][entry['call_sites'][0]] += 1
+            shape['params'].add(entry.get('params_fingerprint'))
+            shape['plan'] = entry.get('plan') or shape['plan']
+
+        if not shapes:
+            self.stdout.write(f'Медленных запросов нет ({options["log"] or get_log_path()})')
+            return
+
+        ranked = sorted(shapes.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        for number, (shape_id, shape) in enumerate(ranked[:options['limit']], 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{number}. {shape_id}: всего {shape['total_ms']:.1f} мс, запросов {shape['count']}, "
+                f"среднее {shape['total_ms'] / shape['count']:.1f} мс, максимум {shape['max_ms']:.1f} мс, "
+                f"разных параметров {len(shape['params'])}"
+            ))
+            self.stdout.write(f"   SQL: {shape['sql']}")
+            self.stdout.write('   Маршруты: ' + ', '.join(f'{view} ({count})' for view, count in shape['views'].most_common(3)))
+            if shape['call_sites']:
+                self.stdout.write('   Вызов: ' + ', '.join(
+                    f'{site} ({count})' for site, count in shape['call_sites'].most_common(3)
+                ))
+            if options['plans'] and shape['plan']:
+                self.stdout.write('   План:')
+                for line in shape['plan'].splitlines():
+                    self.stdout.write(f'     {line}')
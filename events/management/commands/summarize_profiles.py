@@ -0,0 +1,70 @@
+import io
+import pstats
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.profiling import get_profile_dir
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = ('Сводка по профилям запросов из EVENTS_PROFILE_DIR: самые затратные функции '
+            'по всем файлам .prof (cProfile) и .folded (сэмплер)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Каталог профилей (по умолчанию EVENTS_PROFILE_DIR)')
+        parser.add_argument('--view', default='',
+                            help='Учитывать только профили, в имени файла которых есть эта строка (event-list)')
+        parser.add_argument('--limit', type=int, default=25, help='Сколько функций вывести')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative',
+                            help='Сортировка для профилей cProfile')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else get_profile_dir()
+        if not directory.is_dir():
+            raise CommandError(f'Каталог {directory} не найден')
+
+        def collect(suffix):
+            return sorted(path for path in directory.glob(f'*{suffix}') if options['view'] in path.name)
+
+        profiles, folded = collect('.prof'), collect('.folded')
+        if not profiles and not folded:
+            self.stdout.write('Профилей не найдено')
+            return
+        if profiles:
+            self.summarize_cprofile(profiles, options['sort'], options['limit'])
+        if folded:
+            self.summarize_folded(folded, options['limit'])
+
+    def summarize_cprofile(self, paths, sort, limit):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'cProfile: {len(paths)} файлов, сортировка {sort}'))
+        output = io.StringIO()
+        stats = pstats.Stats(*map(str, paths), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        self.stdout.write(output.getvalue())
+
+    def summarize_folded(self, paths, limit):
+        """
+        Собственное время - сэмплы, где функция на вершине стека; общее - где она есть в стеке.
+        """
+        own, total, samples = Counter(), Counter(), 0
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if not stack:
+                        continue
+                    count = int(count)
+                    frames = stack.split(';')
+                    samples += count
+                    own[frames[-1]] += count
+                    for frame in set(frames):
+                        total[frame] += count
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сэмплер: {len(paths)} файлов, {samples} сэмплов'))
+        self.stdout.write(f'{"Собств., %":>11}{"Общее, %":>10}  Функция')
+        for frame, count in own.most_common(limit):
+            self.stdout.write(f'{count * 100 / samples:>11.1f}{total[frame] * 100 / samples:>10.1f}  {frame}')
@@ -0,0 +1,311 @@
+"""
+Метрики приложения в текстовом формате Prometheus (GET /metrics).
+
+Каждый процесс пишет свои значения в собственный файл EVENTS_METRICS_DIR/metrics-<pid>.db,
+отображённый в память (mmap): увеличение счётчика - запись 8 байт без системных вызовов.
+/metrics читает файлы всех процессов и суммирует значения, поэтому ответ одинаков
+независимо от того, какой воркер его обработал. Счётчики умерших процессов продолжают
+учитываться, а значения gauge (запросы в обработке) - только у живых процессов.
+Каталог нужно очищать при перезапуске сервиса, как и в multiprocess-режиме prometheus_client.
+
+Метрики:
+- запросы, их длительность (гистограмма) и ошибки по маршруту (event-list, event-register,
+  registration-status-update, login, ...) и HTTP-методу;
+- количество и время SQL-запросов по маршруту;
+- попадания и промахи кэша ответов (events/cache.py) и их доля;
+- запросы в обработке.
+Django не использует пул соединений с БД, поэтому вместо статистики пула отдаются счётчики запросов к БД.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+PREFIX = 'sports_api_'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# имя: (тип, описание)
+METRICS = {
+    'http_requests_total': ('counter', 'Обработанные запросы по маршруту, методу и классу статуса'),
+    'http_request_errors_total': ('counter', 'Запросы, завершившиеся ошибкой сервера (5xx)'),
+    'http_request_duration_seconds': ('histogram', 'Длительность обработки запроса'),
+    'http_requests_in_flight': ('gauge', 'Запросы в обработке'),
+    'db_queries_total': ('counter', 'SQL-запросы по маршруту'),
+    'db_query_duration_seconds_total': ('counter', 'Суммарное время SQL-запросов по маршруту'),
+    'cache_requests_total': ('counter', 'Обращения к кэшу ответов: hit или miss'),
+}
+
+HEADER = struct.Struct('i')
+INITIAL_SIZE = 64 * 1024
+# Метод запроса приходит от клиента: прочие значения сводятся в 'other', чтобы число рядов было ограничено
+HTTP_METHODS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'})
+MAX_CACHED_KEYS = 10000
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_metrics_dir():
+    return Path(get_setting('EVENTS_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'sports_api_metrics')))
+
+
+_keys = {}
+
+
+def make_key(name, labels):
+    cache_key = (name, tuple(labels.items()))
+    key = _keys.get(cache_key)
+    if key is None:
+        if len(_keys) >= MAX_CACHED_KEYS:
+            _keys.clear()
+        key = _keys[cache_key] = json.dumps([name, labels], ensure_ascii=False, sort_keys=True,
+                                            separators=(',', ':'))
+    return key
+
+
+def metric_type(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return 'histogram'
+    return METRICS[name][0]
+
+
+def iter_entries(data):
+    """
+    Записи файла: (ключ, смещение значения). Формат записи: длина ключа (4 байта),
+    ключ в UTF-8 с выравниванием до 8 байт, значение double (8 байт).
+    """
+    used = HEADER.unpack_from(data, 0)[0]
+    position = 8
+    while position < used:
+        length = HEADER.unpack_from(data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+        position += 4 + length + (-(4 + length) % 8)
+        yield key, position
+        position += 8
+
+
+class MmapStore:
+    """
+    Значения метрик одного процесса. Пишет только процесс-владелец, читать файл могут все.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or 8
+        self.positions = dict(iter_entries(self.map)) if self.used > 8 else {}
+        # Файл с тем же pid мог остаться от завершённого процесса: его gauge больше не актуальны
+        for key, position in self.positions.items():
+            if metric_type(json.loads(key)[0]) == 'gauge':
+                struct.pack_into('d', self.map, position, 0.0)
+
+    def position(self, key):
+        position = self.positions.get(key)
+        if position is None:
+            encoded = key.encode()
+            padding = -(4 + len(encoded)) % 8
+            entry = HEADER.pack(len(encoded)) + encoded + b' ' * padding + struct.pack('d', 0.0)
+            if self.used + len(entry) > len(self.map):
+                self.resize(max(len(self.map) * 2, self.used + len(entry)))
+            self.map[self.used:self.used + len(entry)] = entry
+            position = self.used + len(entry) - 8
+            self.used += len(entry)
+            # Длина обновляется после записи, чтобы читатели не увидели недописанную запись
+            HEADER.pack_into(self.map, 0, self.used)
+            self.positions[key] = position
+        return position
+
+    def resize(self, size):
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.position(key)
+            struct.pack_into('d', self.map, position, struct.unpack_from('d', self.map, position)[0] + amount)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Хранилище текущего процесса; после fork воркер открывает собственный файл.
+    """
+    global _store
+    pid, directory = os.getpid(), get_metrics_dir()
+    if _store is None or _store[:2] != (pid, directory):
+        with _store_lock:
+            if _store is None or _store[:2] != (pid, directory):
+                directory.mkdir(parents=True, exist_ok=True)
+                _store = (pid, directory, MmapStore(directory / f'metrics-{pid}.db'))
+    return _store[2]
+
+
+def inc(name, labels=None, amount=1):
+    get_store().add(make_key(name, labels or {}), amount)
+
+
+def observe(name, labels, value, buckets=DURATION_BUCKETS):
+    store = get_store()
+    for bound in buckets:
+        if value <= bound:
+            store.add(make_key(f'{name}_bucket', {**labels, 'le': str(bound)}), 1)
+    store.add(make_key(f'{name}_bucket', {**labels, 'le': '+Inf'}), 1)
+    store.add(make_key(f'{name}_sum', labels), value)
+    store.add(make_key(f'{name}_count', labels), 1)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """
+    {(имя, метки): значение} по файлам всех процессов и количество живых процессов.
+    """
+    values = defaultdict(float)
+    processes = 0
+    for path in get_metrics_dir().glob('metrics-*.db'):
+        try:
+            pid = int(path.stem.split('-', 1)[1])
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (ValueError, OSError):
+            continue
+        alive = is_alive(pid)
+        processes += alive
+        if len(data) < 8:
+            continue
+        for key, position in iter_entries(data):
+            name, labels = json.loads(key)
+            if metric_type(name) == 'gauge' and not alive:
+                continue
+            values[(name, tuple(sorted(labels.items())))] += struct.unpack_from('d', data, position)[0]
+    return values, processes
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{label}="{escape(item)}"' for label, item in labels) + '}'
+    return f'{PREFIX}{name} {value:.17g}'
+
+
+def histogram_order(sample):
+    """
+    Бакеты одной серии подряд по возрастанию le (+Inf - последним), затем _sum и _count.
+    """
+    name, labels, _ = sample
+    series = [item for item in labels if item[0] != 'le']
+    le = dict(labels).get('le')
+    return series, name, float(le) if le is not None else 0.0
+
+
+def render():
+    values, processes = collect()
+    families = defaultdict(list)
+    for (name, labels), value in sorted(values.items()):
+        family = name
+        if metric_type(name) == 'histogram' and name not in METRICS:
+            family = name.rsplit('_', 1)[0]
+        families[family].append((name, labels, value))
+
+    lines = []
+    for family, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {PREFIX}{family} {description}')
+        lines.append(f'# TYPE {PREFIX}{family} {kind}')
+        samples = families.get(family, [])
+        if kind == 'histogram':
+            samples.sort(key=histogram_order)
+        lines.extend(format_sample(*sample) for sample in samples)
+
+    hits = sum(value for (name, labels), value in values.items()
+               if name == 'cache_requests_total' and ('result', 'hit') in labels)
+    total = sum(value for (name, _), value in values.items() if name == 'cache_requests_total')
+    lines += [
+        f'# HELP {PREFIX}cache_hit_ratio Доля попаданий в кэш ответов',
+        f'# TYPE {PREFIX}cache_hit_ratio gauge',
+        format_sample('cache_hit_ratio', (), hits / total if total else 0.0),
+        f'# HELP {PREFIX}worker_processes Процессы, записывающие метрики',
+        f'# TYPE {PREFIX}worker_processes gauge',
+        format_sample('worker_processes', (), processes),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_setting('EVENTS_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        inc('http_requests_in_flight')
+        queries = QueryCounter()
+        started = time.perf_counter()
+        status = 500
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            inc('http_requests_in_flight', amount=-1)
+            self.record(request, status, time.perf_counter() - started, queries)
+
+    @staticmethod
+    def record(request, status, duration, queries):
+        match = request.resolver_match
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        view = {'view': match.view_name if match else 'unmatched', 'method': method}
+        inc('http_requests_total', {**view, 'status': f'{status // 100}xx'})
+        if status >= 500:
+            inc('http_request_errors_total', view)
+        observe('http_request_duration_seconds', view, duration)
+        if queries.count:
+            inc('db_queries_total', view, queries.count)
+            inc('db_query_duration_seconds_total', view, queries.duration)
@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-17 00:29
+
+from django.db import migrations, models
+
+
+def fill_city_key(apps, schema_editor):
+    Location = apps.get_model('events', 'Location')
+    locations = list(Location.objects.only('id', 'city'))
+    for location in locations:
+        location.city_key = ' '.join(location.city.split()).casefold().replace('ё', 'е')
+    Location.objects.bulk_update(locations, ['city_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_remove_sporttype_icon_url_sporttype_icon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='city_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_city_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['start_datetime', 'id'], name='event_public_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['status', 'start_datetime'], name='event_public_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['sport_type', 'start_datetime'], name='event_public_sport_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['event_type', 'start_datetime'], name='event_public_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['city_key'], name='location_city_key_idx'),
+        ),
+    ]
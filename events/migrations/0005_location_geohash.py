@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+from events.geo import encode_geohash
+
+
+def fill_geohash(apps, schema_editor):
+    Location = apps.get_model('events', 'Location')
+    locations = list(Location.objects.filter(latitude__isnull=False, longitude__isnull=False)
+                     .only('id', 'latitude', 'longitude'))
+    for location in locations:
+        location.geohash = encode_geohash(location.latitude, location.longitude)
+    Location.objects.bulk_update(locations, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['geohash'], name='location_geohash_idx'),
+        ),
+    ]
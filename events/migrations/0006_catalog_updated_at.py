@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_location_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventtype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='sporttype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
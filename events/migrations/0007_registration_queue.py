@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-17 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='registration_queue',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RegistrationTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notes_by_user', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('QUEUED', 'В очереди'), ('ACCEPTED', 'Принята'), ('REJECTED', 'Отклонена')], default='QUEUED', max_length=20)),
+                ('reason', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_tickets', to='events.event')),
+                ('registration', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='events.eventregistration')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_tickets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='registrationticket',
+            index=models.Index(condition=models.Q(('status', 'QUEUED')), fields=['id'], name='ticket_queued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrationticket',
+            index=models.Index(condition=models.Q(('status', 'QUEUED')), fields=['event', 'id'], name='ticket_event_queued_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='registrationticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'QUEUED')), fields=('event', 'user'), name='ticket_one_queued_per_user'),
+        ),
+    ]
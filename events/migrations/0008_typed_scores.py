@@ -0,0 +1,68 @@
+# Generated by Django 4.2 on 2026-10-17 01:00
+
+from django.db import migrations, models
+
+
+def normalize_score(score):
+    """
+    normalized_score по правилу, действующему сразу после миграции у всех видов спорта
+    (поля по умолчанию: число, больше - лучше). Копия events.scoring на момент миграции.
+    """
+    text = str(score).strip() if score is not None else ''
+    if not text:
+        return None
+    try:
+        value = float(text.replace(',', '.').replace(' ', ''))
+    except ValueError:
+        return None
+    if value != value or value in (float('inf'), float('-inf')):
+        return None
+    return -value
+
+
+def fill_normalized_score(apps, schema_editor):
+    EventResult = apps.get_model('events', 'EventResult')
+    results = list(EventResult.objects.exclude(score=None).only('id', 'score'))
+    for result in results:
+        result.normalized_score = normalize_score(result.score)
+    EventResult.objects.bulk_update(results, ['normalized_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_registration_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventresult',
+            name='normalized_score',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventtype',
+            name='score_kind',
+            field=models.CharField(blank=True, choices=[('NUMBER', 'Число'), ('DURATION', 'Время'), ('POINTS', 'Очки')], max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventtype',
+            name='score_order',
+            field=models.CharField(blank=True, choices=[('ASC', 'Меньше - лучше'), ('DESC', 'Больше - лучше')], max_length=4, null=True),
+        ),
+        migrations.AddField(
+            model_name='sporttype',
+            name='score_kind',
+            field=models.CharField(choices=[('NUMBER', 'Число'), ('DURATION', 'Время'), ('POINTS', 'Очки')], default='NUMBER', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='sporttype',
+            name='score_order',
+            field=models.CharField(choices=[('ASC', 'Меньше - лучше'), ('DESC', 'Больше - лучше')], default='DESC', max_length=4),
+        ),
+        migrations.RunPython(fill_normalized_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='eventresult',
+            index=models.Index(fields=['event', 'normalized_score'], name='result_event_score_idx'),
+        ),
+    ]
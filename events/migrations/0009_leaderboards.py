@@ -0,0 +1,81 @@
+# Generated by Django 4.2 on 2026-10-17 01:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Case, Count, IntegerField, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractYear
+
+# Копия правила начисления очков на момент миграции (не импортируется из events.leaderboards,
+# чтобы последующие изменения кода не меняли результат миграции)
+POINTS_BY_POSITION = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+
+
+def aggregates():
+    points = Case(
+        *(When(position=position, then=Value(value)) for position, value in enumerate(POINTS_BY_POSITION, 1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return {
+        'points': Coalesce(Sum(points), 0),
+        'results_count': Count('pk'),
+        'wins': Count('pk', filter=Q(position=1)),
+        'podiums': Count('pk', filter=Q(position__lte=3)),
+        'best_position': Min('position'),
+    }
+
+
+def fill_leaderboards(apps, schema_editor):
+    EventResult = apps.get_model('events', 'EventResult')
+    LeaderboardEntry = apps.get_model('events', 'LeaderboardEntry')
+    results = EventResult.objects.filter(participant_user__isnull=False).order_by()
+    groupings = [
+        results.values('event__sport_type_id', 'participant_user_id'),
+        results.annotate(year=ExtractYear('event__start_datetime'))
+        .values('event__sport_type_id', 'participant_user_id', 'year'),
+    ]
+    for grouping in groupings:
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(
+                sport_type_id=row.pop('event__sport_type_id'),
+                period=str(row.pop('year', None) or 'all'),
+                user_id=row.pop('participant_user_id'),
+                **row,
+            )
+            for row in grouping.annotate(**aggregates())
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_typed_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=10)),
+                ('points', models.IntegerField(default=0)),
+                ('results_count', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('podiums', models.IntegerField(default=0)),
+                ('best_position', models.IntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sport_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='events.sporttype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['sport_type', 'period', '-points', 'id'], name='leaderboard_points_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('sport_type', 'period', 'user'), name='leaderboard_entry_unique'),
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
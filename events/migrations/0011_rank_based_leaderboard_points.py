@@ -0,0 +1,69 @@
+from django.db import migrations, models
+from django.db.models import Case, Count, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractYear
+
+# Копия правила начисления очков на момент миграции (не импортируется из events.leaderboards,
+# чтобы последующие изменения кода не меняли результат миграции): очки по месту в таблице мест
+POINTS_BY_POSITION = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+
+
+def with_rank(EventResult, results):
+    better = (
+        EventResult.objects
+        .filter(event=OuterRef('event'), normalized_score__lt=OuterRef('normalized_score'))
+        .order_by()
+        .values('event')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return results.annotate(rank=Coalesce(Subquery(better, output_field=models.IntegerField()), 0) + 1)
+
+
+def aggregates():
+    ranked = Q(normalized_score__isnull=False)
+    points = Case(
+        *(When(ranked & Q(rank=position), then=Value(value))
+          for position, value in enumerate(POINTS_BY_POSITION, 1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return {
+        'points': Coalesce(Sum(points), 0),
+        'results_count': Count('pk'),
+        'wins': Count('pk', filter=ranked & Q(rank=1)),
+        'podiums': Count('pk', filter=ranked & Q(rank__lte=3)),
+        'best_position': Min(Case(When(ranked, then=F('rank')), output_field=IntegerField())),
+    }
+
+
+def refill_leaderboards(apps, schema_editor):
+    EventResult = apps.get_model('events', 'EventResult')
+    LeaderboardEntry = apps.get_model('events', 'LeaderboardEntry')
+    results = with_rank(EventResult, EventResult.objects.filter(participant_user__isnull=False).order_by())
+    groupings = [
+        results.values('event__sport_type_id', 'participant_user_id'),
+        results.annotate(year=ExtractYear('event__start_datetime'))
+        .values('event__sport_type_id', 'participant_user_id', 'year'),
+    ]
+    LeaderboardEntry.objects.all().delete()
+    for grouping in groupings:
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(
+                sport_type_id=row.pop('event__sport_type_id'),
+                period=str(row.pop('year', None) or 'all'),
+                user_id=row.pop('participant_user_id'),
+                **row,
+            )
+            for row in grouping.annotate(**aggregates())
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_token_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_leaderboards, migrations.RunPython.noop),
+    ]
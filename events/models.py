@@ -1,7 +1,13 @@
+import sys
+
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 
+from .scoring import DESC, NUMBER, SCORE_KIND_CHOICES, SCORE_ORDER_CHOICES
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email, display_name, password=None, **extra_fields):
@@ -40,11 +46,51 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class TokenUser(User):
+    """
+    Пользователь JWT-запроса, собранный из кэша пользователей процесса (см. events/authentication.py).
+
+    Данные кэша могут отставать от БД на EVENTS_AUTH_USER_CACHE_TTL секунд, поэтому save()
+    без update_fields записывает только изменённые поля и не возвращает в БД устаревшие
+    значения (например, is_active деактивированного пользователя). Для ORM это обычный User
+    (тот же pk и конкретная модель), поэтому его можно сравнивать с организатором
+    мероприятия и передавать во внешние ключи.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None and kwargs.get('update_fields') is None and not self._state.adding:
+            changed = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname in loaded
+                and getattr(self, field.attname) != loaded[field.attname]
+            ]
+            if changed:
+                changed += [field.attname for field in self._meta.concrete_fields
+                            if getattr(field, 'auto_now', False) and field.attname not in changed]
+            kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+
 class SportType(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     # Изменяем CharField на ImageField
     icon = models.ImageField(upload_to='sport_type_icons/', blank=True, null=True) # Изменено
+    # Вид результата и направление сортировки (см. events/scoring.py)
+    score_kind = models.CharField(max_length=20, choices=SCORE_KIND_CHOICES, default=NUMBER)
+    score_order = models.CharField(max_length=4, choices=SCORE_ORDER_CHOICES, default=DESC)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -59,24 +105,235 @@ class SportType(models.Model):
 class EventType(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
+    # Переопределяют правило результатов вида спорта, если заданы
+    score_kind = models.CharField(max_length=20, choices=SCORE_KIND_CHOICES, blank=True, null=True)
+    score_order = models.CharField(max_length=4, choices=SCORE_ORDER_CHOICES, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+def normalize_city(city):
+    """
+    Нормализованный ключ города: без лишних пробелов, в нижнем регистре, "ё" -> "е".
+    """
+    return ' '.join(city.split()).casefold().replace('ё', 'е')
+
+
+def prefix_range(key):
+    """
+    Границы [start, end) для поиска по префиксу через индексный диапазон вместо LIKE.
+    end = None - верхней границы нет (префикс из максимальных символов Unicode).
+    """
+    start = key
+    while key and key[-1] == chr(sys.maxunicode):
+        key = key[:-1]
+    if not key:
+        return start, None
+    code = ord(key[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        # Суррогаты нельзя сохранить в строке БД, следующий допустимый символ - U+E000
+        code = 0xE000
+    return start, key[:-1] + chr(code)
+
+
+def prefix_filter(lookup, key):
+    """
+    Q для поиска по префиксу key в поле lookup через индексный диапазон.
+    """
+    start, end = prefix_range(key)
+    condition = Q(**{f'{lookup}__gte': start})
+    if end is not None:
+        condition &= Q(**{f'{lookup}__lt': end})
+    return condition
+
+
+class LocationQuerySet(models.QuerySet):
+    SERIALIZER_RELATIONS = {'created_by_user': {}}
+
+    def for_serialization(self, fieldset=None):
+        """
+        Подготовка queryset для LocationSerializer с учётом ?fields= / ?expand=
+        """
+        from .fieldsets import SparseFieldset
+
+        fieldset = fieldset or SparseFieldset()
+        related = fieldset.select_related(self.SERIALIZER_RELATIONS)
+        queryset = self.select_related(*related) if related else self
+        if fieldset.fields is not None:
+            queryset = queryset.only(*fieldset.only_fields(self.model, related))
+        return queryset
+
+
 class Location(models.Model):
     name = models.CharField(max_length=150)
     address = models.CharField(max_length=255)
     city = models.CharField(max_length=100)
+    # Заполняется автоматически из city, используется для индексного поиска по городу
+    city_key = models.CharField(max_length=100, editable=False, default='')
     latitude = models.DecimalField(max_digits=10, decimal_places=8, blank=True, null=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, blank=True, null=True)
+    # Заполняется автоматически из координат, используется для поиска мест поблизости
+    geohash = models.CharField(max_length=12, editable=False, default='')
     details = models.TextField(blank=True, null=True)
     created_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
                                         related_name='created_locations')
 
+    objects = LocationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city_key'], name='location_city_key_idx'),
+            models.Index(fields=['geohash'], name='location_geohash_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}, {self.city}"
 
+    def save(self, *args, **kwargs):
+        from .geo import encode_geohash
+
+        self.city_key = normalize_city(self.city)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'city' in update_fields:
+                update_fields.add('city_key')
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+
+class EventQuerySet(models.QuerySet):
+    # Связи, которые EventSerializer выводит вложенными объектами
+    SERIALIZER_RELATIONS = {'organizer': {}, 'location': {'created_by_user': {}}}
+
+    def with_relations(self):
+        """
+        Подтягивает одним JOIN все связи, которые выводит EventSerializer.
+        Виды спорта и типы мероприятий берутся из снимка справочников (events/catalog.py).
+        """
+        return self.select_related(
+            'organizer',
+            'location',
+            'location__created_by_user',
+        )
+
+    def with_registrations_count(self):
+        """
+        Аннотирует количество регистраций коррелированным подзапросом,
+        чтобы сериализатор не выполнял COUNT для каждой строки.
+        """
+        registrations = (
+            EventRegistration.objects
+            .filter(event=OuterRef('pk'))
+            .order_by()
+            .values('event')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.annotate(
+            registrations_total=Coalesce(Subquery(registrations, output_field=models.IntegerField()), 0)
+        )
+
+    def for_serialization(self, fieldset=None):
+        """
+        Подготовка queryset для EventSerializer.
+
+        При разреженном наборе полей (?fields= / ?expand=, см. events/fieldsets.py) не выполняются
+        JOIN и подсчёт регистраций для полей, которые не попадут в ответ, а колонки ограничиваются через only().
+        """
+        if fieldset is None or fieldset.is_default:
+            return self.with_relations().with_registrations_count()
+
+        related = fieldset.select_related(self.SERIALIZER_RELATIONS)
+        queryset = self.select_related(*related) if related else self
+        if fieldset.includes('registrations_count'):
+            queryset = queryset.with_registrations_count()
+        if fieldset.fields is not None:
+            # start_datetime - ключ сортировки ленты и курсора пагинации
+            queryset = queryset.only(*fieldset.only_fields(self.model, related, always=['start_datetime']))
+        return queryset
+
+
+def prefetch_event(fieldset):
+    """
+    Мероприятие для вложенного EventSerializer: отдельным запросом на страницу, а не на каждую строку.
+    """
+    return Prefetch('event', queryset=Event.objects.for_serialization(fieldset))
+
+
+class EventRegistrationQuerySet(models.QuerySet):
+    SERIALIZER_RELATIONS = {'user': {}}
+
+    def for_serialization(self, fieldset=None):
+        """
+        Подготовка queryset для EventRegistrationSerializer с учётом ?fields= / ?expand=
+        """
+        from .fieldsets import SparseFieldset
+
+        fieldset = fieldset or SparseFieldset()
+        related = fieldset.select_related(self.SERIALIZER_RELATIONS)
+        queryset = self.select_related(*related) if related else self
+        if fieldset.includes('event') and fieldset.expands('event'):
+            queryset = queryset.prefetch_related(prefetch_event(fieldset.child('event')))
+        if fieldset.fields is not None:
+            queryset = queryset.only(*fieldset.only_fields(self.model, related, always=['registration_datetime']))
+        return queryset
+
+
+class EventResultQuerySet(models.QuerySet):
+    SERIALIZER_RELATIONS = {'participant_user': {}, 'recorded_by_user': {}}
+
+    def for_serialization(self, fieldset=None):
+        """
+        Подготовка queryset для EventResultSerializer с учётом ?fields= / ?expand=
+        """
+        from .fieldsets import SparseFieldset
+
+        fieldset = fieldset or SparseFieldset()
+        related = fieldset.select_related(self.SERIALIZER_RELATIONS)
+        queryset = self.select_related(*related) if related else self
+        if fieldset.includes('event') and fieldset.expands('event'):
+            queryset = queryset.prefetch_related(prefetch_event(fieldset.child('event')))
+        if fieldset.fields is not None:
+            queryset = queryset.only(*fieldset.only_fields(self.model, related, always=['recorded_at']))
+        return queryset
+
+    def with_rank(self):
+        """
+        Место в таблице: 1 + количество результатов мероприятия строго лучше (равные делят место).
+        Считается подзапросом по индексу (event, normalized_score) только для выбранных строк,
+        поэтому верно и для отдельной страницы таблицы.
+        """
+        better = (
+            self.model.objects
+            .filter(event=OuterRef('event'), normalized_score__lt=OuterRef('normalized_score'))
+            .order_by()
+            .values('event')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.annotate(rank=Coalesce(Subquery(better, output_field=models.IntegerField()), 0) + 1)
+
+    def standings(self, event):
+        """
+        Таблица мест мероприятия: результаты с разобранным score, лучшие первыми.
+        """
+        return (
+            self.filter(event=event, normalized_score__isnull=False)
+            .select_related('participant_user')
+            .with_rank()
+            .order_by('normalized_score', 'id')
+        )
+
 
 class Event(models.Model):
     STATUS_CHOICES = (
@@ -103,12 +360,29 @@ class Event(models.Model):
     current_participants_count = models.IntegerField(default=0)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='PLANNED')
     is_public = models.BooleanField(default=True)
+    # Регистрация через очередь заявок (для мероприятий с пиковой нагрузкой, см. events/intake.py)
+    registration_queue = models.BooleanField(default=False)
     entry_fee = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     contact_email = models.EmailField(blank=True, null=True)
     contact_phone = models.CharField(max_length=50, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        # Частичные индексы под фильтры и сортировку публичной ленты EventViewSet
+        indexes = [
+            models.Index(fields=['start_datetime', 'id'], condition=Q(is_public=True),
+                         name='event_public_start_idx'),
+            models.Index(fields=['status', 'start_datetime'], condition=Q(is_public=True),
+                         name='event_public_status_idx'),
+            models.Index(fields=['sport_type', 'start_datetime'], condition=Q(is_public=True),
+                         name='event_public_sport_idx'),
+            models.Index(fields=['event_type', 'start_datetime'], condition=Q(is_public=True),
+                         name='event_public_type_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -128,6 +402,8 @@ class EventRegistration(models.Model):
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='PENDING_APPROVAL')
     notes_by_user = models.TextField(blank=True, null=True)
 
+    objects = EventRegistrationQuerySet.as_manager()
+
     class Meta:
         unique_together = ('event', 'user')  # Один пользователь не может зарегистрироваться дважды на одно мероприятие
 
@@ -142,10 +418,112 @@ class EventResult(models.Model):
     team_name_if_applicable = models.CharField(max_length=100, blank=True, null=True)
     position = models.IntegerField(blank=True, null=True)
     score = models.CharField(max_length=100, blank=True, null=True)
+    # Заполняется автоматически из score: меньшее значение всегда лучше (см. events/scoring.py)
+    normalized_score = models.FloatField(blank=True, null=True, editable=False)
     achievement_description = models.TextField(blank=True, null=True)
     recorded_by_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recorded_results')
     recorded_at = models.DateTimeField(default=timezone.now)
 
+    objects = EventResultQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'normalized_score'], name='result_event_score_idx'),
+        ]
+
     def __str__(self):
         participant = self.participant_user.display_name if self.participant_user else self.team_name_if_applicable
-        return f"{participant} - {self.event.title}"
\ No newline at end of file
+        return f"{participant} - {self.event.title}"
+
+    def save(self, *args, **kwargs):
+        from .scoring import get_score_rule
+
+        self.normalized_score = get_score_rule(self.event).normalize_or_none(self.score)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'score' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_score'}
+        super().save(*args, **kwargs)
+
+
+class RegistrationTicket(models.Model):
+    """
+    Заявка на регистрацию в очереди мероприятия. Обрабатывается пакетами в порядке поступления.
+    """
+    STATUS_CHOICES = (
+        ('QUEUED', 'В очереди'),
+        ('ACCEPTED', 'Принята'),
+        ('REJECTED', 'Отклонена'),
+    )
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='registration_tickets')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='registration_tickets')
+    notes_by_user = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    reason = models.CharField(max_length=255, blank=True, null=True)
+    registration = models.ForeignKey(EventRegistration, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            # Одна необработанная заявка пользователя на мероприятие
+            models.UniqueConstraint(fields=['event', 'user'], condition=Q(status='QUEUED'),
+                                    name='ticket_one_queued_per_user'),
+        ]
+        indexes = [
+            # Выборка очереди обработчиком и позиция заявки в очереди мероприятия
+            models.Index(fields=['id'], condition=Q(status='QUEUED'), name='ticket_queued_idx'),
+            models.Index(fields=['event', 'id'], condition=Q(status='QUEUED'), name='ticket_event_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.user_id} - {self.event_id} ({self.status})"
+
+
+class LeaderboardEntryQuerySet(models.QuerySet):
+    def with_rank(self):
+        """
+        Место в рейтинге: 1 + количество участников с большим числом очков (равные делят место).
+        """
+        better = (
+            self.model.objects
+            .filter(sport_type=OuterRef('sport_type'), period=OuterRef('period'), points__gt=OuterRef('points'))
+            .order_by()
+            .values('sport_type')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.annotate(rank=Coalesce(Subquery(better, output_field=models.IntegerField()), 0) + 1)
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Строка материализованного рейтинга участника по виду спорта за период (год или всё время).
+    Поддерживается инкрементально при изменении результатов (см. events/leaderboards.py).
+    """
+    ALL_TIME = 'all'
+
+    sport_type = models.ForeignKey(SportType, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    period = models.CharField(max_length=10)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    points = models.IntegerField(default=0)
+    results_count = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    podiums = models.IntegerField(default=0)
+    best_position = models.IntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LeaderboardEntryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sport_type', 'period', 'user'], name='leaderboard_entry_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['sport_type', 'period', '-points', 'id'], name='leaderboard_points_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.sport_type_id} ({self.period}): {self.points}"
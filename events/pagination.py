@@ -0,0 +1,232 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError as APIValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация по паре (поле сортировки, id). Поле с префиксом "-" сортируется по убыванию.
+
+    Следующая страница выбирается условием WHERE (field, id) > (last_field, last_id),
+    поэтому стоимость любой страницы одинакова, а COUNT(*) не выполняется.
+    Курсор - непрозрачная base64-строка с позицией последней/первой записи страницы.
+
+    Если page_number_fallback включён, keyset-режим используется только когда
+    в запросе передан параметр cursor (для первой страницы - пустой: ?cursor=),
+    иначе работает обычная PageNumberPagination.
+
+    В keyset-режиме ?ordering= может задать одно поле из ordering_fields (с "-" - по убыванию),
+    курсор тогда строится по нему. Другие значения ordering - ошибка 400, как и параметры
+    из ranking_params без ordering: их сортировку (релевантность поиска, расстояние) нельзя
+    продолжить курсором, а молча заменять её сортировкой по умолчанию нельзя.
+    """
+    ordering = ('id',)
+    ordering_fields = ()
+    ordering_param = api_settings.ORDERING_PARAM
+    ranking_params = ()
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор'
+    page_number_fallback = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        if not self.is_keyset_request(request):
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.ordering = self.get_ordering(request)
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        field, tiebreaker = self.get_ordering_fields()
+        field_descending = self.ordering[0].startswith('-') != reverse
+        queryset = queryset.order_by(f'-{field}' if field_descending else field,
+                                     f'-{tiebreaker}' if reverse else tiebreaker)
+
+        if position is not None:
+            lookup = 'lt' if reverse else 'gt'
+            field_lookup = 'lt' if field_descending else 'gt'
+            value, last_id = position
+            queryset = queryset.filter(
+                Q(**{f'{field}__{field_lookup}': value}) |
+                Q(**{field: value, f'{tiebreaker}__{lookup}': last_id})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        self.page = rows
+        return rows
+
+    def is_keyset_request(self, request):
+        return not self.page_number_fallback or self.cursor_query_param in request.query_params
+
+    def get_ordering(self, request):
+        """
+        (поле, tiebreaker) keyset-сортировки с учётом ?ordering=
+        """
+        value = request.query_params.get(self.ordering_param)
+        if value is None:
+            for param in self.ranking_params:
+                if request.query_params.get(param, '').strip():
+                    raise APIValidationError({param: (
+                        f'Вместе с {self.cursor_query_param} нужен параметр {self.ordering_param}: '
+                        + ', '.join(self.ordering_fields)
+                    )})
+            return self.ordering
+        field = value.strip()
+        if field.lstrip('-') not in self.ordering_fields:
+            raise APIValidationError({self.ordering_param: (
+                f'Вместе с {self.cursor_query_param} допустима сортировка по одному полю: '
+                + ', '.join(self.ordering_fields)
+            )})
+        return field, self.ordering[1]
+
+    def get_ordering_fields(self, request=None):
+        """
+        Поля курсора без направления; с request - с учётом ?ordering= (до paginate_queryset).
+        """
+        ordering = self.ordering
+        if request is not None and self.is_keyset_request(request):
+            ordering = self.get_ordering(request)
+        field, tiebreaker = ordering
+        return field.lstrip('-'), tiebreaker
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def encode_cursor(self, instance, reverse):
+        field, tiebreaker = self.get_ordering_fields()
+        # Страница может состоять из моделей или из строк values() (см. events/compiled.py)
+        if isinstance(instance, dict):
+            value, last_id = instance[field], instance[tiebreaker]
+        else:
+            value, last_id = getattr(instance, field), getattr(instance, tiebreaker)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = {'p': [value, last_id]}
+        if reverse:
+            payload['r'] = 1
+        token = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        """
+        Возвращает (позиция, обратное направление) или (None, False) для первой страницы.
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        field, tiebreaker = self.get_ordering_fields()
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode()).decode())
+            value, last_id = payload['p']
+            value = model._meta.get_field(field).to_python(value)
+            last_id = model._meta.get_field(tiebreaker).to_python(last_id)
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (value, last_id), reverse
+
+
+class EventKeysetPagination(KeysetPagination):
+    """
+    Лента мероприятий: постраничная навигация или keyset по (start_datetime, id).
+    С cursor можно сортировать по start_datetime или created_at; search и near - только вместе с ordering.
+    """
+    ordering = ('start_datetime', 'id')
+    ordering_fields = ('start_datetime', 'created_at')
+    ranking_params = ('search', 'near')
+    page_number_fallback = True
+
+
+class RegistrationKeysetPagination(KeysetPagination):
+    """
+    Регистрации: постраничная навигация или keyset по (registration_datetime, id).
+    """
+    ordering = ('registration_datetime', 'id')
+    page_number_fallback = True
+
+
+class ResultKeysetPagination(KeysetPagination):
+    """
+    Результаты: постраничная навигация или keyset по (recorded_at, id).
+    """
+    ordering = ('recorded_at', 'id')
+    page_number_fallback = True
+
+
+class StandingsCursorPagination(KeysetPagination):
+    """
+    Курсорная пагинация таблицы мест по (normalized_score, id).
+    """
+    ordering = ('normalized_score', 'id')
+
+
+class LeaderboardCursorPagination(KeysetPagination):
+    """
+    Курсорная пагинация рейтинга по (очки по убыванию, id).
+    """
+    ordering = ('-points', 'id')
+
+
+class RegistrationCursorPagination(KeysetPagination):
+    """
+    Курсорная пагинация регистраций мероприятия.
+    """
+    ordering = ('registration_datetime', 'id')
+
+
+class ResultCursorPagination(KeysetPagination):
+    """
+    Курсорная пагинация результатов мероприятия.
+    """
+    ordering = ('recorded_at', 'id')
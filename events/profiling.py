@@ -0,0 +1,177 @@
+"""
+Профилирование отдельных запросов в рабочем окружении.
+
+ProfilingMiddleware профилирует запрос, если:
+- его прислал сотрудник (is_staff) с заголовком X-Profile: 1 (или X-Profile: sampler),
+  в ответ добавляется X-Profile-File с именем файла;
+- или запрос попал в выборку EVENTS_PROFILE_SAMPLE_RATE (доля от 0 до 1), при необходимости
+  только для маршрутов из EVENTS_PROFILE_VIEWS (например, event-list, event-register).
+
+Профили пишутся в EVENTS_PROFILE_DIR, хранится не больше EVENTS_PROFILE_MAX_FILES последних:
+- cprofile - файл .prof для pstats, snakeviz, flameprof;
+- sampler - статистический сэмплер стека потока запроса раз в EVENTS_PROFILE_SAMPLER_INTERVAL_MS,
+  файл .folded в формате свёрнутых стеков (flamegraph.pl, speedscope). Накладные расходы
+  меньше, чем у cProfile, но короткие функции могут не попасть в выборку.
+
+Сводка по собранным профилям: manage.py summarize_profiles
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+
+from .authentication import TokenUserAuthentication
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILERS = ('cprofile', 'sampler')
+PROFILE_SUFFIXES = {'cprofile': '.prof', 'sampler': '.folded'}
+
+# Один профиль на процесс: cProfile и сэмплер искажают замеры параллельных запросов
+_lock = threading.Lock()
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_profile_dir():
+    return Path(get_setting('EVENTS_PROFILE_DIR', Path(tempfile.gettempdir()) / 'sports_api_profiles'))
+
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """
+    Фоновый поток, который снимает стек потока запроса через sys._current_frames().
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='events-profile-sampler', daemon=True)
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump_stats(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def make_profiler(kind):
+    if kind == 'sampler':
+        return StackSampler(get_setting('EVENTS_PROFILE_SAMPLER_INTERVAL_MS', 2) / 1000)
+    return cProfile.Profile()
+
+
+def is_staff_request(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # Клиенты API авторизуются JWT на уровне DRF, поэтому токен проверяется здесь
+    try:
+        authenticated = TokenUserAuthentication().authenticate(request)
+    except (AuthenticationFailed, TokenError):
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def view_name(request):
+    try:
+        return resolve(request.path_info).view_name
+    except Resolver404:
+        return None
+
+
+def prune_profiles(directory, keep):
+    files = sorted(
+        (path for path in directory.iterdir() if path.suffix in PROFILE_SUFFIXES.values()),
+        key=lambda path: path.stat().st_mtime,
+    )
+    for path in files[:max(0, len(files) - keep)]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        kind, requested = self.choose_profiler(request)
+        if kind is None or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profiler = make_profiler(kind)
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            path = self.save(request, kind, profiler, time.perf_counter() - started)
+        finally:
+            _lock.release()
+
+        if requested:
+            response['X-Profile-File'] = path.name
+        return response
+
+    def choose_profiler(self, request):
+        """
+        (вид профилировщика, запрошен ли заголовком) или (None, False).
+        """
+        default = get_setting('EVENTS_PROFILER', 'cprofile')
+        header = request.META.get(PROFILE_HEADER, '').strip().lower()
+        if header and header not in ('0', 'false') and is_staff_request(request):
+            return (header if header in PROFILERS else default), True
+
+        rate = get_setting('EVENTS_PROFILE_SAMPLE_RATE', 0.0)
+        if rate <= 0 or random.random() >= rate:
+            return None, False
+        views = get_setting('EVENTS_PROFILE_VIEWS', [])
+        if views and view_name(request) not in views:
+            return None, False
+        return default, False
+
+    def save(self, request, kind, profiler, elapsed):
+        directory = get_profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r'[^\w-]+', '_', view_name(request) or request.path_info).strip('_') or 'root'
+        path = directory / (
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{name}-{round(elapsed * 1000)}ms-'
+            f'{os.getpid()}-{random.randrange(16 ** 6):06x}{PROFILE_SUFFIXES[kind]}'
+        )
+        profiler.dump_stats(path)
+        prune_profiles(directory, get_setting('EVENTS_PROFILE_MAX_FILES', 500))
+        return path
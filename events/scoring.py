@@ -0,0 +1,154 @@
+"""
+Типизированные результаты: вид результата (число, время, очки) и направление сортировки
+задаются видом спорта и могут быть переопределены типом мероприятия.
+
+Текстовый score разбирается в число и сохраняется в EventResult.normalized_score так,
+что меньшее значение всегда лучше (для "больше - лучше" значение хранится со знаком минус).
+Поэтому таблица мест строится одним запросом по индексу (event, normalized_score).
+"""
+from dataclasses import dataclass
+
+NUMBER = 'NUMBER'
+DURATION = 'DURATION'
+POINTS = 'POINTS'
+SCORE_KIND_CHOICES = (
+    (NUMBER, 'Число'),
+    (DURATION, 'Время'),
+    (POINTS, 'Очки'),
+)
+
+ASC = 'ASC'
+DESC = 'DESC'
+SCORE_ORDER_CHOICES = (
+    (ASC, 'Меньше - лучше'),
+    (DESC, 'Больше - лучше'),
+)
+
+KIND_HINTS = {
+    NUMBER: 'ожидается число',
+    DURATION: 'ожидается время в формате чч:мм:сс, мм:сс или количество секунд',
+    POINTS: 'ожидается количество очков',
+}
+
+
+def parse_number(text):
+    return float(text.replace(',', '.').replace(' ', ''))
+
+
+def parse_duration(text):
+    """
+    Время в секундах: "1:02:03.5", "41:10" или "2470".
+    """
+    parts = text.replace(',', '.').split(':')
+    if len(parts) > 3:
+        raise ValueError(text)
+    seconds = 0.0
+    for index, part in enumerate(parts):
+        value = float(part)
+        if value < 0 or (index and value >= 60):
+            raise ValueError(text)
+        seconds = seconds * 60 + value
+    return seconds
+
+
+PARSERS = {NUMBER: parse_number, DURATION: parse_duration, POINTS: parse_number}
+
+
+@dataclass(frozen=True)
+class ScoreRule:
+    kind: str = NUMBER
+    order: str = DESC
+
+    def parse(self, score):
+        """
+        Числовое значение результата или None для пустого результата. ValueError - если не разобрать.
+        """
+        if score is None or not str(score).strip():
+            return None
+        value = PARSERS[self.kind](str(score).strip())
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError(score)
+        return value
+
+    def normalize(self, score):
+        value = self.parse(score)
+        if value is None:
+            return None
+        return value if self.order == ASC else -value
+
+    @property
+    def strict(self):
+        """
+        Проверяется ли формат результата. Число - правило по умолчанию, под которым хранятся
+        и результаты в свободной форме ("8.5/9"): они принимаются, но не получают места в таблице.
+        """
+        return self.kind != NUMBER
+
+    def validate(self, score):
+        """
+        normalized_score для сохранения. ValueError - только если правило строгое.
+        """
+        try:
+            return self.normalize(score)
+        except ValueError:
+            if self.strict:
+                raise
+            return None
+
+    def normalize_or_none(self, score):
+        # Для старых данных в свободном формате
+        try:
+            return self.normalize(score)
+        except ValueError:
+            return None
+
+    @property
+    def error_message(self):
+        return f'Некорректный результат: {KIND_HINTS[self.kind]}'
+
+
+def resolve_rule(sport_type, event_type=None):
+    """
+    Правило по представлениям (или объектам) вида спорта и типа мероприятия.
+    """
+    def attr(item, name):
+        if item is None:
+            return None
+        return item.get(name) if hasattr(item, 'get') else getattr(item, name, None)
+
+    return ScoreRule(
+        kind=attr(event_type, 'score_kind') or attr(sport_type, 'score_kind') or NUMBER,
+        order=attr(event_type, 'score_order') or attr(sport_type, 'score_order') or DESC,
+    )
+
+
+def get_score_rule(event):
+    """
+    Правило результатов мероприятия по снимку справочников (без запросов к БД).
+    """
+    from .catalog import get_catalog
+
+    catalog = get_catalog()
+    return resolve_rule(catalog.sport_types.get(event.sport_type_id), catalog.event_types.get(event.event_type_id))
+
+
+def rescore_results(events, batch_size=500):
+    """
+    Пересчитывает normalized_score результатов мероприятий после смены правила
+    и рейтинги их участников (очки зависят от мест по normalized_score).
+    """
+    from .leaderboards import refresh_event_participants
+    from .models import EventResult
+    from .signals import touch_events
+
+    event_ids = []
+    for event in events.select_related('sport_type', 'event_type'):
+        rule = resolve_rule(event.sport_type, event.event_type)
+        results = list(EventResult.objects.filter(event=event).only('id', 'score', 'normalized_score'))
+        for result in results:
+            result.normalized_score = rule.normalize_or_none(result.score)
+        EventResult.objects.bulk_update(results, ['normalized_score'], batch_size=batch_size)
+        if results:
+            event_ids.append(event.pk)
+            refresh_event_participants(event.pk, [], event.sport_type_id, event.start_datetime)
+    touch_events(event_ids, global_version=False)
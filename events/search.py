@@ -0,0 +1,215 @@
+"""
+Полнотекстовый поиск мероприятий.
+
+Бэкенд выбирается настройкой EVENT_SEARCH_BACKEND (путь к классу). По умолчанию
+для SQLite используется индекс FTS5, для остальных СУБД - простой поиск через icontains.
+Индекс поддерживается в актуальном состоянии сигналами (см. events/signals.py),
+полная перестройка - командой rebuild_search_index.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Стеммер Портера (Snowball) для русского языка
+_RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+_PERFECTIVE_GERUND = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+_REFLEXIVE = re.compile(r'(с[яь])$')
+_ADJECTIVE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+_VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+_I = re.compile(r'и$')
+_DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+_DER = re.compile(r'ость?$')
+_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+_SOFT_SIGN = re.compile(r'ь$')
+_NN = re.compile(r'нн$')
+
+
+def stem_russian(word):
+    """
+    Возвращает основу русского слова (алгоритм Snowball Russian).
+    """
+    word = word.lower().replace('ё', 'е')
+    match = _RV.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+
+    # Шаг 1
+    stripped = _PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = _REFLEXIVE.sub('', rv, 1)
+        stripped = _ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = _VERB.sub('', rv, 1)
+            rv = _NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    # Шаг 2
+    rv = _I.sub('', rv, 1)
+
+    # Шаг 3
+    if _DERIVATIONAL.match(rv):
+        rv = _DER.sub('', rv, 1)
+
+    # Шаг 4
+    stripped = _SOFT_SIGN.sub('', rv, 1)
+    if stripped == rv:
+        rv = _SUPERLATIVE.sub('', rv, 1)
+        rv = _NN.sub('н', rv, 1)
+    else:
+        rv = stripped
+
+    return prefix + rv
+
+
+def tokenize(text):
+    """
+    Разбивает текст на нормализованные токены; русские слова приводятся к основе.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall((text or '').casefold().replace('ё', 'е')):
+        if CYRILLIC_RE.search(token):
+            token = stem_russian(token)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def index_text(text):
+    return ' '.join(tokenize(text))
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс бэкенда поиска мероприятий.
+    """
+
+    def index_event(self, event):
+        pass
+
+    def remove_event(self, event_id):
+        pass
+
+    def rebuild(self, queryset, chunk_size=2000):
+        """
+        Полностью перестраивает индекс по переданному queryset. Возвращает количество записей.
+        """
+        return 0
+
+    def filter_queryset(self, queryset, query, ranked=True):
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """
+    Поиск без отдельного индекса: каждое слово запроса должно встречаться в названии или описании.
+    """
+
+    def filter_queryset(self, queryset, query, ranked=True):
+        for term in query.split():
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """
+    Поиск через виртуальную таблицу SQLite FTS5 со стеммингом и префиксным поиском.
+
+    В таблице хранятся основы слов названия и описания, rowid совпадает с id мероприятия.
+    Ранжирование - bm25 с повышенным весом названия.
+    """
+    table_name = 'events_event_fts'
+    title_weight = 10.0
+    description_weight = 1.0
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table_name} USING fts5("
+            f"title, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def drop_table(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table_name}')
+
+    def _insert(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {self.table_name} (rowid, title, description) VALUES (%s, %s, %s)',
+            [(event_id, index_text(title), index_text(description)) for event_id, title, description in rows]
+        )
+
+    def index_event(self, event):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table_name} WHERE rowid = %s', [event.pk])
+            self._insert(cursor, [(event.pk, event.title, event.description)])
+
+    def remove_event(self, event_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table_name} WHERE rowid = %s', [event_id])
+
+    def rebuild(self, queryset, chunk_size=2000):
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table_name}')
+            chunk = []
+            for row in queryset.values_list('id', 'title', 'description').iterator(chunk_size=chunk_size):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    self._insert(cursor, chunk)
+                    total += len(chunk)
+                    chunk = []
+            if chunk:
+                self._insert(cursor, chunk)
+                total += len(chunk)
+            cursor.execute(f"INSERT INTO {self.table_name} ({self.table_name}) VALUES ('optimize')")
+        return total
+
+    def build_match_expression(self, query):
+        """
+        Все слова запроса обязательны, каждое ищется по префиксу (поиск по мере ввода).
+        """
+        return ' '.join('"{}"*'.format(token.replace('"', '')) for token in tokenize(query))
+
+    def filter_queryset(self, queryset, query, ranked=True):
+        """
+        MATCH выполняется подзапросом в том же SQL, что и фильтры ленты (город, даты, статус, near),
+        поэтому ранжируются только подходящие под них мероприятия, без предварительного отсечения.
+        """
+        expression = self.build_match_expression(query)
+        if not expression:
+            return queryset.none()
+        table = self.table_name
+        queryset = queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression]))
+        if ranked:
+            column = f'{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name("id")}'
+            rank = RawSQL(
+                f'SELECT bm25({table}, %s, %s) FROM {table} WHERE {table} MATCH %s AND rowid = {column}',
+                [self.title_weight, self.description_weight, expression]
+            )
+            queryset = queryset.order_by(rank.asc(), 'id')
+        return queryset
+
+
+def get_search_backend():
+    backend_path = getattr(settings, 'EVENT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5SearchBackend()
+    return SimpleSearchBackend()
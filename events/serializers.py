@@ -1,12 +1,19 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from .models import SportType, EventType, Location, Event, EventRegistration, EventResult
+from .capacity import RegistrationError, register_participant
+from .catalog import get_catalog
+from .fieldsets import SparseFieldsMixin
+from .intake import queue_position
+from .scoring import get_score_rule
+from .models import (
+    SportType, EventType, Location, Event, EventRegistration, EventResult, RegistrationTicket, LeaderboardEntry
+)
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -28,7 +35,8 @@ class SportTypeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SportType
-        fields = ['id', 'name', 'description', 'icon', 'icon_url'] # 'icon' для загрузки, 'icon_url' для чтения
+        fields = ['id', 'name', 'description', 'icon', 'icon_url', # 'icon' для загрузки, 'icon_url' для чтения
+                  'score_kind', 'score_order']
         read_only_fields = ['icon_url'] # icon_url только для чтения
         extra_kwargs = {
             'icon': {'write_only': True, 'required': False} # icon только для записи, не обязательное
@@ -46,17 +54,59 @@ class SportTypeSerializer(serializers.ModelSerializer):
 class EventTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = EventType
-        fields = '__all__'
+        exclude = ['updated_at']
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class CatalogField(serializers.Field):
+    """
+    Вид спорта или тип мероприятия по id из снимка справочников (без запросов к БД).
+    """
+    catalog_attr = None
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_item(self, pk):
+        # Промах не перечитывает снимок: иначе несуществующие id из запросов вызывали бы перезагрузку
+        # на каждом запросе. Записи из других процессов появляются после проверки версии справочников
+        # (не реже CHECK_INTERVAL секунд, см. events/catalog.py)
+        return getattr(get_catalog(), self.catalog_attr).get(pk)
+
+    def to_representation(self, value):
+        item = self.get_item(value)
+        return dict(item) if item is not None else None
+
+
+class SportTypeCatalogField(CatalogField):
+    catalog_attr = 'sport_types'
+
+    def to_representation(self, value):
+        data = super().to_representation(value)
+        request = self.context.get('request')
+        if data and data.get('icon_url') and request:
+            data['icon_url'] = request.build_absolute_uri(data['icon_url'])
+        return data
+
+
+class EventTypeCatalogField(CatalogField):
+    catalog_attr = 'event_types'
+
+
+class LocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by_user = UserSerializer(read_only=True)
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Location
-        fields = '__all__'
+        exclude = ['city_key', 'geohash']
         read_only_fields = ['created_by_user']
 
+    def get_distance_km(self, obj):
+        # Аннотируется при поиске рядом с точкой (?near=lat,lon)
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 3) if distance is not None else None
+
     def create(self, validated_data):
         user = self.context['request'].user
         validated_data['created_by_user'] = user
@@ -64,15 +114,16 @@ class LocationSerializer(serializers.ModelSerializer):
 
 
 # Определение EventSerializer до его использования другими сериализаторами
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     organizer = UserSerializer(read_only=True)
-    sport_type = SportTypeSerializer(read_only=True)
+    sport_type = SportTypeCatalogField(source='sport_type_id')
     sport_type_id = serializers.IntegerField(write_only=True)
-    event_type = EventTypeSerializer(read_only=True)
+    event_type = EventTypeCatalogField(source='event_type_id')
     event_type_id = serializers.IntegerField(write_only=True)
     location = LocationSerializer(read_only=True)
     location_id = serializers.IntegerField(write_only=True, required=False)
     registrations_count = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Event
@@ -80,12 +131,30 @@ class EventSerializer(serializers.ModelSerializer):
                   'event_type', 'event_type_id', 'location', 'location_id', 'custom_location_text',
                   'start_datetime', 'end_datetime', 'registration_deadline', 'max_participants',
                   'current_participants_count', 'registrations_count', 'status', 'is_public',
-                  'entry_fee', 'contact_email', 'contact_phone', 'created_at', 'updated_at']
+                  'registration_queue', 'entry_fee', 'contact_email', 'contact_phone', 'distance_km', 'created_at', 'updated_at']
         read_only_fields = ['id', 'organizer', 'current_participants_count', 'created_at', 'updated_at']
 
+    def get_distance_km(self, obj):
+        # Аннотируется при поиске рядом с точкой (?near=lat,lon)
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 3) if distance is not None else None
+
     def get_registrations_count(self, obj):
+        # Значение аннотируется в EventQuerySet.with_registrations_count()
+        if hasattr(obj, 'registrations_total'):
+            return obj.registrations_total
         return obj.registrations.count()
 
+    def validate_sport_type_id(self, value):
+        if SportTypeCatalogField().get_item(value) is None:
+            raise serializers.ValidationError("Вид спорта не найден")
+        return value
+
+    def validate_event_type_id(self, value):
+        if EventTypeCatalogField().get_item(value) is None:
+            raise serializers.ValidationError("Тип мероприятия не найден")
+        return value
+
     def validate(self, data):
         # Проверка дат
         start_datetime = data.get('start_datetime')
@@ -105,7 +174,7 @@ class EventSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class EventRegistrationSerializer(serializers.ModelSerializer):
+class EventRegistrationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.IntegerField(write_only=True, required=False)
     
@@ -159,21 +228,47 @@ class EventRegistrationSerializer(serializers.ModelSerializer):
         user_id = validated_data.pop('user_id', None)
         user = self.context['request'].user if not user_id else User.objects.get(id=user_id)
 
-        # Проверка существования регистрации
-        event = validated_data.get('event')
-        if EventRegistration.objects.filter(event=event, user=user).exists():
-            raise serializers.ValidationError("Вы уже зарегистрированы на это мероприятие")
+        # Место занимается атомарно вместе с созданием регистрации (см. events/capacity.py)
+        event = validated_data.pop('event')
+        try:
+            return register_participant(event, user, **validated_data)
+        except RegistrationError as e:
+            raise serializers.ValidationError(str(e))
 
-        registration = EventRegistration.objects.create(user=user, **validated_data)
 
-        # Увеличение счетчика участников
-        event.current_participants_count += 1
-        event.save()
+class BulkRegistrationStatusSerializer(serializers.Serializer):
+    """
+    Массовая смена статуса регистраций: список ids или фильтр по мероприятию и текущему статусу.
+    """
+    MAX_ITEMS = 5000
 
-        return registration
+    status = serializers.ChoiceField(choices=EventRegistration.STATUS_CHOICES)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_ITEMS)
+    event_id = serializers.IntegerField(required=False)
+    current_status = serializers.ChoiceField(choices=EventRegistration.STATUS_CHOICES, required=False)
 
+    def validate(self, data):
+        if not data.get('ids') and 'event_id' not in data:
+            raise serializers.ValidationError("Необходимо указать ids или event_id")
+        return data
 
-class EventResultSerializer(serializers.ModelSerializer):
+
+class RegistrationTicketSerializer(serializers.ModelSerializer):
+    """
+    Заявка из очереди регистрации; position - место в очереди, пока заявка не обработана.
+    """
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RegistrationTicket
+        fields = ['id', 'event', 'status', 'position', 'reason', 'registration', 'created_at', 'processed_at']
+        read_only_fields = fields
+
+    def get_position(self, obj):
+        return queue_position(obj)
+
+
+class EventResultSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     participant_user = UserSerializer(read_only=True)
     participant_user_id = serializers.IntegerField(write_only=True, required=False)
     recorded_by_user = UserSerializer(read_only=True)
@@ -217,6 +312,12 @@ class EventResultSerializer(serializers.ModelSerializer):
             ).exists():
                 raise serializers.ValidationError("Этот пользователь не зарегистрирован на мероприятие")
 
+        rule = get_score_rule(event)
+        try:
+            rule.validate(data.get('score'))
+        except ValueError:
+            raise serializers.ValidationError({'score': [rule.error_message]})
+
         return data
 
     def create(self, validated_data):
@@ -228,9 +329,104 @@ class EventResultSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ResultRowSerializer(serializers.Serializer):
+    """
+    Строка массовой загрузки результатов. Один экземпляр проверяет все строки загрузки:
+    участники сверяются с заранее загруженным множеством context['participants'] без запросов к БД,
+    score разбирается по правилу мероприятия context['score_rule'] (в normalized_score).
+    """
+    participant_user_id = serializers.IntegerField(required=False, allow_null=True)
+    team_name_if_applicable = serializers.CharField(max_length=100, required=False, allow_null=True,
+                                                    allow_blank=True)
+    position = serializers.IntegerField(required=False, allow_null=True)
+    score = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    achievement_description = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    def validate(self, data):
+        participant_user_id = data.get('participant_user_id')
+        if participant_user_id is None and not data.get('team_name_if_applicable'):
+            raise serializers.ValidationError("Необходимо указать participant_user_id или team_name_if_applicable")
+        if participant_user_id is not None and participant_user_id not in self.context['participants']:
+            raise serializers.ValidationError(
+                {'participant_user_id': ["Этот пользователь не зарегистрирован на мероприятие"]})
+        rule = self.context['score_rule']
+        try:
+            data['normalized_score'] = rule.validate(data.get('score'))
+        except ValueError:
+            raise serializers.ValidationError({'score': [rule.error_message]})
+        return data
+
+
+class UserShortSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'display_name']
+
+
+class EventRegistrationNestedSerializer(serializers.ModelSerializer):
+    """
+    Облегчённое представление регистрации внутри мероприятия (без повторного вложения события).
+    """
+    user = UserShortSerializer(read_only=True)
+
+    class Meta:
+        model = EventRegistration
+        fields = ['id', 'user', 'registration_datetime', 'status', 'notes_by_user']
+        read_only_fields = fields
+
+
+class EventResultNestedSerializer(serializers.ModelSerializer):
+    """
+    Облегчённое представление результата внутри мероприятия (без повторного вложения события).
+    """
+    participant_user = UserShortSerializer(read_only=True)
+
+    class Meta:
+        model = EventResult
+        fields = ['id', 'participant_user', 'team_name_if_applicable', 'position', 'score',
+                  'achievement_description', 'recorded_at']
+        read_only_fields = fields
+
+
+class EventStandingSerializer(EventResultNestedSerializer):
+    """
+    Строка таблицы мест: место считается в SQL (EventResultQuerySet.with_rank), равные результаты делят место.
+    """
+    rank = serializers.IntegerField(read_only=True)
+
+    class Meta(EventResultNestedSerializer.Meta):
+        fields = ['rank'] + EventResultNestedSerializer.Meta.fields
+        read_only_fields = fields
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """
+    Строка рейтинга по виду спорта: место считается в SQL (LeaderboardEntryQuerySet.with_rank).
+    """
+    rank = serializers.IntegerField(read_only=True)
+    user = UserShortSerializer(read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'user', 'sport_type', 'period', 'points', 'results_count', 'wins', 'podiums',
+                  'best_position', 'updated_at']
+        read_only_fields = fields
+
+
 class EventDetailSerializer(EventSerializer):
-    registrations = EventRegistrationSerializer(many=True, read_only=True)
-    results = EventResultSerializer(many=True, read_only=True)
+    # Вложенные коллекции выводятся только по запросу: ?include=registrations,results
+    INCLUDABLE_FIELDS = ('registrations', 'results')
+
+    # Ограниченные выборки заполняются в EventViewSet.get_object
+    registrations = EventRegistrationNestedSerializer(source='included_registrations', many=True, read_only=True)
+    results = EventResultNestedSerializer(source='included_results', many=True, read_only=True)
 
     class Meta(EventSerializer.Meta):
-        fields = EventSerializer.Meta.fields + ['registrations', 'results']
\ No newline at end of file
+        fields = EventSerializer.Meta.fields + ['registrations', 'results']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        include = self.context.get('include', ())
+        for field_name in self.INCLUDABLE_FIELDS:
+            if field_name not in include:
+                self.fields.pop(field_name, None)
@@ -0,0 +1,158 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .cache import bump_versions
+from .catalog import invalidate_catalog
+from .leaderboards import periods_for, refresh_event_participants
+from .models import Event, EventRegistration, EventResult, EventType, Location, SportType, TokenUser, User
+from .scoring import rescore_results
+from .search import get_search_backend
+
+
+def touch_events(event_ids, global_version=True):
+    """
+    Отмечает мероприятия изменёнными, когда меняются вложенные в их ответ данные:
+    увеличивает версии кэша ответов, по которым строятся и ETag/Last-Modified.
+    Строки мероприятий не обновляются, чтобы запись регистраций и результатов не блокировала их.
+    """
+    bump_versions([event_id for event_id in event_ids if event_id is not None], global_version=global_version)
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, update_fields=None, **kwargs):
+    # Переиндексация нужна только при изменении текстовых полей
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    get_search_backend().index_event(instance)
+
+
+@receiver(post_delete, sender=Event)
+def remove_event_from_index(sender, instance, **kwargs):
+    get_search_backend().remove_event(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_cache(sender, instance, **kwargs):
+    bump_versions([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=EventRegistration)
+def invalidate_registration_cache(sender, instance, **kwargs):
+    # Количество регистраций выводится и в списке, и в деталях мероприятия
+    touch_events([instance.event_id])
+
+
+@receiver([post_save, post_delete], sender=EventResult)
+def invalidate_result_cache(sender, instance, **kwargs):
+    # Результаты выводятся только в деталях мероприятия
+    touch_events([instance.event_id], global_version=False)
+
+
+@receiver([post_save, pre_delete], sender=Location)
+def invalidate_location_cache(sender, instance, **kwargs):
+    # pre_delete: после удаления у мероприятий уже обнулён location_id
+    touch_events(Event.objects.filter(location_id=instance.pk).values_list('id', flat=True))
+
+
+# Пользователь JWT-запроса - прокси-модель TokenUser, её сохранение отправляет сигналы с sender=TokenUser
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=TokenUser)
+def invalidate_user_cache(sender, instance, created, update_fields=None, **kwargs):
+    # Организатор и автор локации выводятся в ответах о мероприятиях
+    if created or (update_fields is not None and not {'email', 'display_name'} & set(update_fields)):
+        return
+    touch_events(
+        Event.objects.filter(Q(organizer=instance) | Q(location__created_by_user=instance))
+        .values_list('id', flat=True)
+    )
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=TokenUser)
+def invalidate_token_user(sender, instance, created=False, **kwargs):
+    # Нового пользователя ещё нет в кэшах процессов, отметка изменения не нужна
+    invalidate_user(instance.pk, changed=not created)
+    # Повторно после коммита: параллельный запрос мог закэшировать данные, прочитанные до коммита
+    transaction.on_commit(lambda: invalidate_user(instance.pk, changed=not created))
+
+
+@receiver([post_save, post_delete], sender=SportType)
+@receiver([post_save, post_delete], sender=EventType)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    invalidate_catalog()
+    transaction.on_commit(invalidate_catalog)
+    bump_versions(catalog=True)
+
+
+@receiver(pre_save, sender=SportType)
+@receiver(pre_save, sender=EventType)
+def detect_score_rule_change(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list('score_kind', 'score_order').first()
+    instance._score_rule_changed = previous is not None and previous != (instance.score_kind, instance.score_order)
+
+
+@receiver(post_save, sender=SportType)
+@receiver(post_save, sender=EventType)
+def rescore_on_rule_change(sender, instance, **kwargs):
+    # normalized_score результатов зависит от правила вида спорта/типа мероприятия
+    if getattr(instance, '_score_rule_changed', False):
+        instance._score_rule_changed = False
+        field = 'sport_type' if sender is SportType else 'event_type'
+        rescore_results(Event.objects.filter(**{field: instance}))
+
+
+@receiver(pre_save, sender=EventResult)
+def remember_result_leaderboard_key(sender, instance, **kwargs):
+    instance._leaderboard_previous = None
+    if instance.pk is not None:
+        instance._leaderboard_previous = (
+            EventResult.objects.filter(pk=instance.pk).values_list('event_id', 'participant_user_id').first()
+        )
+
+
+@receiver([post_save, post_delete], sender=EventResult)
+def update_leaderboards(sender, instance, **kwargs):
+    # Рейтинг пересчитывается для участников мероприятия (и прежнего участника, если он сменился)
+    # (места зависят от всех результатов мероприятия, в том числе командных)
+    keys = {(instance.event_id, instance.participant_user_id), getattr(instance, '_leaderboard_previous', None)}
+    instance._leaderboard_previous = None
+    user_ids = {}
+    for event_id, user_id in keys - {None}:
+        user_ids.setdefault(event_id, set()).update({user_id} - {None})
+    for event_id, event_user_ids in user_ids.items():
+        refresh_event_participants(event_id, event_user_ids)
+
+
+@receiver(pre_save, sender=Event)
+def remember_event_leaderboard_key(sender, instance, **kwargs):
+    instance._leaderboard_previous = None
+    if instance.pk is not None:
+        instance._leaderboard_previous = (
+            Event.objects.filter(pk=instance.pk)
+            .values_list('sport_type_id', 'start_datetime', 'event_type_id').first()
+        )
+
+
+@receiver(post_save, sender=Event)
+def move_event_leaderboards(sender, instance, **kwargs):
+    # Результаты мероприятия переходят в рейтинг другого вида спорта или года
+    previous = getattr(instance, '_leaderboard_previous', None)
+    instance._leaderboard_previous = None
+    if previous is None:
+        return
+    sport_type_id, start_datetime, event_type_id = previous
+    if (sport_type_id, event_type_id) != (instance.sport_type_id, instance.event_type_id):
+        # Правило результатов задаётся видом спорта и типом мероприятия
+        rescore_results(Event.objects.filter(pk=instance.pk))
+    if (sport_type_id == instance.sport_type_id
+            and periods_for(start_datetime) == periods_for(instance.start_datetime)):
+        return
+    user_ids = set(instance.results.exclude(participant_user=None).values_list('participant_user_id', flat=True))
+    if user_ids:
+        refresh_event_participants(instance.pk, user_ids, sport_type_id, start_datetime)
+        refresh_event_participants(instance.pk, user_ids, instance.sport_type_id, instance.start_datetime)
@@ -0,0 +1,209 @@
+"""
+Журнал медленных SQL-запросов.
+
+Execute-wrapper подключается к каждому новому соединению с БД (сигнал connection_created),
+поэтому учитываются запросы API, админки и management-команд. Запрос дольше
+EVENTS_SLOW_QUERY_MS записывается строкой JSON в журнал процесса: для EVENTS_SLOW_QUERY_LOG=slow_queries.log
+это slow_queries-<pid>.log рядом с ним (ротация по EVENTS_SLOW_QUERY_LOG_MAX_BYTES,
+EVENTS_SLOW_QUERY_LOG_BACKUPS файлов). Каждый воркер ротирует только свой файл, поэтому записи
+не теряются при одновременной ротации; отчёт объединяет журналы всех процессов.
+- форма запроса (SQL с плейсхолдерами, списки IN свёрнуты) и её хэш;
+- отпечаток параметров (хэш значений и их количество) - сами значения не сохраняются;
+- маршрут текущего запроса (если включены замеры events/instrumentation.py) и места вызова в коде проекта;
+- план выполнения (EXPLAIN для SELECT) - не чаще раза в EVENTS_SLOW_QUERY_EXPLAIN_INTERVAL секунд
+  для одной формы в процессе.
+
+Отчёт по самым затратным формам запросов: manage.py slow_query_report
+"""
+import hashlib
+import heapq
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .instrumentation import current_request, query_signature
+
+MAX_CALL_SITES = 5
+EXPLAINABLE = ('SELECT', 'WITH')
+
+logger = logging.getLogger('events.slow_queries')
+
+_explained = {}
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_log_path():
+    return Path(get_setting('EVENTS_SLOW_QUERY_LOG', Path(tempfile.gettempdir()) / 'sports_api_logs' / 'slow_queries.log'))
+
+
+def get_process_log_path(path, pid):
+    return path.with_name(f'{path.stem}-{pid}{path.suffix}')
+
+
+def get_handler():
+    """
+    Обработчик журнала текущего процесса; после fork воркер открывает собственный файл.
+    """
+    global _handler
+    path = get_process_log_path(get_log_path(), os.getpid())
+    if _handler is None or _handler.baseFilename != str(path.resolve()):
+        with _handler_lock:
+            if _handler is None or _handler.baseFilename != str(path.resolve()):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if _handler is not None:
+                    _handler.close()
+                _handler = RotatingFileHandler(
+                    path, maxBytes=get_setting('EVENTS_SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                    backupCount=get_setting('EVENTS_SLOW_QUERY_LOG_BACKUPS', 5), encoding='utf-8',
+                )
+    return _handler
+
+
+def fingerprint(value):
+    return hashlib.sha1(value.encode()).hexdigest()[:16]
+
+
+def call_sites():
+    """
+    Места вызова в коде проекта (без библиотек), от ближайшего к запросу.
+    """
+    project_dir = str(settings.BASE_DIR)
+    sites = []
+    frame = sys._getframe(2)
+    while frame is not None and len(sites) < MAX_CALL_SITES:
+        filename = frame.f_code.co_filename
+        if filename.startswith(project_dir) and 'site-packages' not in filename and filename != __file__:
+            sites.append(f'{filename[len(project_dir) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return sites
+
+
+def format_plan(connection, rows):
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail)
+        return '\n'.join(str(row[-1]) for row in rows)
+    return '\n'.join(' | '.join(str(column) for column in row) for row in rows)
+
+
+def explain(connection, sql, params):
+    """
+    План запроса или None. Ошибка EXPLAIN не должна ломать транзакцию, поэтому он выполняется в savepoint.
+    """
+    if not sql.lstrip()[:6].upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                return format_plan(connection, cursor.fetchall())
+    except DatabaseError as e:
+        return f'EXPLAIN недоступен: {e}'
+
+
+def should_explain(shape):
+    now = time.monotonic()
+    interval = get_setting('EVENTS_SLOW_QUERY_EXPLAIN_INTERVAL', 3600)
+    if now - _explained.get(shape, -interval) < interval:
+        return False
+    _explained[shape] = now
+    return True
+
+
+def record(connection, sql, params, many, duration):
+    shape = query_signature(sql)
+    shape_id = fingerprint(shape)
+    request = current_request()
+    match = getattr(request, 'resolver_match', None)
+    entry = {
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'database': connection.alias,
+        'shape_id': shape_id,
+        'sql': shape,
+        'params_fingerprint': fingerprint(repr(params)) if params else None,
+        'params_count': len(params) if params and not many else None,
+        'many': many,
+        'view': match.view_name if match else None,
+        'path': request.path if request is not None else None,
+        'call_sites': call_sites(),
+        'plan': None,
+    }
+    if not many and should_explain(shape_id):
+        # EXPLAIN и его savepoint не должны попадать в замеры других wrapper-ов и в этот журнал
+        wrappers, connection.execute_wrappers = connection.execute_wrappers, []
+        try:
+            entry['plan'] = explain(connection, sql, params)
+        finally:
+            connection.execute_wrappers = wrappers
+    get_handler().handle(logging.makeLogRecord({'msg': json.dumps(entry, ensure_ascii=False, default=str)}))
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    threshold = get_setting('EVENTS_SLOW_QUERY_MS', 0)
+    if threshold and duration * 1000 >= threshold:
+        try:
+            record(context['connection'], sql, params, many, duration)
+        except Exception:
+            logger.exception('Не удалось записать медленный запрос')
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """
+    Обработчик connection_created: подключает execute-wrapper к новому соединению.
+    """
+    # В начало списка: connection.execute_wrapper() снимает последний элемент при выходе,
+    # а соединение может открыться внутри такого блока
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+def read_file_entries(path):
+    """
+    Записи одного журнала вместе с его ротированными файлами, от старых к новым.
+    """
+    # slow_queries-<pid>.log.1 новее, чем slow_queries-<pid>.log.2
+    backups = sorted(
+        (p for p in path.parent.glob(f'{path.name}.*') if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]), reverse=True,
+    )
+    for file_path in [*backups, path]:
+        if not file_path.exists():
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def read_entries(path=None):
+    """
+    Записи журналов всех процессов (и общего файла path, если он есть), по времени записи.
+    """
+    path = Path(path) if path else get_log_path()
+    paths = [path, *(
+        p for p in path.parent.glob(f'{path.stem}-*{path.suffix}')
+        if p.name[len(path.stem) + 1:len(p.name) - len(path.suffix)].isdigit()
+    )]
+    # Записи каждого файла уже упорядочены по времени
+    yield from heapq.merge(*(read_file_entries(p) for p in paths), key=lambda entry: entry['time'])
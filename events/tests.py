@@ -1,3 +1,1845 @@
-from django.test import TestCase
+from datetime import timedelta
+import csv
+from io import StringIO
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import pstats
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+import time
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.models import Count, F, Q
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    User, SportType, EventType, Location, Event, EventRegistration, EventResult, RegistrationTicket,
+    LeaderboardEntry, TokenUser, prefix_range
+)
+from .authentication import TokenUserAuthentication, get_user_cache, load_user_values
+from .benchmarks import compare, run_benchmarks, run_registration_load
+from . import metrics
+from .cache import get_cache, get_stats, reset_stats
+from .capacity import SEAT_STATUSES, register_participant
+from .intake import allocate_event, drain_queue, enqueue_registration
+from .catalog import get_catalog, invalidate_catalog
+from .geo import encode_geohash, haversine_km
+from .scoring import ASC, DESC, DURATION, NUMBER, POINTS, ScoreRule
+from .instrumentation import InstrumentationMiddleware
+from .search import stem_russian
+from .slow_queries import read_entries as read_slow_queries, slow_query_wrapper
+from .serializers import EventRegistrationSerializer, EventSerializer
+from .views import EventViewSet, LocationViewSet
+
+# Допустимое количество SQL-запросов на один запрос к эндпоинту
+# (не зависит от размера страницы). Валидаторы списка строятся по версиям кэша без запросов,
+# для деталей один запрос - агрегат мероприятия; справочники берутся из снимка в памяти
+QUERY_BUDGETS = {
+    'event-list': 2,  # COUNT для пагинации + выборка страницы
+    'event-list-keyset': 1,
+    'event-detail': 2,
+    'event-detail-include': 4,  # валидатор + мероприятие + регистрации + результаты
+    'event-not-modified': 1,
+}
+
+
+class APITestDataMixin:
+    """
+    Общие тестовые данные: организатор, справочники, локация и мероприятия.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Кэш ответов и снимок справочников не откатываются вместе с транзакцией теста
+        get_cache().clear()
+        invalidate_catalog()
+        get_catalog()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user('org@example.com', 'Организатор', 'password123')
+        cls.participant = User.objects.create_user('user@example.com', 'Участник', 'password123')
+        cls.sport_type = SportType.objects.create(name='Бег', score_kind='DURATION', score_order='ASC')
+        cls.event_type = EventType.objects.create(name='Забег')
+        cls.location = Location.objects.create(
+            name='Парк', address='ул. Ленина, 1', city='Москва', created_by_user=cls.organizer
+        )
+
+    @classmethod
+    def create_events(cls, count, **kwargs):
+        now = timezone.now()
+        events = []
+        for i in range(count):
+            data = {
+                'title': f'Забег {i}',
+                'description': 'Описание',
+                'organizer': cls.organizer,
+                'sport_type': cls.sport_type,
+                'event_type': cls.event_type,
+                'location': cls.location,
+                'start_datetime': now + timedelta(days=i + 1),
+                'status': 'REGISTRATION_OPEN',
+            }
+            data.update(kwargs)
+            events.append(Event.objects.create(**data))
+        return events
+
+
+class EventListQueryBudgetTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for total in (1, 20):
+            Event.objects.all().delete()
+            events = self.create_events(total)
+            for event in events:
+                EventRegistration.objects.create(event=event, user=self.participant)
+
+            with self.assertNumQueries(QUERY_BUDGETS['event-list']):
+                response = self.client.get(reverse('event-list'))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), total)
+            self.assertTrue(all(item['registrations_count'] == 1 for item in response.data['results']))
+
+    def test_registrations_count_is_annotated(self):
+        event = self.create_events(1)[0]
+        EventRegistration.objects.create(event=event, user=self.participant)
+
+        annotated = Event.objects.for_serialization().get(pk=event.pk)
+        self.assertEqual(annotated.registrations_total, 1)
+
+
+class EventDetailTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.event = self.create_events(1, status='COMPLETED')[0]
+        for i in range(3):
+            user = User.objects.create_user(f'runner{i}@example.com', f'Бегун {i}', 'password123')
+            EventRegistration.objects.create(event=self.event, user=user, status='CONFIRMED')
+            EventResult.objects.create(event=self.event, participant_user=user, position=i + 1,
+                                       recorded_by_user=self.organizer)
+
+    def test_detail_omits_nested_collections_by_default(self):
+        with self.assertNumQueries(QUERY_BUDGETS['event-detail']):
+            response = self.client.get(reverse('event-detail', args=[self.event.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('registrations', response.data)
+        self.assertNotIn('results', response.data)
+
+    def test_detail_include_uses_slim_representation(self):
+        url = reverse('event-detail', args=[self.event.pk])
+        with self.assertNumQueries(QUERY_BUDGETS['event-detail-include']):
+            response = self.client.get(url, {'include': 'registrations,results'})
+
+        self.assertEqual(len(response.data['registrations']), 3)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('event', response.data['registrations'][0])
+        self.assertEqual(set(response.data['results'][0]['participant_user']), {'id', 'display_name'})
+
+    def test_results_sub_collection_is_cursor_paginated(self):
+        url = reverse('event-results', args=[self.event.pk])
+        response = self.client.get(url, {'page_size': 2})
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_registrations_sub_collection_is_organizer_only(self):
+        url = reverse('event-registrations', args=[self.event.pk])
+        self.client.force_authenticate(self.participant)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(self.organizer)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class KeysetPaginationTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.events = self.create_events(5)
+        # Одинаковое время начала проверяет разрешение "ничьих" по id
+        Event.objects.filter(pk__in=[self.events[1].pk, self.events[2].pk]).update(
+            start_datetime=self.events[1].start_datetime
+        )
+
+    def test_walks_feed_without_count_query(self):
+        url = reverse('event-list')
+        seen = []
+        response = None
+        while url:
+            params = {'cursor': '', 'page_size': 2} if response is None else None
+            with self.assertNumQueries(QUERY_BUDGETS['event-list-keyset']):
+                response = self.client.get(url, params)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [event.pk for event in self.events])
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(reverse('event-list'), {'cursor': '', 'page_size': 2})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('event-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_follows_requested_ordering(self):
+        url = reverse('event-list')
+        seen = []
+        response = self.client.get(url, {'cursor': '', 'page_size': 2, 'ordering': '-start_datetime'})
+        while True:
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            self.assertIn('ordering=-start_datetime', response.data['next'])
+            response = self.client.get(response.data['next'])
+
+        expected = Event.objects.order_by('-start_datetime', 'id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_cursor_rejects_orderings_it_cannot_continue(self):
+        for params in ({'ordering': 'title'}, {'ordering': 'start_datetime,created_at'},
+                       {'search': 'забег'}, {'near': '55.7558,37.6173'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('event-list'), {'cursor': '', **params})
+                self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('event-list'), {'cursor': '', 'search': 'забег',
+                                                           'ordering': 'start_datetime'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class SparseFieldsetTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.event = self.create_events(1, status='COMPLETED')[0]
+        EventRegistration.objects.create(event=self.event, user=self.participant, status='CONFIRMED')
+        EventResult.objects.create(event=self.event, participant_user=self.participant, position=1,
+                                   recorded_by_user=self.organizer)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_feed_card_fields_prune_query(self):
+        response, sql = self.get(reverse('event-list'), {'fields': 'id,title,start_datetime,sport_type,location.city'})
+
+        item = response.data['results'][0]
+        self.assertEqual(list(item), ['id', 'title', 'sport_type', 'location', 'start_datetime'])
+        self.assertEqual(item['sport_type']['name'], 'Бег')
+        self.assertEqual(item['location'], {'city': 'Москва'})
+        self.assertNotIn('"events_user"', sql)
+        self.assertNotIn('"events_eventregistration"', sql)
+        self.assertNotIn('"description"', sql)
+
+    def test_unexpanded_relations_are_ids(self):
+        response, sql = self.get(reverse('event-detail', args=[self.event.pk]),
+                                 {'fields': 'id,organizer,location,sport_type', 'expand': 'location'})
+
+        self.assertEqual(response.data['organizer'], self.organizer.pk)
+        self.assertEqual(response.data['sport_type'], self.sport_type.pk)
+        self.assertEqual(response.data['location']['created_by_user'], self.organizer.pk)
+        self.assertNotIn('"events_user"', sql)
+
+    def test_nested_event_fields(self):
+        self.client.force_authenticate(self.participant)
+        response, sql = self.get(reverse('registration-list'), {'fields': 'id,status,event.title'})
+
+        self.assertEqual(response.data['results'][0], {'id': self.event.registrations.get().pk,
+                                                       'status': 'CONFIRMED', 'event': {'title': 'Забег 0'}})
+        self.assertNotIn('"events_location"', sql)
+
+    def test_results_and_locations(self):
+        response, _ = self.get(reverse('result-list'), {'fields': 'position,event', 'expand': ''})
+        self.assertEqual(response.data['results'][0], {'event': self.event.pk, 'position': 1})
+
+        response, _ = self.get(reverse('location-list'), {'fields': 'name,created_by_user.display_name'})
+        self.assertEqual(response.data['results'][0], {'name': 'Парк',
+                                                       'created_by_user': {'display_name': 'Организатор'}})
+
+    def test_default_representation_is_unchanged(self):
+        response, _ = self.get(reverse('event-detail', args=[self.event.pk]), {})
+        self.assertEqual(response.data['organizer']['display_name'], 'Организатор')
+        self.assertEqual(response.data['registrations_count'], 1)
+        self.assertIn('description', response.data)
+
+    def test_invalid_fieldsets_rejected(self):
+        url = reverse('event-list')
+        for params in ({'fields': '.,,'}, {'fields': ''}, {'fields': 'id,'}, {'fields': 'id,secret'},
+                       {'fields': 'title.length'}, {'fields': 'location.secret'}, {'expand': 'title'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(url, {'fields': 'location.secret'})
+        self.assertIn('location.city', str(response.data['fields']))
+        response = self.client.get(reverse('result-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('position', str(response.data['fields']))
+
+    def test_writes_ignore_fieldset(self):
+        self.client.force_authenticate(self.organizer)
+        url = reverse('event-detail', args=[self.event.pk])
+        response = self.client.patch(f'{url}?fields=id', {'title': 'Новый'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Новый')
+
+
+class CompiledListTests(APITestDataMixin, TestCase):
+    """
+    Быстрый режим списков должен отдавать байт-в-байт тот же ответ, что и обычные сериализаторы.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        # Авторизованные запросы не кэшируются, поэтому оба режима действительно выполняются
+        self.client.force_authenticate(self.participant)
+        Location.objects.filter(pk=self.location.pk).update(latitude='55.75580000', longitude='37.61730000')
+        self.location.refresh_from_db()
+        self.location.save()
+        events = self.create_events(3, status='COMPLETED', entry_fee='150.50')
+        self.create_events(1, location=None, custom_location_text='Онлайн')
+        EventRegistration.objects.create(event=events[0], user=self.participant, status='CONFIRMED')
+        EventResult.objects.create(event=events[0], participant_user=self.participant, position=1,
+                                   score='10', recorded_by_user=self.organizer)
+        EventResult.objects.create(event=events[1], team_name_if_applicable='Команда', position=2,
+                                   recorded_by_user=self.organizer)
+
+    def assertSameResponse(self, url_name, params):
+        compiled = self.client.get(reverse(url_name), params)
+        with override_settings(EVENTS_COMPILED_LIST=False):
+            regular = self.client.get(reverse(url_name), params)
+        self.assertEqual(compiled.status_code, 200)
+        self.assertEqual(compiled.content, regular.content)
+
+    def test_events(self):
+        for params in ({}, {'cursor': ''}, {'search': 'забег'}, {'near': '55.7558,37.6173'},
+                       {'fields': 'id,title,location.city', 'expand': 'location'}, {'expand': ''}):
+            with self.subTest(params=params):
+                self.assertSameResponse('event-list', params)
+
+    def test_results(self):
+        for params in ({}, {'cursor': ''}, {'fields': 'id,position,event.title,participant_user'}):
+            with self.subTest(params=params):
+                self.assertSameResponse('result-list', params)
+
+    def test_locations(self):
+        for params in ({}, {'near': '55.7558,37.6173'}, {'fields': 'name,created_by_user', 'expand': ''}):
+            with self.subTest(params=params):
+                self.assertSameResponse('location-list', params)
+
+    def test_cursor_with_fields_without_ordering_key(self):
+        for url_name, fields in (('event-list', 'id,title'), ('result-list', 'id,score')):
+            with self.subTest(url_name=url_name):
+                self.assertSameResponse(url_name, {'cursor': '', 'fields': fields, 'page_size': 1})
+                response = self.client.get(reverse(url_name), {'cursor': '', 'fields': fields, 'page_size': 1})
+                self.assertEqual(list(response.data['results'][0]), fields.split(','))
+                second = self.client.get(response.data['next'])
+                self.assertEqual(second.status_code, 200)
+                self.assertNotEqual(second.data['results'], response.data['results'])
+
+    def test_query_count_matches_regular_path(self):
+        with self.assertNumQueries(3):  # COUNT + страница + мероприятия результатов
+            self.client.get(reverse('result-list'))
+
+    def test_benchmark_command(self):
+        out, err = StringIO(), StringIO()
+        call_command('benchmark_serializers', rows='5', repeat=1, stdout=out, stderr=err)
+        self.assertIn('events', out.getvalue())
+        self.assertEqual(err.getvalue(), '')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса проверяется для SQLite')
+class FeedIndexUsageTests(APITestDataMixin, TestCase):
+    """
+    Проверяет по EXPLAIN, что типовые запросы ленты используют индексы.
+    """
+
+    def explain(self, viewset_class, params):
+        view = viewset_class()
+        view.action = 'list'
+        view.format_kwarg = None
+        view.request = Request(APIRequestFactory().get('/', params))
+        return view.filter_queryset(view.get_queryset()).explain()
+
+    def assertUsesIndex(self, plan, index_name):
+        self.assertIn(f'USING INDEX {index_name}', plan)
+
+    def test_public_feed(self):
+        self.assertUsesIndex(self.explain(EventViewSet, {}), 'event_public_start_idx')
+
+    def test_date_range(self):
+        plan = self.explain(EventViewSet, {'date_from': '2025-01-01T00:00:00Z', 'date_to': '2025-02-01T00:00:00Z'})
+        self.assertUsesIndex(plan, 'event_public_start_idx')
+
+    def test_status_filter(self):
+        self.assertUsesIndex(self.explain(EventViewSet, {'status': 'PLANNED'}), 'event_public_status_idx')
+
+    def test_sport_type_filter(self):
+        plan = self.explain(EventViewSet, {'sport_type': self.sport_type.pk})
+        self.assertUsesIndex(plan, 'event_public_sport_idx')
+
+    def test_event_type_filter(self):
+        plan = self.explain(EventViewSet, {'event_type': self.event_type.pk})
+        self.assertUsesIndex(plan, 'event_public_type_idx')
+
+    def test_city_filter(self):
+        self.assertUsesIndex(self.explain(EventViewSet, {'city': 'Моск'}), 'location_city_key_idx')
+        self.assertUsesIndex(self.explain(LocationViewSet, {'city': 'Моск'}), 'location_city_key_idx')
+
+    def test_near_filter(self):
+        params = {'near': '55.7158,37.5537', 'radius_km': 3}
+        self.assertUsesIndex(self.explain(LocationViewSet, params), 'location_geohash_idx')
+        self.assertUsesIndex(self.explain(EventViewSet, params), 'location_geohash_idx')
+
+
+class CityKeyTests(APITestDataMixin, TestCase):
+    def test_city_key_is_normalized(self):
+        location = Location.objects.create(name='Арена', address='ул. Мира, 2', city='  Санкт-Петербург ')
+        self.assertEqual(location.city_key, 'санкт-петербург')
+
+    def test_city_filter_matches_prefix_case_insensitively(self):
+        self.create_events(1)
+        response = APIClient().get(reverse('event-list'), {'city': ' мОСК'})
+        self.assertEqual(response.data['count'], 1)
+
+        response = APIClient().get(reverse('event-list'), {'city': 'Казань'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_city_prefix_with_maximum_code_point(self):
+        self.create_events(1)
+        for city in ('\U0010ffff', 'м\U0010ffff', '\ud7ff'):
+            with self.subTest(city=city):
+                for url_name in ('event-list', 'location-list'):
+                    response = APIClient().get(reverse(url_name), {'city': city})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.data['count'], 0)
+        self.assertEqual(prefix_range('м\U0010ffff'), ('м\U0010ffff', 'н'))
+        self.assertEqual(prefix_range('\U0010ffff'), ('\U0010ffff', None))
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        self.assertEqual(stem_russian('марафон'), stem_russian('марафоны'))
+        self.assertEqual(stem_russian('марафона'), stem_russian('марафонах'))
+        self.assertEqual(stem_russian('бегать'), stem_russian('бегали'))
+        self.assertEqual(stem_russian('Ёлки'), stem_russian('елка'))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Индекс FTS5 доступен только в SQLite')
+class FullTextSearchTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.marathon, self.yoga, self.chess = self.create_events(3)
+        self.marathon.title = 'Московский марафон'
+        self.marathon.description = 'Забег на 42 км'
+        self.marathon.save()
+        self.yoga.title = 'Йога в парке'
+        self.yoga.description = 'После марафонов хорошо растянуться'
+        self.yoga.save()
+        self.chess.title = 'Шахматный турнир'
+        self.chess.save()
+
+    def search(self, query):
+        response = self.client.get(reverse('event-list'), {'search': query})
+        return [item['id'] for item in response.data['results']]
+
+    def test_matches_word_forms_and_ranks_title_higher(self):
+        self.assertEqual(self.search('марафонах'), [self.marathon.pk, self.yoga.pk])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search('шахм'), [self.chess.pk])
+
+    def test_all_terms_required(self):
+        self.assertEqual(self.search('марафон парк'), [self.yoga.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.chess.title = 'Блиц'
+        self.chess.save()
+        self.assertEqual(self.search('шахм'), [])
+
+        self.marathon.delete()
+        self.assertEqual(self.search('марафон'), [self.yoga.pk])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM events_event_fts')
+        self.assertEqual(self.search('шахм'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('шахм'), [self.chess.pk])
+
+    def test_feed_filters_applied_before_ranking(self):
+        # Более релевантные совпадения вне фильтра не вытесняют подходящие мероприятия
+        self.create_events(30, title='Марафон марафонов', description='марафон', is_public=False)
+        self.marathon.status = 'COMPLETED'
+        self.marathon.save()
+
+        response = self.client.get(reverse('event-list'), {'search': 'марафон', 'status': 'COMPLETED'})
+
+        self.assertEqual([item['id'] for item in response.data['results']], [self.marathon.pk])
+
+
+class NearSearchTests(APITestDataMixin, TestCase):
+    LUZHNIKI = (55.715752, 37.553701)
+    SOKOLNIKI = (55.794839, 37.676271)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.luzhniki = Location.objects.create(name='Лужники', address='Лужнецкая наб., 24', city='Москва',
+                                                latitude=self.LUZHNIKI[0], longitude=self.LUZHNIKI[1])
+        self.sokolniki = Location.objects.create(name='Сокольники', address='Сокольнический Вал, 1',
+                                                 city='Москва', latitude=self.SOKOLNIKI[0],
+                                                 longitude=self.SOKOLNIKI[1])
+
+    def near(self, url_name, radius_km):
+        near = f'{self.LUZHNIKI[0] + 0.001},{self.LUZHNIKI[1]}'
+        return self.client.get(reverse(url_name), {'near': near, 'radius_km': radius_km})
+
+    def test_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744), 'u4pruydqq')
+        self.assertEqual(self.luzhniki.geohash, encode_geohash(*self.LUZHNIKI))
+
+    def test_locations_ranked_by_distance(self):
+        response = self.near('location-list', 20)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [self.luzhniki.pk, self.sokolniki.pk])
+
+        expected = haversine_km(self.LUZHNIKI[0] + 0.001, self.LUZHNIKI[1], *self.SOKOLNIKI)
+        self.assertAlmostEqual(response.data['results'][1]['distance_km'], expected, places=2)
+
+    def test_radius_limits_results(self):
+        response = self.near('location-list', 5)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.luzhniki.pk])
+
+    def test_events_near(self):
+        near_event, far_event, _ = self.create_events(3)
+        Event.objects.filter(pk=near_event.pk).update(location=self.luzhniki)
+        Event.objects.filter(pk=far_event.pk).update(location=self.sokolniki)
+
+        response = self.near('event-list', 5)
+        self.assertEqual([item['id'] for item in response.data['results']], [near_event.pk])
+        self.assertLess(response.data['results'][0]['distance_km'], 0.2)
+
+    def test_invalid_point(self):
+        response = self.client.get(reverse('location-list'), {'near': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+        self.client = APIClient()
+        self.event = self.create_events(1)[0]
+        self.list_url = reverse('event-list')
+        self.detail_url = reverse('event-detail', args=[self.event.pk])
+
+    def test_repeated_read_skips_database(self):
+        first = self.client.get(self.list_url, {'status': 'REGISTRATION_OPEN', 'page': 1})
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            # Порядок параметров не влияет на ключ
+            second = self.client.get(self.list_url, {'page': 1, 'status': 'REGISTRATION_OPEN'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(get_stats()['hit'], 1)
+        self.assertEqual(get_stats()['miss'], 1)
+
+    def test_event_change_invalidates_list_and_detail(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+
+        self.event.title = 'Новое название'
+        self.event.save()
+
+        self.assertEqual(self.client.get(self.list_url).data['results'][0]['title'], 'Новое название')
+        self.assertEqual(self.client.get(self.detail_url).data['title'], 'Новое название')
+
+    def test_padded_pk_invalidated(self):
+        padded_url = f'{self.list_url}0{self.event.pk}/'
+        self.client.get(padded_url)
+
+        self.event.title = 'Новое название'
+        self.event.save()
+
+        self.assertEqual(self.client.get(padded_url).data['title'], 'Новое название')
+        self.assertEqual(self.client.get(f'{self.list_url}abc/').status_code, 404)
+
+    def test_registration_invalidates_only_its_event(self):
+        other = self.create_events(1)[0]
+        other_url = reverse('event-detail', args=[other.pk])
+        self.client.get(self.detail_url)
+        self.client.get(other_url)
+
+        EventRegistration.objects.create(event=self.event, user=self.participant)
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['registrations_count'], 1)
+        self.assertEqual(self.client.get(other_url)['X-Cache'], 'HIT')
+
+    def test_location_change_invalidates_its_events(self):
+        self.client.get(self.detail_url)
+        self.location.name = 'Стадион'
+        self.location.save()
+
+        self.assertEqual(self.client.get(self.detail_url).data['location']['name'], 'Стадион')
+
+    def test_authenticated_reads_are_not_cached(self):
+        self.client.force_authenticate(self.participant)
+        self.client.get(self.list_url)
+        response = self.client.get(self.list_url)
+        self.assertNotIn('X-Cache', response)
+
+
+class ConditionalGetTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        # Аутентифицированные запросы не кэшируются, поэтому проверяется сама логика валидаторов
+        self.client.force_authenticate(self.participant)
+        self.event = self.create_events(1)[0]
+        self.detail_url = reverse('event-detail', args=[self.event.pk])
+
+    def test_detail_not_modified_before_serialization(self):
+        response = self.client.get(self.detail_url)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(QUERY_BUDGETS['event-not-modified']):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('event-list'))
+        response = self.client.get(reverse('event-list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_revalidation_without_queries(self):
+        for params in ({}, {'cursor': ''}, {'city': 'Москва', 'status': 'PLANNED'}):
+            with self.subTest(params=params):
+                etag = self.client.get(reverse('event-list'), params)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(reverse('event-list'), params, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+        etag = self.client.get(reverse('event-list'))['ETag']
+        self.assertNotEqual(self.client.get(reverse('event-list'), {'cursor': ''})['ETag'], etag)
+
+    def test_etag_changes_with_registrations_and_params(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.assertNotEqual(self.client.get(self.detail_url, {'include': 'results'})['ETag'], etag)
+
+        EventRegistration.objects.create(event=self.event, user=self.participant)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['registrations_count'], 1)
+
+    def test_list_etag_changes_on_delete(self):
+        other = self.create_events(1)[0]
+        etag = self.client.get(reverse('event-list'))['ETag']
+        other.delete()
+        response = self.client.get(reverse('event-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_last_modified_moves_on_delete(self):
+        other = self.create_events(1)[0]
+        Event.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        get_cache().clear()
+        last_modified = self.client.get(reverse('event-list'))['Last-Modified']
+        time.sleep(1)
+
+        other.delete()
+
+        response = self.client.get(reverse('event-list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+    def test_child_writes_do_not_update_event_row(self):
+        updated_at = Event.objects.get(pk=self.event.pk).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            EventRegistration.objects.create(event=self.event, user=self.participant)
+            EventResult.objects.create(
+                event=self.event, participant_user=self.participant, score='10', recorded_by_user=self.organizer
+            )
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "events_event" ')])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).updated_at, updated_at)
+
+    def test_anonymous_cached_response_revalidates_without_queries(self):
+        client = APIClient()
+        etag = client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalogs(self):
+        for url_name in ('sporttype-list', 'eventtype-list'):
+            etag = self.client.get(reverse(url_name))['ETag']
+            self.assertEqual(self.client.get(reverse(url_name), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        etag = self.client.get(reverse('sporttype-detail', args=[self.sport_type.pk]))['ETag']
+        self.sport_type.description = 'Лёгкая атлетика'
+        self.sport_type.save()
+        response = self.client.get(reverse('sporttype-detail', args=[self.sport_type.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CatalogSnapshotTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def event_payload(self, **kwargs):
+        data = {
+            'title': 'Забег', 'description': 'Описание',
+            'sport_type_id': self.sport_type.pk, 'event_type_id': self.event_type.pk,
+            'start_datetime': (timezone.now() + timedelta(days=1)).isoformat(),
+        }
+        data.update(kwargs)
+        return data
+
+    def test_snapshot_is_reused(self):
+        self.assertIs(get_catalog(), get_catalog())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_catalog().sport_types[self.sport_type.pk]['name'], 'Бег')
+
+    def test_snapshot_refreshes_on_change(self):
+        self.sport_type.name = 'Трейлраннинг'
+        self.sport_type.save()
+        self.assertEqual(get_catalog().sport_types[self.sport_type.pk]['name'], 'Трейлраннинг')
+
+    def test_snapshot_is_immutable(self):
+        with self.assertRaises(TypeError):
+            get_catalog().sport_types[self.sport_type.pk]['name'] = 'Другое'
+
+    def test_unknown_catalog_ids_are_rejected(self):
+        get_catalog()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('event-list'), self.event_payload(sport_type_id=999, event_type_id=999),
+                                        format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sport_type_id', response.data)
+        self.assertIn('event_type_id', response.data)
+        # Несуществующий id не перечитывает справочники
+        self.assertFalse([query for query in queries if '"events_sporttype"' in query['sql']])
+
+        response = self.client.post(reverse('event-list'), self.event_payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sport_type']['name'], 'Бег')
+        self.assertEqual(response.data['event_type']['name'], 'Забег')
+
+
+class ParticipantCounterTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.event = self.create_events(1, max_participants=1)[0]
+
+    def count(self):
+        self.event.refresh_from_db()
+        return self.event.current_participants_count
+
+    def test_register_and_unregister(self):
+        self.client.force_authenticate(self.participant)
+        register = reverse('event-register', args=[self.event.pk])
+        unregister = reverse('event-unregister', args=[self.event.pk])
+
+        self.assertEqual(self.client.post(register).status_code, 201)
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(self.client.delete(unregister).status_code, 204)
+        self.assertEqual(self.client.delete(unregister).status_code, 204)
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.client.post(register).status_code, 200)
+        self.assertEqual(self.count(), 1)
+
+    def test_capacity_is_enforced(self):
+        register_participant(self.event, self.participant)
+        self.client.force_authenticate(self.organizer)
+        response = self.client.post(reverse('registration-list'),
+                                    {'event_id': self.event.pk, 'user_id': self.organizer.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.count(), 1)
+
+    def test_status_changes(self):
+        registration = register_participant(self.event, self.participant)
+        self.client.force_authenticate(self.organizer)
+        url = reverse('registration-update-status', args=[registration.pk])
+
+        # Подтверждение ожидающей регистрации не занимает второе место
+        self.assertEqual(self.client.put(url, {'status': 'CONFIRMED'}).status_code, 200)
+        self.assertEqual(self.count(), 1)
+        response = self.client.put(url, {'status': 'REJECTED_BY_ORGANIZER'})
+        self.assertEqual(response.data['event']['current_participants_count'], 0)
+
+        other = User.objects.create_user('other@example.com', 'Другой', 'password123')
+        register_participant(self.event, other)
+        response = self.client.put(url, {'status': 'CONFIRMED'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.count(), 1)
+
+
+class ConcurrentRegistrationTests(TransactionTestCase):
+    """
+    Параллельные регистрации из нескольких потоков не превышают max_participants.
+    Пропускная способность измеряется командой benchmark_endpoints --registration-load.
+    """
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_no_overbooking(self):
+        metrics = run_registration_load(users_count=200, capacity=50, threads=16)
+
+        registrations = EventRegistration.objects.filter(event_id=metrics['event_id'])
+        self.assertEqual(metrics['registered'], 50)
+        self.assertEqual(metrics['seats_taken'], 50)
+        self.assertEqual(registrations.filter(status__in=SEAT_STATUSES).count(), 50)
+        self.assertEqual(registrations.count(), 50)
+        self.assertEqual(registrations.values('user').distinct().count(), 50)
+        self.assertGreater(metrics['requests_per_second'], 0)
+
+
+class RegistrationQueueTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.event = self.create_events(1, max_participants=2, registration_queue=True)[0]
+        self.users = [
+            User.objects.create_user(f'runner{i}@example.com', f'Бегун {i}', 'password123') for i in range(4)
+        ]
+
+    def register(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('event-register', args=[self.event.pk]))
+
+    def test_requests_are_acknowledged_with_tickets(self):
+        responses = [self.register(user) for user in self.users]
+
+        self.assertTrue(all(response.status_code == 202 for response in responses))
+        self.assertEqual([response.data['position'] for response in responses], [1, 2, 3, 4])
+        self.assertFalse(EventRegistration.objects.exists())
+        # Повторный запрос до обработки возвращает ту же заявку
+        self.assertEqual(self.register(self.users[0]).data['id'], responses[0].data['id'])
+
+    def test_first_come_first_served(self):
+        tickets = [self.register(user).data['id'] for user in self.users + [self.organizer]]
+
+        out = StringIO()
+        call_command('process_registration_queue', batch_size=3, stdout=out)
+        self.assertIn('Всего обработано заявок: 5', out.getvalue())
+
+        statuses = list(RegistrationTicket.objects.filter(pk__in=tickets).order_by('id').values_list('status', flat=True))
+        self.assertEqual(statuses, ['ACCEPTED', 'ACCEPTED', 'REJECTED', 'REJECTED', 'REJECTED'])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_participants_count, 2)
+        self.assertEqual(
+            set(self.event.registrations.values_list('user_id', flat=True)), {self.users[0].pk, self.users[1].pk}
+        )
+
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(reverse('registration-ticket-detail', args=[tickets[0]]))
+        self.assertEqual(response.data['status'], 'ACCEPTED')
+        self.assertIsNone(response.data['position'])
+        self.assertEqual(response.data['registration'], self.event.registrations.get(user=self.users[0]).pk)
+        # Чужие заявки не видны
+        self.assertEqual(self.client.get(reverse('registration-ticket-detail', args=[tickets[2]])).status_code, 404)
+
+        self.client.force_authenticate(self.users[2])
+        response = self.client.get(reverse('registration-ticket-detail', args=[tickets[2]]))
+        self.assertEqual(response.data['reason'], 'Достигнуто максимальное количество участников')
+
+    def test_cancelled_registration_is_reopened(self):
+        self.event.max_participants = None
+        self.event.save()
+        EventRegistration.objects.create(event=self.event, user=self.users[0], status='CANCELLED_BY_USER')
+        self.register(self.users[0])
+        drain_queue()
+
+        registration = self.event.registrations.get(user=self.users[0])
+        self.assertEqual(registration.status, 'PENDING_APPROVAL')
+        self.assertEqual(RegistrationTicket.objects.get().registration, registration)
+
+    def test_registration_created_outside_queue_fails_only_its_ticket(self):
+        self.event.max_participants = None
+        self.event.save()
+        for user in self.users[:3]:
+            self.register(user)
+        EventRegistration.objects.create(event=self.event, user=self.users[1])
+
+        def allocate_with_race(tickets, *args):
+            if len(tickets) == 1:
+                return allocate_event(tickets, *args)
+            # Регистрация через POST /registrations/ появилась после выборки существующих
+            with mock.patch.object(EventRegistration.objects, 'filter', return_value=EventRegistration.objects.none()):
+                allocate_event(tickets, *args)
+
+        with mock.patch('events.intake.allocate_event', side_effect=allocate_with_race):
+            self.assertEqual(drain_queue(), 3)
+
+        tickets = RegistrationTicket.objects.order_by('id')
+        self.assertEqual([ticket.status for ticket in tickets], ['ACCEPTED', 'REJECTED', 'ACCEPTED'])
+        self.assertEqual(tickets[1].reason, 'Вы уже зарегистрированы на это мероприятие')
+        self.assertEqual(self.event.registrations.count(), 3)
+        self.assertFalse(RegistrationTicket.objects.filter(status='QUEUED').exists())
+
+    def test_enqueue_after_conflicting_ticket_processed(self):
+        create = RegistrationTicket.objects.create
+        attempts = []
+
+        def create_after_conflict(**kwargs):
+            attempts.append(kwargs)
+            if len(attempts) == 1:
+                # Мешающая заявка обработана до того, как её успели выбрать
+                raise IntegrityError('ticket_one_queued_per_user')
+            return create(**kwargs)
+
+        with mock.patch.object(RegistrationTicket.objects, 'create', side_effect=create_after_conflict):
+            ticket, created = enqueue_registration(self.event, self.users[0])
+
+        self.assertTrue(created)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(ticket.status, 'QUEUED')
+
+    def test_batch_query_count_does_not_depend_on_batch_size(self):
+        self.event.max_participants = None
+        self.event.save()
+        counts = []
+        for users in (self.users[:2], self.users[2:] + [self.participant]):
+            for user in users:
+                self.register(user)
+            with CaptureQueriesContext(connection) as queries:
+                drain_queue()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class BulkRegistrationStatusTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+        self.url = reverse('registration-bulk-status')
+        self.event = self.create_events(1)[0]
+
+    def add_registrations(self, count, status, event=None):
+        offset = User.objects.count()
+        users = User.objects.bulk_create(
+            User(email=f'runner{offset + i}@example.com', display_name=f'Бегун {i}') for i in range(count)
+        )
+        return EventRegistration.objects.bulk_create(
+            EventRegistration(event=event or self.event, user=user, status=status) for user in users
+        )
+
+    def test_approves_pending_registrations(self):
+        registrations = self.add_registrations(3, 'PENDING_APPROVAL')
+        ids = [registration.pk for registration in registrations]
+        response = self.client.post(self.url, {'status': 'CONFIRMED', 'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(set(EventRegistration.objects.values_list('status', flat=True)), {'CONFIRMED'})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_participants_count, 3)
+
+        response = self.client.post(self.url, {'status': 'CONFIRMED', 'ids': ids[:1]}, format='json')
+        self.assertEqual(response.data['results'], [{'id': ids[0], 'result': 'unchanged'}])
+
+    def test_capacity_and_ownership(self):
+        self.event.max_participants = 3
+        self.event.save()
+        self.add_registrations(1, 'CONFIRMED')
+        rejected = self.add_registrations(3, 'REJECTED_BY_ORGANIZER')
+        foreign_event = self.create_events(1, organizer=self.participant)[0]
+        foreign = self.add_registrations(1, 'PENDING_APPROVAL', event=foreign_event)
+
+        ids = [registration.pk for registration in rejected + foreign]
+        response = self.client.post(self.url, {'status': 'CONFIRMED', 'ids': ids}, format='json')
+
+        self.assertEqual([item['result'] for item in response.data['results']],
+                         ['updated', 'updated', 'error', 'error'])
+        self.assertEqual(response.data['results'][2]['error'], 'Достигнуто максимальное количество участников')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.current_participants_count, 3)
+        self.assertEqual(EventRegistration.objects.get(pk=foreign[0].pk).status, 'PENDING_APPROVAL')
+
+    def test_filter_and_query_count(self):
+        counts = []
+        for size in (3, 30):
+            EventRegistration.objects.all().delete()
+            self.add_registrations(size, 'PENDING_APPROVAL')
+            self.add_registrations(2, 'CANCELLED_BY_USER')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {
+                    'status': 'CONFIRMED', 'event_id': self.event.pk, 'current_status': 'PENDING_APPROVAL',
+                }, format='json')
+            self.assertEqual(response.data['updated'], size)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(EventRegistration.objects.filter(status='CANCELLED_BY_USER').count(), 2)
+
+    def test_requires_ids_or_event(self):
+        response = self.client.post(self.url, {'status': 'CONFIRMED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkResultUploadTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+        self.event = self.create_events(1, status='ACTIVE')[0]
+        self.url = reverse('event-bulk-results', args=[self.event.pk])
+
+    def add_participants(self, count, status='CONFIRMED'):
+        offset = User.objects.count()
+        users = User.objects.bulk_create(
+            User(email=f'finisher{offset + i}@example.com', display_name=f'Финишер {i}') for i in range(count)
+        )
+        EventRegistration.objects.bulk_create(
+            EventRegistration(event=self.event, user=user, status=status) for user in users
+        )
+        return [user.pk for user in users]
+
+    def upload(self, body, content_type='application/json', **params):
+        url = self.url + ('?' + '&'.join(f'{key}={value}' for key, value in params.items()) if params else '')
+        return self.client.post(url, data=body, content_type=content_type)
+
+    def test_json_array_with_row_errors(self):
+        ids = self.add_participants(2)
+        outsider = self.add_participants(1, status='PENDING_APPROVAL')[0]
+        rows = [
+            {'participant_user_id': ids[0], 'position': 1, 'score': '00:41:10'},
+            {'participant_user_id': outsider, 'position': 2},
+            {'participant_user_id': ids[0], 'position': 3},
+            'не объект',
+            {'position': 'первый', 'team_name_if_applicable': 'Команда'},
+            {'participant_user_id': ids[1], 'position': 2},
+        ]
+        response = self.upload(json.dumps(rows))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['processed'], response.data['created'], response.data['failed']), (6, 2, 4))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4, 5])
+        self.assertIn('participant_user_id', response.data['errors'][0]['errors'])
+        self.assertEqual(
+            sorted(EventResult.objects.filter(event=self.event).values_list('position', flat=True)), [1, 2]
+        )
+        self.assertTrue(EventResult.objects.filter(recorded_by_user=self.organizer).exists())
+
+    def test_ndjson_and_csv(self):
+        ids = self.add_participants(2)
+        body = f'{{"participant_user_id": {ids[0]}, "position": 1}}\n\n{{"team_name_if_applicable": "Клуб"}}\n'
+        response = self.upload(body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 2)
+
+        body = f'participant_user_id,position,score\n{ids[1]},2,00:45:00\n,,\n'
+        response = self.upload(body, content_type='text/csv; charset=utf-8')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(EventResult.objects.get(participant_user_id=ids[1]).score, '00:45:00')
+
+    def test_upsert_and_replace(self):
+        ids = self.add_participants(3)
+        EventResult.objects.create(event=self.event, participant_user_id=ids[0], position=5,
+                                   recorded_by_user=self.organizer)
+        EventResult.objects.create(event=self.event, participant_user_id=ids[2], position=9,
+                                   recorded_by_user=self.organizer)
+
+        rows = [{'participant_user_id': ids[0], 'position': 1}, {'participant_user_id': ids[1], 'position': 2}]
+        response = self.upload(json.dumps(rows), mode='upsert')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(EventResult.objects.get(participant_user_id=ids[0]).position, 1)
+        self.assertEqual(EventResult.objects.filter(event=self.event).count(), 3)
+
+        response = self.upload(json.dumps(rows[:1]), mode='replace')
+        self.assertEqual((response.data['deleted'], response.data['created']), (3, 1))
+        self.assertEqual(list(EventResult.objects.values_list('participant_user_id', flat=True)), [ids[0]])
+
+    def test_strict_rolls_back_and_malformed_body(self):
+        ids = self.add_participants(1)
+        rows = [{'participant_user_id': ids[0]}, {'position': 1}]
+        response = self.upload(json.dumps(rows), strict='true')
+        self.assertTrue(response.data['rolled_back'])
+        self.assertFalse(EventResult.objects.exists())
+
+        response = self.upload(f'[{{"participant_user_id": {ids[0]}}}, {{"position": ')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EventResult.objects.exists())
+
+    def test_query_count_does_not_depend_on_rows(self):
+        counts = []
+        for size in (3, 30):
+            EventResult.objects.all().delete()
+            EventRegistration.objects.all().delete()
+            ids = self.add_participants(size)
+            body = '\n'.join(json.dumps({'participant_user_id': pk, 'position': i}) for i, pk in enumerate(ids))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.upload(body, content_type='application/x-ndjson', mode='upsert')
+            self.assertEqual(response.data['created'], size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_only_organizer_of_active_event(self):
+        self.client.force_authenticate(self.participant)
+        self.assertEqual(self.upload('[]').status_code, 403)
+
+        self.client.force_authenticate(self.organizer)
+        self.event.status = 'REGISTRATION_OPEN'
+        self.event.save()
+        self.assertEqual(self.upload('[]').status_code, 400)
+        self.assertEqual(self.upload('[]', mode='merge').status_code, 400)
+
+
+class ScoreRuleTests(TestCase):
+    def test_parse(self):
+        self.assertEqual(ScoreRule(DURATION, ASC).normalize('1:02:03.5'), 3723.5)
+        self.assertEqual(ScoreRule(DURATION, ASC).normalize('41:10'), 2470)
+        self.assertEqual(ScoreRule(POINTS, DESC).normalize('12,5'), -12.5)
+        self.assertIsNone(ScoreRule(NUMBER, DESC).normalize(''))
+        for kind, score in ((DURATION, '41:75'), (DURATION, '1:2:3:4'), (NUMBER, 'десять'), (NUMBER, 'nan')):
+            with self.assertRaises(ValueError):
+                ScoreRule(kind, ASC).normalize(score)
+        self.assertIsNone(ScoreRule(NUMBER, DESC).normalize_or_none('10 очков'))
+        self.assertIsNone(ScoreRule(NUMBER, DESC).validate('7/9'))
+        with self.assertRaises(ValueError):
+            ScoreRule(POINTS, DESC).validate('7/9')
+
+
+class StandingsTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.event = self.create_events(1, status='ACTIVE')[0]
+        self.url = reverse('event-standings', args=[self.event.pk])
+
+    def add_results(self, *scores):
+        return [
+            EventResult.objects.create(event=self.event, team_name_if_applicable=f'Команда {i}', score=score,
+                                       recorded_by_user=self.organizer)
+            for i, score in enumerate(scores)
+        ]
+
+    def test_ranks_with_ties_across_pages(self):
+        self.add_results('45:00', '41:10', 'не финишировал', '41:10', '50:00')
+        first = self.client.get(self.url, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        ranks = [(item['rank'], item['score']) for item in first.data['results'] + second.data['results']]
+        self.assertEqual(ranks, [(1, '41:10'), (1, '41:10'), (3, '45:00'), (4, '50:00')])
+        self.assertIsNone(second.data['next'])
+
+    def test_rule_change_rescores_results(self):
+        self.add_results('10', '30', '20')
+        self.sport_type.score_kind = 'POINTS'
+        self.sport_type.score_order = 'DESC'
+        self.sport_type.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual([item['score'] for item in response.data['results']], ['30', '20', '10'])
+
+    def test_event_sport_type_change_rescores_results(self):
+        self.add_results('10', '30', '20')
+        self.event.sport_type = SportType.objects.create(name='Стрельба', score_kind='POINTS', score_order='DESC')
+        self.event.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual([item['score'] for item in response.data['results']], ['30', '20', '10'])
+
+    def test_free_text_score_accepted_under_default_rule(self):
+        self.event.sport_type = SportType.objects.create(name='Шахматы')
+        self.event.save()
+        registration = EventRegistration.objects.create(event=self.event, user=self.participant, status='CONFIRMED')
+        self.client.force_authenticate(self.organizer)
+        response = self.client.post(reverse('event-add-result', args=[self.event.pk]),
+                                    {'participant_user_id': registration.user_id, 'score': '8.5/9'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(EventResult.objects.get(pk=response.data['id']).normalized_score)
+
+    def test_invalid_score_is_rejected(self):
+        registration = EventRegistration.objects.create(event=self.event, user=self.participant, status='CONFIRMED')
+        self.client.force_authenticate(self.organizer)
+        response = self.client.post(reverse('event-add-result', args=[self.event.pk]),
+                                    {'participant_user_id': registration.user_id, 'score': '41 мин'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('score', response.data['error'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'План запроса проверяется для SQLite')
+    def test_single_indexed_query(self):
+        self.add_results('45:00', '41:10')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        # мероприятие + страница таблицы мест
+        self.assertEqual(len(queries), 2)
+        plan = EventResult.objects.standings(self.event)[:20].explain()
+        self.assertIn('result_event_score_idx', plan)
+
+
+class LeaderboardTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.event = self.create_events(1, status='ACTIVE')[0]
+        self.year = str(timezone.localtime(self.event.start_datetime).year)
+        self.users = User.objects.bulk_create(
+            User(email=f'leader{i}@example.com', display_name=f'Лидер {i}') for i in range(3)
+        )
+
+    def add_result(self, user, score, event=None, position=None):
+        return EventResult.objects.create(event=event or self.event, participant_user=user, score=score,
+                                          position=position, recorded_by_user=self.organizer)
+
+    def board(self, period='all'):
+        return {
+            entry.user_id: entry.points
+            for entry in LeaderboardEntry.objects.filter(sport_type=self.sport_type, period=period)
+        }
+
+    def test_incremental_updates(self):
+        first = self.add_result(self.users[0], '30:00')
+        self.add_result(self.users[1], '31:00')
+        other = self.create_events(1, status='ACTIVE', start_datetime=self.event.start_datetime)[0]
+        self.add_result(self.users[2], '40:00', event=other)
+        self.add_result(self.users[0], '45:00', event=other)
+        self.add_result(self.users[1], '50:00', event=other)
+        self.assertEqual(self.board(), {self.users[0].pk: 43, self.users[1].pk: 33, self.users[2].pk: 25})
+        self.assertEqual(self.board(self.year), self.board())
+
+        # Место второго участника меняется из-за чужого результата
+        first.score = '32:00'
+        first.participant_user = self.users[2]
+        first.save()
+        self.assertEqual(self.board(), {self.users[0].pk: 18, self.users[1].pk: 40, self.users[2].pk: 43})
+
+        other.delete()
+        self.assertEqual(self.board(), {self.users[1].pk: 25, self.users[2].pk: 18})
+
+        self.event.start_datetime -= timedelta(days=400)
+        self.event.save()
+        self.assertEqual(self.board(self.year), {})
+        self.assertEqual(self.board(), {self.users[1].pk: 25, self.users[2].pk: 18})
+
+    def test_points_follow_standings(self):
+        # Очки начисляются по месту в /standings/, а не по введённому position; без score очков нет
+        self.add_result(self.users[0], '35:00', position=1)
+        self.add_result(self.users[1], '30:00', position=2)
+        self.add_result(self.users[2], 'сошёл', position=3)
+
+        standings = self.client.get(reverse('event-standings', args=[self.event.pk])).data['results']
+        ranks = {item['participant_user']['id']: item['rank'] for item in standings}
+        self.assertEqual(ranks, {self.users[1].pk: 1, self.users[0].pk: 2})
+        self.assertEqual(self.board(), {self.users[1].pk: 25, self.users[0].pk: 18, self.users[2].pk: 0})
+
+        self.sport_type.score_order = 'DESC'
+        self.sport_type.save()
+        self.assertEqual(self.board(), {self.users[0].pk: 25, self.users[1].pk: 18, self.users[2].pk: 0})
+
+    def test_endpoint_ranks_and_pages(self):
+        for user, score in zip(self.users, ('31:00', '30:00', '31:00')):
+            self.add_result(user, score)
+        url = reverse('leaderboard-list')
+
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(url, {'sport_type': self.sport_type.pk, 'page_size': 2})
+        self.assertEqual(len(queries), 1)
+        second = self.client.get(first.data['next'])
+
+        rows = [(item['rank'], item['user']['id'], item['points'])
+                for item in first.data['results'] + second.data['results']]
+        self.assertEqual(rows, [(1, self.users[1].pk, 25), (2, self.users[0].pk, 18), (2, self.users[2].pk, 18)])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'sport_type': self.sport_type.pk, 'period': 'год'}).status_code, 400)
+
+    def test_bulk_upload_and_rebuild(self):
+        EventRegistration.objects.bulk_create(
+            EventRegistration(event=self.event, user=user, status='CONFIRMED') for user in self.users
+        )
+        self.add_result(self.users[0], '29:00')
+        self.client.force_authenticate(self.organizer)
+        rows = [{'participant_user_id': user.pk, 'position': i, 'score': f'3{i}:00'}
+                for i, user in enumerate(self.users[1:], 1)]
+        self.client.post(reverse('event-bulk-results', args=[self.event.pk]) + '?mode=replace',
+                         data=json.dumps(rows), content_type='application/json')
+
+        expected = {self.users[1].pk: 25, self.users[2].pk: 18}
+        self.assertEqual(self.board(), expected)
+        LeaderboardEntry.objects.all().delete()
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        self.assertEqual(self.board(), expected)
+        self.assertEqual(self.board(self.year), expected)
+
+
+class ExportTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+        self.event = self.create_events(1, status='ACTIVE')[0]
+        self.users = User.objects.bulk_create(
+            User(email=f'export{i}@example.com', display_name=f'Участник, {i}') for i in range(5)
+        )
+        EventRegistration.objects.bulk_create(
+            EventRegistration(event=self.event, user=user, status='CONFIRMED') for user in self.users
+        )
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_registrations_csv(self):
+        url = reverse('event-export-registrations', args=[self.event.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'format': 'csv'})
+            rows = list(csv.DictReader(StringIO(self.content(response))))
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'event-{self.event.pk}-registrations.csv', response['Content-Disposition'])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['user_display_name'], 'Участник, 0')
+        self.assertEqual(rows[0]['notes_by_user'], '')
+        self.assertEqual(rows[0]['registration_datetime'],
+                         EventRegistrationSerializer().fields['registration_datetime'].to_representation(
+                             EventRegistration.objects.order_by('id').first().registration_datetime))
+        # мероприятие + выгрузка одним запросом
+        self.assertEqual(len(queries), 2)
+
+    def test_csv_escapes_formulas(self):
+        notes = ['=HYPERLINK("http://example.com")', '+1', '-2+3', '@SUM(A1)', 'обычный текст']
+        for registration, note in zip(EventRegistration.objects.order_by('id'), notes):
+            registration.notes_by_user = note
+            registration.save(update_fields=['notes_by_user'])
+        url = reverse('event-export-registrations', args=[self.event.pk])
+
+        rows = list(csv.DictReader(StringIO(self.content(self.client.get(url, {'format': 'csv'})))))
+        self.assertEqual([row['notes_by_user'] for row in rows],
+                         ["'" + note for note in notes[:4]] + ['обычный текст'])
+        self.assertEqual(rows[0]['id'], str(EventRegistration.objects.order_by('id').first().pk))
+
+        # в NDJSON значения отдаются как есть
+        response = self.client.get(url, {'format': 'ndjson'})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([row['notes_by_user'] for row in rows], notes)
+
+    def test_results_ndjson(self):
+        for position, user in enumerate(self.users, 1):
+            EventResult.objects.create(event=self.event, participant_user=user, position=position, score='40:00',
+                                       recorded_by_user=self.organizer)
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('event-export-results', args=[self.event.pk]), {'format': 'ndjson'})
+
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([row['position'] for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(rows[0]['participant_display_name'], 'Участник, 0')
+
+    def test_only_organizer_exports_registrations(self):
+        url = reverse('event-export-registrations', args=[self.event.pk])
+        self.client.force_authenticate(self.participant)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(self.organizer)
+        for export_format in ('xlsx', 'xml'):
+            response = self.client.get(url, {'format': export_format})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('csv, ndjson', response.data['error'])
+
+
+class GenerateLoadDataTests(TestCase):
+    def generate(self, **options):
+        options = {'users': 40, 'events': 30, 'registrations': 300, 'base_date': '2026-10-01', **options}
+        call_command('generate_load_data', stdout=StringIO(), **options)
+
+    def test_generates_consistent_dataset(self):
+        self.generate()
+
+        self.assertEqual(User.objects.filter(email__startswith='load-').count(), 40)
+        self.assertEqual(Event.objects.count(), 30)
+        self.assertGreater(EventRegistration.objects.count(), 200)
+        self.assertFalse(Location.objects.filter(city_key='').exists())
+        self.assertFalse(Location.objects.filter(geohash='').exists())
+        # счётчики мест совпадают с регистрациями, результаты только у зарегистрированных
+        for event in Event.objects.annotate(seats=Count('registrations', filter=Q(
+                registrations__status__in=SEAT_STATUSES))):
+            self.assertEqual(event.current_participants_count, event.seats)
+        self.assertFalse(EventResult.objects.exclude(
+            participant_user__event_registrations__event=F('event')
+        ).exists())
+
+        # поисковый индекс перестроен
+        event = Event.objects.filter(is_public=True).order_by('id').first()
+        response = APIClient().get(reverse('event-list'), {'search': event.title.split(':')[0], 'page_size': 100})
+        self.assertIn(event.pk, [item['id'] for item in response.data['results']])
+
+    def test_same_seed_same_data(self):
+        self.generate(seed=7)
+        first = list(Event.objects.order_by('id').values_list('title', 'start_datetime', 'max_participants'))
+        self.generate(seed=7, email_prefix='again')
+        second = list(Event.objects.order_by('id').values_list('title', 'start_datetime', 'max_participants'))[30:]
+        self.assertEqual(first, second)
+
+    def test_rejects_existing_prefix(self):
+        self.generate(users=5, events=2, registrations=5)
+        with self.assertRaises(CommandError):
+            self.generate(users=5, events=2, registrations=5)
+
+
+class EndpointBenchmarkTests(TestCase):
+    @override_settings(EVENTS_CACHE_ENABLED=False)
+    def test_all_cases_succeed(self):
+        call_command('generate_load_data', users=60, events=40, registrations=600, stdout=StringIO())
+        results, errors = run_benchmarks(iterations=1, warmup=0)
+
+        self.assertEqual(errors, [])
+        self.assertIn('event-list', results)
+        self.assertIn('login', results)
+        self.assertGreater(results['event-list']['queries'], 0)
+        self.assertGreater(results['event-export-results']['bytes'], 0)
+
+    def test_compare_reports_regressions(self):
+        baseline = {'event-list': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 3, 'bytes': 1000}}
+        same = {'event-list': {'p50_ms': 11.0, 'p95_ms': 21.0, 'queries': 3, 'bytes': 1100}}
+        slower = {'event-list': {'p50_ms': 30.0, 'p95_ms': 21.0, 'queries': 4, 'bytes': 1000},
+                  'new-case': {'p50_ms': 1.0, 'p95_ms': 1.0, 'queries': 1, 'bytes': 1}}
+
+        self.assertEqual(compare(same, baseline), [])
+        # время по умолчанию не сравнивается
+        self.assertEqual(compare(slower, baseline), ['event-list: SQL-запросов 4 (эталон 3)'])
+        regressions = compare(slower, baseline, latency=True)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('event-list: SQL'))
+        self.assertTrue(regressions[1].startswith('event-list: p50_ms'))
+        bigger = {'event-list': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 3, 'bytes': 1300}}
+        self.assertEqual(len(compare(bigger, baseline)), 1)
+
+
+class InstrumentationTests(APITestDataMixin, TestCase):
+    @override_settings(EVENTS_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        self.create_events(3)
+        response = APIClient().get(reverse('event-list'))
+
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'serialize;dur=', 'render;dur='):
+            self.assertIn(metric, timing)
+        self.assertIn('queries"', timing)
+
+    @override_settings(EVENTS_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        response = APIClient().get(reverse('event-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(EVENTS_DUPLICATE_QUERY_THRESHOLD=3)
+    def test_logs_repeated_queries_with_serializer_field(self):
+        events = self.create_events(4)
+        for i, event in enumerate(events):
+            event.organizer = User.objects.create_user(f'org{i}@example.com', f'Организатор {i}', 'password')
+            event.save()
+
+        def view(request):
+            # без select_related: организатор загружается отдельным запросом для каждого мероприятия
+            data = EventSerializer(Event.objects.order_by('id'), many=True).data
+            return HttpResponse(json.dumps(data, default=str))
+
+        middleware = InstrumentationMiddleware(view)
+        with self.assertLogs('events.instrumentation', 'WARNING') as logs:
+            middleware(APIRequestFactory().get('/api/events/'))
+
+        data = logs.records[0].request_metrics
+        self.assertGreaterEqual(data['queries'], 4)
+        origins = [origin for item in data['duplicates'] for origin in item['origins']]
+        self.assertIn('EventSerializer.organizer', origins)
+        self.assertIn('EventSerializer.location', origins)
+
+    @override_settings(EVENTS_SLOW_REQUEST_MS=0)
+    def test_logs_slow_request(self):
+        with self.assertLogs('events.instrumentation', 'WARNING') as logs:
+            APIClient().get(reverse('sporttype-list'))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data['view'], 'sporttype-list')
+        self.assertGreater(data['bytes'], 0)
+
+
+class ProfilingTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.settings_override = override_settings(EVENTS_PROFILE_DIR=str(self.directory))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.staff = User.objects.create_user('staff@example.com', 'Сотрудник', 'password', is_staff=True)
+        self.create_events(3)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def test_staff_header_writes_profile(self):
+        response = self.client_for(self.staff).get(reverse('event-list'), HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, 200)
+        path = self.directory / response['X-Profile-File']
+        self.assertEqual(path.suffix, '.prof')
+        self.assertIn('event-list', path.name)
+        stats = pstats.Stats(str(path))
+        self.assertTrue(any(name == 'list' for _, _, name in stats.stats))
+
+    def test_header_ignored_for_non_staff(self):
+        response = self.client_for(self.participant).get(reverse('event-list'), HTTP_X_PROFILE='1')
+        self.assertFalse(response.has_header('X-Profile-File'))
+        response = APIClient().get(reverse('event-list'), HTTP_X_PROFILE='1')
+        self.assertFalse(response.has_header('X-Profile-File'))
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    @override_settings(EVENTS_PROFILE_SAMPLE_RATE=1.0, EVENTS_PROFILE_VIEWS=['event-list'])
+    def test_sampling_limited_to_views(self):
+        APIClient().get(reverse('sporttype-list'))
+        APIClient().get(reverse('event-list'))
+        files = list(self.directory.iterdir())
+        self.assertEqual(len(files), 1)
+        self.assertIn('event-list', files[0].name)
+
+    @override_settings(EVENTS_PROFILE_SAMPLER_INTERVAL_MS=0.1, EVENTS_PROFILE_MAX_FILES=2)
+    def test_sampler_and_summary(self):
+        client = self.client_for(self.staff)
+        client.get(reverse('event-list'), HTTP_X_PROFILE='1')
+        for _ in range(2):
+            client.get(reverse('event-list'), {'page_size': 100}, HTTP_X_PROFILE='sampler')
+
+        self.assertEqual(len(list(self.directory.glob('*.folded'))), 2)
+        # старый профиль cProfile удалён: хранятся только последние EVENTS_PROFILE_MAX_FILES
+        self.assertEqual(list(self.directory.glob('*.prof')), [])
+
+        out = StringIO()
+        call_command('summarize_profiles', view='event-list', limit=5, stdout=out)
+        self.assertIn('Сэмплер: 2 файлов', out.getvalue())
+
+
+class MetricsTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.settings_override = override_settings(EVENTS_METRICS_DIR=self.directory)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        get_cache().clear()
+
+    def scrape(self):
+        with override_settings(DEBUG=True):
+            response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_request_and_cache_metrics(self):
+        self.create_events(2)
+        client = APIClient()
+        for _ in range(3):
+            client.get(reverse('event-list'))
+        client.get(reverse('event-detail', args=[0]))
+
+        samples = self.scrape()
+        labels = 'method="GET",view="event-list"'
+        self.assertEqual(samples['sports_api_http_requests_total{method="GET",status="2xx",view="event-list"}'], 3)
+        self.assertEqual(samples[f'sports_api_http_requests_total{{method="GET",status="4xx",view="event-detail"}}'], 1)
+        self.assertEqual(samples[f'sports_api_http_request_duration_seconds_count{{{labels}}}'], 3)
+        self.assertEqual(samples[f'sports_api_http_request_duration_seconds_bucket{{le="+Inf",{labels}}}'], 3)
+        self.assertGreater(samples[f'sports_api_db_queries_total{{{labels}}}'], 0)
+        self.assertEqual(samples['sports_api_cache_requests_total{result="hit"}'], 2)
+        hits, misses = (samples[f'sports_api_cache_requests_total{{result="{result}"}}'] for result in ('hit', 'miss'))
+        self.assertAlmostEqual(samples['sports_api_cache_hit_ratio'], hits / (hits + misses))
+        # текущий запрос к /metrics тоже в обработке
+        self.assertEqual(samples['sports_api_http_requests_in_flight'], 1)
+
+    def test_aggregates_worker_processes(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=metrics.inc, args=('http_requests_total', {
+            'view': 'event-register', 'method': 'POST', 'status': '2xx',
+        })) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        metrics.inc('http_requests_total', {'view': 'event-register', 'method': 'POST', 'status': '2xx'})
+        # gauge завершившегося процесса не учитывается
+        worker = context.Process(target=metrics.inc, args=('http_requests_in_flight',))
+        worker.start()
+        worker.join()
+
+        samples = self.scrape()
+        self.assertEqual(
+            samples['sports_api_http_requests_total{method="POST",status="2xx",view="event-register"}'], 3
+        )
+        self.assertEqual(samples['sports_api_http_requests_in_flight'], 1)
+        self.assertEqual(samples['sports_api_worker_processes'], 1)
+
+    def test_unknown_methods_share_one_series(self):
+        for index in range(5):
+            self.client.generic(f'X{index}', reverse('event-list'))
+
+        samples = self.scrape()
+        self.assertEqual(samples['sports_api_http_requests_total{method="other",status="4xx",view="event-list"}'], 5)
+        self.assertFalse([name for name in samples if 'method="X' in name])
+
+    def test_key_cache_is_bounded(self):
+        with mock.patch.object(metrics, 'MAX_CACHED_KEYS', 3):
+            metrics._keys.clear()
+            for index in range(10):
+                metrics.make_key('http_requests_total', {'view': f'view-{index}'})
+            self.assertLessEqual(len(metrics._keys), 3)
+        metrics._keys.clear()
+
+    def test_closed_by_default(self):
+        client = APIClient()
+        self.assertEqual(client.get('/metrics').status_code, 401)
+        client.force_authenticate(self.participant)
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        self.participant.is_staff = True
+        self.participant.save(update_fields=['is_staff'])
+        response = client.get('/metrics', HTTP_ACCEPT='text/plain')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'sports_api_http_requests_total', response.content)
+
+    @override_settings(EVENTS_METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertIn(self.client.get('/metrics').status_code, (401, 403))
+        self.assertIn(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, (401, 403))
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+
+class SlowQueryLogTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.log = os.path.join(self.directory, 'slow.log')
+        self.settings_override = override_settings(EVENTS_SLOW_QUERY_MS=0.0001, EVENTS_SLOW_QUERY_LOG=self.log,
+                                                   EVENTS_SLOW_QUERY_EXPLAIN_INTERVAL=0)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_records_registration_queries_with_plan(self):
+        event = self.create_events(1)[0]
+        EventRegistration.objects.create(event=event, user=self.participant, status='CONFIRMED')
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        client.get(reverse('registration-list'))
+
+        entries = [entry for entry in read_slow_queries(self.log) if entry['view'] == 'registration-list']
+        self.assertTrue(entries)
+        entry = next(entry for entry in entries if 'events_eventregistration' in entry['sql'])
+        self.assertTrue(entry['plan'])
+        self.assertEqual(entry['path'], reverse('registration-list'))
+        self.assertTrue(entry['call_sites'])
+        # значения параметров не сохраняются
+        self.assertNotIn('params', entry)
+        self.assertEqual(len(entry['params_fingerprint']), 16)
+
+        out = StringIO()
+        call_command('slow_query_report', log=self.log, view='registration-list', plans=True, stdout=out)
+        self.assertIn('events_eventregistration', out.getvalue())
+        self.assertIn('План:', out.getvalue())
+
+    def test_wrapper_kept_after_scoped_wrappers(self):
+        with connection.execute_wrapper(lambda execute, *args: execute(*args)):
+            Event.objects.count()
+        self.assertIn(slow_query_wrapper, connection.execute_wrappers)
+        self.assertEqual(connection.execute_wrappers[-1:], [slow_query_wrapper])
+
+    def test_process_logs_merged(self):
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=Event.objects.count)
+        worker.start()
+        worker.join()
+        Event.objects.count()
+
+        logs = sorted(os.listdir(self.directory))
+        self.assertEqual(logs, sorted([f'slow-{worker.pid}.log', f'slow-{os.getpid()}.log']))
+        times = [entry['time'] for entry in read_slow_queries(self.log) if 'events_event' in entry['sql']]
+        self.assertGreaterEqual(len(times), 2)
+        self.assertEqual(times, sorted(times))
+
+    @override_settings(EVENTS_SLOW_QUERY_MS=0)
+    def test_disabled(self):
+        Event.objects.count()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class TokenUserAuthenticationTests(APITestDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_cache().clear()
+        self.event = self.create_events(1)[0]
+        self.authentication = TokenUserAuthentication()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.authentication.authenticate(request)[0]
+
+    @staticmethod
+    def user_queries(queries):
+        return [query['sql'] for query in queries if 'FROM "events_user" WHERE' in query['sql']]
+
+    def test_authenticated_read_skips_users_table(self):
+        EventRegistration.objects.create(event=self.event, user=self.participant, status='CONFIRMED')
+        client = self.client_for(self.participant)
+        client.get(reverse('registration-ticket-list'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('registration-ticket-list'))
+            client.get(reverse('event-detail', args=[self.event.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_cached_user(self):
+        with self.assertNumQueries(1):
+            self.authenticate(self.organizer)
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.organizer)
+        self.assertIsInstance(user, TokenUser)
+        self.assertEqual(user, self.organizer)
+        self.assertEqual(user.display_name, 'Организатор')
+        self.assertEqual(user.email, 'org@example.com')
+        self.assertFalse(user.is_staff)
+        self.assertTrue(user.is_authenticated)
+
+    def test_organizer_checks_and_writes(self):
+        url = reverse('event-detail', args=[self.event.pk])
+        response = self.client_for(self.participant).patch(url, {'title': 'Чужое'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client_for(self.organizer).patch(url, {'title': 'Новое'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client_for(self.participant).post(reverse('event-register', args=[self.event.pk]))
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(EventRegistration.objects.filter(event=self.event, user=self.participant).exists())
+
+    def test_full_user_loaded_once(self):
+        client = self.client_for(self.participant)
+        response = client.get(reverse('user-profile'))
+        self.assertEqual(response.data['email'], 'user@example.com')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('user-profile'))
+        self.assertEqual(response.data['email'], 'user@example.com')
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_deactivated_user_rejected(self):
+        client = self.client_for(self.participant)
+        self.assertEqual(client.get(reverse('user-profile')).status_code, 200)
+
+        self.participant.is_active = False
+        self.participant.save()
+
+        self.assertEqual(client.get(reverse('user-profile')).status_code, 401)
+
+    def test_deactivation_without_shared_marker(self):
+        self.participant.is_staff = True
+        self.participant.save()
+        client = self.client_for(self.participant)
+        self.assertEqual(client.get(reverse('user-profile')).status_code, 200)
+
+        self.participant.is_active = False
+        self.participant.is_staff = False
+        self.participant.save()
+        # Отметка изменения в общем кэше может быть вытеснена
+        get_cache().clear()
+
+        self.assertEqual(client.get(reverse('user-profile')).status_code, 401)
+
+    def test_role_change_applied(self):
+        token = RefreshToken.for_user(self.participant)
+        self.authenticate(self.participant)
+        self.participant.display_name = 'Новое имя'
+        self.participant.is_staff = True
+        self.participant.save()
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        user = self.authentication.authenticate(request)[0]
+
+        self.assertEqual(user.display_name, 'Новое имя')
+        self.assertTrue(user.is_staff)
+
+    def test_save_does_not_write_back_stale_values(self):
+        self.participant.is_staff = True
+        self.participant.save()
+        client = self.client_for(self.participant)
+        self.assertEqual(client.get(reverse('user-profile')).status_code, 200)
+        # Изменение без сигналов: кэш процесса ещё хранит is_active=True, is_staff=True
+        User.objects.filter(pk=self.participant.pk).update(is_active=False, is_staff=False)
+
+        response = client.put(reverse('user-profile'), {'display_name': 'Новое имя'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.participant.pk)
+        self.assertEqual(user.display_name, 'Новое имя')
+        self.assertFalse(user.is_active)
+        self.assertFalse(user.is_staff)
+
+    def test_profile_update_invalidates_caches(self):
+        url = reverse('event-detail', args=[self.event.pk])
+        self.assertEqual(self.client.get(url).data['organizer']['display_name'], 'Организатор')
+
+        response = self.client_for(self.organizer).put(
+            reverse('user-profile'), {'display_name': 'Главный судья'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url).data['organizer']['display_name'], 'Главный судья')
+        self.assertEqual(self.authenticate(self.organizer).display_name, 'Главный судья')
+        self.assertEqual(User.objects.get(pk=self.organizer.pk).display_name, 'Главный судья')
+
+    @override_settings(EVENTS_AUTH_USER_CACHE_SIZE=1)
+    def test_user_cache_bounded(self):
+        load_user_values(self.organizer.pk)
+        load_user_values(self.participant.pk)
+
+        self.assertEqual(list(get_user_cache().entries), [self.participant.pk])
@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     user_views,
     catalog_views,
-    event_views
+    event_views,
+    leaderboard_views
 )
 
 # Создаем router для DRF ViewSets
@@ -14,6 +15,8 @@ router.register(r'locations', catalog_views.LocationViewSet)
 router.register(r'events', event_views.EventViewSet, basename='event')
 router.register(r'registrations', event_views.EventRegistrationViewSet, basename='registration')
 router.register(r'results', event_views.EventResultViewSet, basename='result')
+router.register(r'registration-tickets', event_views.RegistrationTicketViewSet, basename='registration-ticket')
+router.register(r'leaderboards', leaderboard_views.LeaderboardViewSet, basename='leaderboard')
 
 urlpatterns = [
     # Пользовательские маршруты
@@ -2,4 +2,6 @@
 from .auth_views import RegisterView, LoginView
 from .user_views import UserProfileView
 from .catalog_views import SportTypeViewSet, EventTypeViewSet, LocationViewSet
-from .event_views import EventViewSet, EventRegistrationViewSet, EventResultViewSet
\ No newline at end of file
+from .event_views import EventViewSet, EventRegistrationViewSet, EventResultViewSet, RegistrationTicketViewSet
+from .leaderboard_views import LeaderboardViewSet
+from .metrics_views import MetricsView
@@ -1,9 +1,29 @@
 from rest_framework import viewsets, permissions
-from ..models import SportType, EventType, Location
+from ..compiled import CompiledListMixin
+from ..conditional import ConditionalGetMixin, aggregate_state, make_etag
+from ..fieldsets import SparseFieldset
+from ..filters import NearFilter
+from ..models import SportType, EventType, Location, normalize_city, prefix_filter
 from ..serializers import SportTypeSerializer, EventTypeSerializer, LocationSerializer
 
 
-class SportTypeViewSet(viewsets.ModelViewSet): # Изменено на ModelViewSet
+class CatalogConditionalGetMixin(ConditionalGetMixin):
+    """
+    ETag и Last-Modified для справочников по максимальному updated_at и количеству строк.
+    """
+
+    def get_validators(self, request):
+        queryset = self.get_queryset()
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(pk=self.kwargs[lookup_url_kwarg])
+        last_modified, total = aggregate_state(queryset)
+        if self.action == 'retrieve' and not total:
+            return None, None
+        return make_etag(request, last_modified, total), last_modified
+
+
+class SportTypeViewSet(CatalogConditionalGetMixin, viewsets.ModelViewSet): # Изменено на ModelViewSet
     """
     Получение, создание, обновление и удаление видов спорта.
     """
@@ -17,7 +37,7 @@ class SportTypeViewSet(viewsets.ModelViewSet): # Изменено на ModelView
         return [permissions.IsAdminUser()] # Например, только админ может менять
 
 
-class EventTypeViewSet(viewsets.ReadOnlyModelViewSet):
+class EventTypeViewSet(CatalogConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     Получение списка типов мероприятий.
     """
@@ -26,12 +46,13 @@ class EventTypeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(CompiledListMixin, viewsets.ModelViewSet):
     """
     Получение, создание, обновление и удаление мест проведения.
     """
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
+    filter_backends = [NearFilter]
 
     def get_permissions(self):
         """
@@ -49,8 +70,8 @@ class LocationViewSet(viewsets.ModelViewSet):
         """
         Фильтрация локаций по городу, если указан параметр city
         """
-        queryset = Location.objects.all()
-        city = self.request.query_params.get('city', None)
+        queryset = Location.objects.for_serialization(SparseFieldset.from_request(self.request))
+        city = normalize_city(self.request.query_params.get('city', ''))
         if city:
-            queryset = queryset.filter(city__icontains=city)
+            queryset = queryset.filter(prefix_filter('city_key', city))
         return queryset
\ No newline at end of file
@@ -1,19 +1,51 @@
+from collections import Counter
+
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 
-from ..models import Event, EventRegistration, EventResult
+from ..cache import EVENT_VERSION_KEY, GLOBAL_VERSION_KEY, CachedPublicReadMixin, version_state
+from ..capacity import RegistrationError, bulk_change_status, change_registration_status
+from ..catalog import get_catalog
+from ..compiled import CompiledListMixin
+from ..conditional import ConditionalGetMixin, aggregate_state, latest, make_etag
+from ..exports import (
+    EXPORT_FORMATS, REGISTRATION_COLUMNS, RESULT_COLUMNS, CSVRenderer, NDJSONRenderer, export_response
+)
+from ..fieldsets import SparseFieldset
+from ..filters import FullTextSearchFilter, NearFilter
+from ..ingest import MODES as INGEST_MODES, IngestError, ResultIngestor, iter_rows
+from ..intake import enqueue_registration
+from ..models import Event, EventRegistration, EventResult, RegistrationTicket, normalize_city, prefix_filter
+from ..pagination import (
+    EventKeysetPagination,
+    RegistrationKeysetPagination,
+    ResultKeysetPagination,
+    RegistrationCursorPagination,
+    ResultCursorPagination,
+    StandingsCursorPagination
+)
 from ..serializers import (
+    BulkRegistrationStatusSerializer,
     EventSerializer,
     EventDetailSerializer,
     EventRegistrationSerializer,
-    EventResultSerializer
+    EventRegistrationNestedSerializer,
+    EventResultSerializer,
+    EventResultNestedSerializer,
+    EventStandingSerializer,
+    RegistrationTicketSerializer
 )
 
+# Максимальное количество вложенных регистраций/результатов в детальной информации о мероприятии.
+# Полные списки доступны через /events/{id}/registrations/ и /events/{id}/results/
+DETAIL_NESTED_LIMIT = 50
+
 
 class IsOrganizerOrReadOnly(permissions.BasePermission):
     """
@@ -38,14 +70,15 @@ class IsAuthenticatedForRegister(permissions.BasePermission):
         return request.user and request.user.is_authenticated
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(CachedPublicReadMixin, ConditionalGetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     API для создания, редактирования и получения информации о мероприятиях.
     """
     serializer_class = EventSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = EventKeysetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter, NearFilter]
     filterset_fields = ['sport_type', 'event_type', 'status', 'is_public']
-    search_fields = ['title', 'description']
+    near_location_prefix = 'location__'
     ordering_fields = ['start_datetime', 'created_at']
     ordering = ['start_datetime']
 
@@ -57,7 +90,7 @@ class EventViewSet(viewsets.ModelViewSet):
         - PUT/DELETE запросы могут выполнять только организаторы
         - Регистрация/отмена регистрации требуют только аутентификации
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'results', 'standings', 'export_results']:
             permission_classes = [permissions.AllowAny]
         elif self.action in ['create', 'register', 'unregister']:
             permission_classes = [IsAuthenticatedForRegister]
@@ -68,17 +101,20 @@ class EventViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """
         Фильтрация событий по параметрам запроса.
+        Связи и подсчёт регистраций подтягиваются только для полей из ?fields= / ?expand=
         """
-        queryset = Event.objects.all()
+        fieldset = SparseFieldset.from_request(self.request)
+        return self.filter_events(Event.objects.for_serialization(fieldset))
 
+    def filter_events(self, queryset):
         # Фильтр по умолчанию: только публичные мероприятия, если не указано иное
         if not self.request.query_params.get('include_private', False):
             queryset = queryset.filter(is_public=True)
 
-        # Фильтрация по городу (через location)
-        city = self.request.query_params.get('city', None)
+        # Фильтрация по городу (через location): префиксный поиск по нормализованному ключу
+        city = normalize_city(self.request.query_params.get('city', ''))
         if city:
-            queryset = queryset.filter(location__city__icontains=city)
+            queryset = queryset.filter(prefix_filter('location__city_key', city))
 
         # Фильтрация по дате
         date_from = self.request.query_params.get('date_from', None)
@@ -91,6 +127,64 @@ class EventViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_validators(self, request):
+        """
+        ETag и Last-Modified по версиям кэша ответов, которые увеличивают сигналы (events/signals.py)
+        при изменении мероприятий, регистраций, результатов, локаций и справочников.
+        Для списка запрос к БД не выполняется: параметры запроса (фильтры, курсор) входят в ETag,
+        поэтому стоимость проверки не зависит от размера выборки. Для деталей агрегат по pk
+        нужен ещё и для 404.
+        """
+        catalog = get_catalog()
+        if self.action != 'retrieve':
+            versions, changed_at = version_state([GLOBAL_VERSION_KEY])
+            last_modified = latest(changed_at, catalog.last_modified)
+            return make_etag(request, versions, changed_at, catalog.state), last_modified
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        event_id = int(self.kwargs[lookup_url_kwarg])
+        queryset = self.filter_queryset(self.filter_events(Event.objects.all())).filter(pk=event_id)
+        last_modified, total = aggregate_state(queryset)
+        if not total:
+            return None, None
+        versions, changed_at = version_state([EVENT_VERSION_KEY.format(event_id)])
+        last_modified = latest(last_modified, changed_at, catalog.last_modified)
+        return make_etag(request, last_modified, versions, catalog.state), last_modified
+
+    def get_includes(self):
+        """
+        Список вложенных коллекций, запрошенных через ?include=registrations,results
+        """
+        include = self.request.query_params.get('include', '')
+        requested = {name.strip() for name in include.split(',') if name.strip()}
+        return requested.intersection(EventDetailSerializer.INCLUDABLE_FIELDS)
+
+    def get_object(self):
+        """
+        Для детальной информации подгружает ограниченные вложенные коллекции из ?include=
+        """
+        instance = super().get_object()
+        if self.action != 'retrieve':
+            return instance
+        include = self.get_includes()
+        if 'registrations' in include:
+            instance.included_registrations = list(
+                instance.registrations.select_related('user')
+                .order_by('registration_datetime', 'id')[:DETAIL_NESTED_LIMIT]
+            )
+        if 'results' in include:
+            instance.included_results = list(
+                instance.results.select_related('participant_user')
+                .order_by('recorded_at', 'id')[:DETAIL_NESTED_LIMIT]
+            )
+        return instance
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['include'] = self.get_includes()
+        return context
+
     def get_serializer_class(self):
         """
         Использование разных сериализаторов для разных действий.
@@ -112,24 +206,28 @@ class EventViewSet(viewsets.ModelViewSet):
         """
         event = self.get_object()
 
+        # Мероприятия с пиковой нагрузкой: заявка сразу ставится в очередь, проверки и распределение мест
+        # выполняет обработчик очереди (events/intake.py), результат - по GET /registration-tickets/{id}/
+        if event.registration_queue:
+            ticket, _ = enqueue_registration(event, request.user, request.data.get('notes_by_user'))
+            serializer = RegistrationTicketSerializer(ticket)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
         # Проверка существующей регистрации
         existing_registration = EventRegistration.objects.filter(event=event, user=request.user).first()
         
         if existing_registration:
-            # Если регистрация отменена или отклонена, обновляем её статус
+            # Если регистрация отменена или отклонена, возобновляем её (место занимается атомарно)
             if existing_registration.status in ['CANCELLED_BY_USER', 'REJECTED_BY_ORGANIZER']:
-                # Обновляем статус существующей регистрации
-                existing_registration.status = 'PENDING_APPROVAL'
+                changes = {'registration_datetime': timezone.now()}
                 # Обновляем заметки пользователя, если они предоставлены
                 if 'notes_by_user' in request.data:
-                    existing_registration.notes_by_user = request.data['notes_by_user']
-                existing_registration.registration_datetime = timezone.now()
-                existing_registration.save()
-                
-                # Увеличиваем счетчик участников
-                event.current_participants_count += 1
-                event.save()
-                
+                    changes['notes_by_user'] = request.data['notes_by_user']
+                try:
+                    change_registration_status(existing_registration, 'PENDING_APPROVAL', **changes)
+                except RegistrationError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
                 serializer = EventRegistrationSerializer(existing_registration)
                 return Response(serializer.data, status=status.HTTP_200_OK)
             else:
@@ -146,7 +244,7 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Проверка максимального количества участников
+        # Быстрая проверка заполненности; окончательно место резервируется при создании регистрации
         if event.max_participants and event.current_participants_count >= event.max_participants:
             return Response(
                 {"error": "Достигнуто максимальное количество участников"},
@@ -186,13 +284,11 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Меняем статус на отмененный пользователем
-        registration.status = 'CANCELLED_BY_USER'
-        registration.save()
-
-        # Уменьшаем счетчик участников
-        event.current_participants_count = max(0, event.current_participants_count - 1)
-        event.save()
+        # Меняем статус на отмененный пользователем и освобождаем место
+        try:
+            change_registration_status(registration, 'CANCELLED_BY_USER')
+        except RegistrationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -210,9 +306,77 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        registrations = EventRegistration.objects.filter(event=event)
-        serializer = EventRegistrationSerializer(registrations, many=True)
-        return Response(serializer.data)
+        registrations = EventRegistration.objects.filter(event=event).select_related('user')
+        paginator = RegistrationCursorPagination()
+        page = paginator.paginate_queryset(registrations, request)
+        serializer = EventRegistrationNestedSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='registrations/export',
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[JSONRenderer, CSVRenderer, NDJSONRenderer])
+    def export_registrations(self, request, pk=None):
+        """
+        Потоковая выгрузка регистраций мероприятия (только для организатора): ?format=csv|ndjson
+        """
+        event = self.get_object()
+        if event.organizer != request.user:
+            return Response(
+                {"error": "Только организатор может выгружать список регистраций"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return self.export(EventRegistration.objects.filter(event=event), REGISTRATION_COLUMNS,
+                           f'event-{event.pk}-registrations')
+
+    @action(detail=True, methods=['get'], url_path='results/export',
+            renderer_classes=[JSONRenderer, CSVRenderer, NDJSONRenderer])
+    def export_results(self, request, pk=None):
+        """
+        Потоковая выгрузка результатов мероприятия: ?format=csv|ndjson
+        """
+        event = self.get_object()
+        return self.export(EventResult.objects.filter(event=event), RESULT_COLUMNS, f'event-{event.pk}-results')
+
+    def perform_content_negotiation(self, request, force=False):
+        # Неизвестный ?format= выгрузки должен дойти до export() и получить 400, а не 404 от DRF
+        if (self.action in ('export_registrations', 'export_results')
+                and request.query_params.get('format', 'csv') not in EXPORT_FORMATS):
+            renderer = JSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
+    def export(self, queryset, columns, filename):
+        export_format = self.request.query_params.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Неизвестный формат выгрузки. Допустимые значения: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return export_response(queryset, columns, export_format, filename)
+
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        """
+        Получение списка результатов мероприятия.
+        """
+        event = self.get_object()
+        results = EventResult.objects.filter(event=event).select_related('participant_user')
+        paginator = ResultCursorPagination()
+        page = paginator.paginate_queryset(results, request)
+        serializer = EventResultNestedSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def standings(self, request, pk=None):
+        """
+        Таблица мест мероприятия по типизированному результату (без результатов, score которых не разобран).
+        """
+        event = self.get_object()
+        standings = EventResult.objects.standings(event)
+        paginator = StandingsCursorPagination()
+        page = paginator.paginate_queryset(standings, request)
+        serializer = EventStandingSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_result(self, request, pk=None):
@@ -245,6 +409,45 @@ class EventViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=True, methods=['post'], url_path='results/bulk',
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk_results(self, request, pk=None):
+        """
+        Массовая загрузка результатов (только для организатора).
+        Тело запроса - JSON-массив, NDJSON или CSV, читается потоком.
+        ?mode=append|replace|upsert, ?strict=true - откатить загрузку при любой ошибке в строках.
+        """
+        event = self.get_object()
+
+        if event.organizer != request.user:
+            return Response(
+                {"error": "Только организатор может добавлять результаты"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if event.status not in ['ACTIVE', 'COMPLETED']:
+            return Response(
+                {"error": "Результаты можно добавлять только для активных или завершенных мероприятий"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        mode = request.query_params.get('mode', 'append')
+        if mode not in INGEST_MODES:
+            return Response(
+                {"error": f"Неизвестный режим загрузки. Допустимые значения: {', '.join(INGEST_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        strict = request.query_params.get('strict', '').lower() in ('1', 'true')
+
+        # request.data не используется: тело не разбирается целиком в память
+        ingestor = ResultIngestor(event, request.user, mode=mode, strict=strict)
+        try:
+            report = ingestor.run(iter_rows(request.stream, request.content_type))
+        except IngestError as e:
+            return Response({"error": str(e), "row": e.row}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"error": "Файл должен быть в кодировке UTF-8"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
 
 class EventRegistrationViewSet(viewsets.ModelViewSet):
     """
@@ -252,6 +455,7 @@ class EventRegistrationViewSet(viewsets.ModelViewSet):
     """
     serializer_class = EventRegistrationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RegistrationKeysetPagination
 
     def get_queryset(self):
         """
@@ -264,7 +468,8 @@ class EventRegistrationViewSet(viewsets.ModelViewSet):
         organized_event_ids = Event.objects.filter(organizer=self.request.user).values_list('id', flat=True)
         
         # Возвращаем регистрации пользователя или регистрации на его мероприятия
-        return EventRegistration.objects.filter(
+        fieldset = SparseFieldset.from_request(self.request)
+        return EventRegistration.objects.for_serialization(fieldset).filter(
             Q(user=self.request.user) | Q(event__id__in=organized_event_ids)
         )
 
@@ -291,18 +496,11 @@ class EventRegistrationViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Если статус меняется с подтвержденного на отклоненный - уменьшаем счетчик
-            if registration.status == 'CONFIRMED' and new_status == 'REJECTED_BY_ORGANIZER':
-                event.current_participants_count = max(0, event.current_participants_count - 1)
-                event.save()
-
-            # Если статус меняется с неподтвержденного на подтвержденный - увеличиваем счетчик
-            elif registration.status != 'CONFIRMED' and new_status == 'CONFIRMED':
-                event.current_participants_count += 1
-                event.save()
-
-            registration.status = new_status
-            registration.save()
+            # Счётчик участников меняется атомарно вместе со статусом (см. events/capacity.py)
+            try:
+                change_registration_status(registration, new_status)
+            except RegistrationError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             serializer = EventRegistrationSerializer(registration)
             return Response(serializer.data)
@@ -312,22 +510,84 @@ class EventRegistrationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Массовое изменение статуса регистраций (только для организатора).
+
+        Принимает {"status": ..., "ids": [...]} или {"status": ..., "event_id": ..., "current_status": ...}
+        и возвращает результат по каждой регистрации.
+        """
+        params = BulkRegistrationStatusSerializer(data=request.data)
+        if not params.is_valid():
+            return Response({"error": params.errors}, status=status.HTTP_400_BAD_REQUEST)
+        data = params.validated_data
+
+        registrations = EventRegistration.objects.filter(event__organizer=request.user)
+        if data.get('ids'):
+            registrations = registrations.filter(pk__in=data['ids'])
+        if 'event_id' in data:
+            registrations = registrations.filter(event_id=data['event_id'])
+        if 'current_status' in data:
+            registrations = registrations.filter(status=data['current_status'])
+        found = list(
+            registrations.order_by('id').values_list('pk', flat=True)[:BulkRegistrationStatusSerializer.MAX_ITEMS]
+        )
+
+        outcomes = bulk_change_status(EventRegistration.objects.filter(pk__in=found), data['status'])
+
+        requested = data.get('ids') or found
+        found = set(found)
+        results = []
+        for registration_id in dict.fromkeys(requested):
+            if registration_id not in found:
+                results.append({"id": registration_id, "result": "error",
+                                "error": "Регистрация не найдена или вы не организатор мероприятия"})
+            elif registration_id not in outcomes:
+                results.append({"id": registration_id, "result": "unchanged"})
+            elif outcomes[registration_id]:
+                results.append({"id": registration_id, "result": "error", "error": outcomes[registration_id]})
+            else:
+                results.append({"id": registration_id, "result": "updated"})
+
+        summary = Counter(item['result'] for item in results)
+        return Response({
+            "status": data['status'],
+            "updated": summary['updated'],
+            "unchanged": summary['unchanged'],
+            "failed": summary['error'],
+            "results": results,
+        })
 
-class EventResultViewSet(viewsets.ReadOnlyModelViewSet):
+
+class EventResultViewSet(CompiledListMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для получения результатов мероприятий.
     """
     serializer_class = EventResultSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ResultKeysetPagination
 
     def get_queryset(self):
         """
         Фильтрация результатов по мероприятию
         """
-        queryset = EventResult.objects.all()
+        fieldset = SparseFieldset.from_request(self.request)
+        queryset = EventResult.objects.for_serialization(fieldset)
 
         event_id = self.request.query_params.get('event_id', None)
         if event_id:
             queryset = queryset.filter(event_id=event_id)
 
-        return queryset
\ No newline at end of file
+        return queryset
+
+
+class RegistrationTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Статус заявок пользователя из очереди регистрации.
+    """
+    serializer_class = RegistrationTicketSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return RegistrationTicket.objects.filter(user=self.request.user).order_by('-id')
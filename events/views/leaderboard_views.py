@@ -0,0 +1,31 @@
+from rest_framework import mixins, permissions, viewsets
+from rest_framework.exceptions import ValidationError
+
+from ..models import LeaderboardEntry
+from ..pagination import LeaderboardCursorPagination
+from ..serializers import LeaderboardEntrySerializer
+
+
+class LeaderboardViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Рейтинг участников по виду спорта за период: ?sport_type=<id>&period=<год|all> (по умолчанию all).
+    Читается из материализованной таблицы (events/leaderboards.py), стоимость - одна страница.
+    """
+    serializer_class = LeaderboardEntrySerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = LeaderboardCursorPagination
+
+    def get_queryset(self):
+        sport_type = self.request.query_params.get('sport_type')
+        if not sport_type or not sport_type.isdigit():
+            raise ValidationError({'sport_type': ['Необходимо указать id вида спорта']})
+        period = self.request.query_params.get('period') or LeaderboardEntry.ALL_TIME
+        if period != LeaderboardEntry.ALL_TIME and not period.isdigit():
+            raise ValidationError({'period': ['Период - год (например, 2025) или all']})
+
+        return (
+            LeaderboardEntry.objects
+            .filter(sport_type_id=sport_type, period=period)
+            .select_related('user')
+            .with_rank()
+        )
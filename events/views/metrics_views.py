@@ -0,0 +1,56 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import permissions
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.views import APIView
+
+from .. import metrics
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Нужен для согласования Accept: text/plain; сами метрики отдаются HttpResponse.
+    Ответы с ошибками выводятся как JSON.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class CanScrapeMetrics(permissions.BasePermission):
+    """
+    По умолчанию /metrics закрыт. Доступ есть с заголовком Authorization: Bearer <EVENTS_METRICS_TOKEN>
+    (если токен задан), у администраторов (is_staff) и при DEBUG.
+    """
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'EVENTS_METRICS_TOKEN', '')
+        # токен проверяется до request.user: иначе JWT-аутентификация отклонит заголовок с токеном метрик
+        if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+            return True
+        if settings.DEBUG:
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    Метрики в текстовом формате Prometheus. Доступ - см. CanScrapeMetrics.
+    """
+    permission_classes = [CanScrapeMetrics]
+    renderer_classes = [JSONRenderer, PrometheusRenderer]
+
+    def perform_authentication(self, request):
+        # пользователь определяется лениво в CanScrapeMetrics, после проверки токена метрик
+        pass
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
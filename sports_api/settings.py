@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
@@ -39,12 +40,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'events.metrics.MetricsMiddleware',
+    'events.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'events.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,6 +111,76 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache
+# Кэш ответов публичного API мероприятий: locmem (по умолчанию), file или redis
+# (Redis или совместимый локальный сервер, требуется пакет redis)
+EVENTS_CACHE_BACKEND = os.getenv('EVENTS_CACHE_BACKEND', 'locmem')
+EVENTS_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'events',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('EVENTS_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'sports_api_cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('EVENTS_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'events': EVENTS_CACHE_BACKENDS[EVENTS_CACHE_BACKEND],
+}
+
+EVENTS_CACHE_ALIAS = 'events'
+EVENTS_CACHE_ENABLED = os.getenv('EVENTS_CACHE_ENABLED', 'True') == 'True'
+EVENTS_CACHE_TIMEOUT = int(os.getenv('EVENTS_CACHE_TIMEOUT', '300'))
+
+# Максимальный возраст снимка справочников в памяти процесса (секунды)
+EVENTS_CATALOG_MAX_AGE = int(os.getenv('EVENTS_CATALOG_MAX_AGE', '300'))
+
+# Списки мероприятий, результатов и мест сериализуются из values() по плану полей (events/compiled.py)
+EVENTS_COMPILED_LIST = os.getenv('EVENTS_COMPILED_LIST', 'True') == 'True'
+
+# Замеры запросов (events/instrumentation.py): заголовок Server-Timing и лог медленных запросов и N+1
+EVENTS_INSTRUMENTATION = os.getenv('EVENTS_INSTRUMENTATION', 'True') == 'True'
+EVENTS_SERVER_TIMING = os.getenv('EVENTS_SERVER_TIMING', str(DEBUG)) == 'True'
+EVENTS_SLOW_REQUEST_MS = float(os.getenv('EVENTS_SLOW_REQUEST_MS', '500'))
+EVENTS_SLOW_REQUEST_QUERIES = int(os.getenv('EVENTS_SLOW_REQUEST_QUERIES', '50'))
+EVENTS_DUPLICATE_QUERY_THRESHOLD = int(os.getenv('EVENTS_DUPLICATE_QUERY_THRESHOLD', '3'))
+
+# Профилирование запросов (events/profiling.py): заголовок X-Profile от сотрудников или случайная выборка
+EVENTS_PROFILER = os.getenv('EVENTS_PROFILER', 'cprofile')  # cprofile или sampler
+EVENTS_PROFILE_SAMPLE_RATE = float(os.getenv('EVENTS_PROFILE_SAMPLE_RATE', '0'))
+EVENTS_PROFILE_VIEWS = [name for name in os.getenv('EVENTS_PROFILE_VIEWS', '').split(',') if name]
+EVENTS_PROFILE_DIR = os.getenv('EVENTS_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'sports_api_profiles'))
+EVENTS_PROFILE_MAX_FILES = int(os.getenv('EVENTS_PROFILE_MAX_FILES', '500'))
+EVENTS_PROFILE_SAMPLER_INTERVAL_MS = float(os.getenv('EVENTS_PROFILE_SAMPLER_INTERVAL_MS', '2'))
+
+# Метрики Prometheus (events/metrics.py): GET /metrics, значения воркеров суммируются через файлы в EVENTS_METRICS_DIR
+# GET /metrics доступен с Authorization: Bearer <EVENTS_METRICS_TOKEN>, администраторам и при DEBUG, иначе 403
+EVENTS_METRICS_ENABLED = os.getenv('EVENTS_METRICS_ENABLED', 'True') == 'True'
+EVENTS_METRICS_DIR = os.getenv('EVENTS_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'sports_api_metrics'))
+EVENTS_METRICS_TOKEN = os.getenv('EVENTS_METRICS_TOKEN', '')
+
+# Журнал медленных SQL-запросов с планами выполнения (events/slow_queries.py); 0 - выключен
+EVENTS_SLOW_QUERY_MS = float(os.getenv('EVENTS_SLOW_QUERY_MS', '200'))
+EVENTS_SLOW_QUERY_LOG = os.getenv('EVENTS_SLOW_QUERY_LOG',
+                                  os.path.join(tempfile.gettempdir(), 'sports_api_logs', 'slow_queries.log'))
+EVENTS_SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('EVENTS_SLOW_QUERY_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+EVENTS_SLOW_QUERY_LOG_BACKUPS = int(os.getenv('EVENTS_SLOW_QUERY_LOG_BACKUPS', '5'))
+EVENTS_SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv('EVENTS_SLOW_QUERY_EXPLAIN_INTERVAL', '3600'))
+
+# JWT-аутентификация с кэшем пользователей в процессе (events/authentication.py): количество записей
+# и время жизни (секунды) - не дольше этого изменения пользователя могут не дойти до других воркеров
+EVENTS_AUTH_USER_CACHE_SIZE = int(os.getenv('EVENTS_AUTH_USER_CACHE_SIZE', '1000'))
+EVENTS_AUTH_USER_CACHE_TTL = int(os.getenv('EVENTS_AUTH_USER_CACHE_TTL', '60'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -116,7 +190,7 @@ AUTH_USER_MODEL = 'events.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'events.authentication.TokenUserAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
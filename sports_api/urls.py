@@ -4,7 +4,7 @@ from django.urls import path, include
 from django.conf import settings # Импортируем settings
 from django.conf.urls.static import static # Импортируем static
 
-from events.views import auth_views
+from events.views import auth_views, metrics_views
 from rest_framework_simplejwt.views import TokenRefreshView
 
 
@@ -14,6 +14,7 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/users/register/', auth_views.RegisterView.as_view(), name='register'),
     path('api/users/login/', auth_views.LoginView.as_view(), name='login'),
+    path('metrics', metrics_views.MetricsView.as_view(), name='metrics'),
 ]
 
 # Добавляем раздачу медиафайлов в режиме DEBUG